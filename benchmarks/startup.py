@@ -0,0 +1,71 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Measures the start-up cost of the CLI: wall time of short commands in fresh
+# interpreters (median of --runs), minus a bare `python -c pass`, and the slowest
+# imports reported by `python -X importtime`.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --skin my_skin.png --top 20
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+MAIN = os.path.join(SRC, "main.py")
+
+def time_command(args: list, runs: int) -> float:
+    """Median wall time in ms of running `python args...` from src/."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=SRC, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples)
+
+def slowest_imports(args: list, top: int) -> list:
+    """[(cumulative ms, self ms, module)] of the `top` slowest top-level imports of a command."""
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=SRC, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "| cumulative |" in line:
+            continue
+        # "import time:      1023 |      52804 | numpy", nested imports are indented further
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("  "):
+            continue # Nested import, already counted in its parent
+        rows.append((int(cumulative_us) / 1000.0, int(self_us) / 1000.0, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Start-up time of the Skin2Schematic CLI")
+    parser.add_argument("--runs", type=int, default=7, help="Runs per command (median is reported)")
+    parser.add_argument("--skin", help="Also time a full single-skin conversion of this PNG")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per command")
+    args = parser.parse_args()
+
+    commands = [
+        ("--list-poses", [MAIN, "--list-poses"]),
+        ("--help", [MAIN, "--help"]),
+        ("pipeline imports", ["-c", "import main; main.import_pipeline()"]),
+    ]
+    output_dir = tempfile.mkdtemp(prefix="s2s_startup_")
+    if args.skin:
+        commands.append(("single skin", [MAIN, "-i", os.path.abspath(args.skin), "-o", os.path.join(output_dir, "statue.litematic")]))
+
+    baseline = time_command(["-c", "pass"], args.runs)
+    print(f"Python interpreter (python -c pass): {baseline:.1f} ms\n")
+    print(f"{'command':<20} {'wall ms':>10} {'overhead ms':>12}")
+    for label, command in commands:
+        wall = time_command(command, args.runs)
+        print(f"{label:<20} {wall:>10.1f} {wall - baseline:>12.1f}")
+
+    for label, command in commands:
+        print(f"\nSlowest imports ({label}), ms cumulative / self:")
+        for cumulative, own, name in slowest_imports(command, args.top):
+            print(f"  {cumulative:8.1f} {own:8.1f}  {name}")
+
+if __name__ == "__main__":
+    main()
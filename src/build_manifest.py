@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+from typing import Dict, Optional
+
+class BuildManifest:
+    """
+    Record of the statues an output directory already holds, so batch runs can
+    skip skins whose output is up to date.
+
+    Stored as JSON next to the outputs: {"version": 1, "entries": {output file name: build key}}.
+    A build key is the SHA-256 of the skin file bytes and the settings fingerprint
+    (pose, palette, flags and tool version). Entries are only written after the
+    output was saved, and the file is replaced atomically.
+    """
+    FILE_NAME = ".skin2schematic_manifest.json"
+    VERSION = 1
+
+    _tool_version = None
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self.entries: Dict[str, str] = {}
+        self._changed = False
+
+    @classmethod
+    def load(cls, directory: str) -> "BuildManifest":
+        manifest = cls(directory)
+        if not os.path.exists(manifest.path):
+            return manifest
+
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Unreadable build manifest {manifest.path} ({e}), rebuilding everything.")
+            return manifest
+
+        if isinstance(data, dict) and data.get("version") == cls.VERSION and isinstance(data.get("entries"), dict):
+            manifest.entries = data["entries"]
+        return manifest
+
+    @staticmethod
+    def tool_version() -> str:
+        """Hash of the converter's own source files: any code change invalidates every entry."""
+        if BuildManifest._tool_version is None:
+            root = os.path.dirname(os.path.abspath(__file__))
+            digest = hashlib.sha256()
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+                for name in sorted(filenames):
+                    if name.endswith(".py"):
+                        path = os.path.join(dirpath, name)
+                        digest.update(os.path.relpath(path, root).encode('utf-8'))
+                        with open(path, 'rb') as f:
+                            digest.update(f.read())
+            BuildManifest._tool_version = digest.hexdigest()[:16]
+        return BuildManifest._tool_version
+
+    @staticmethod
+    def settings_fingerprint(settings: dict) -> str:
+        """
+        settings: JSON-serializable dict of everything (besides the skin) that changes the output
+        Returns: hex digest, including the tool version
+        """
+        payload = json.dumps({"tool": BuildManifest.tool_version(), "settings": settings}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def build_key(skin_path: str, fingerprint: str) -> Optional[str]:
+        """Build key of a skin file, or None if it cannot be read."""
+        try:
+            with open(skin_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        digest = hashlib.sha256(fingerprint.encode('ascii'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _name(self, output_path: str) -> str:
+        return os.path.relpath(output_path, self.directory).replace(os.sep, '/')
+
+    def is_current(self, output_path: str, key: Optional[str]) -> bool:
+        """True if output_path exists and was built from exactly this key."""
+        return key is not None and self.entries.get(self._name(output_path)) == key and os.path.exists(output_path)
+
+    def record(self, output_path: str, key: Optional[str]):
+        """Marks output_path as built from key (call after it was saved)."""
+        if key is None:
+            return
+        self.entries[self._name(output_path)] = key
+        self._changed = True
+
+    def save(self):
+        """Writes the manifest if anything was recorded since load/save."""
+        if not self._changed:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.VERSION, "entries": self.entries}, f, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._changed = False
+        except OSError as e:
+            print(f"Failed to save build manifest: {e}")
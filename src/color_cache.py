@@ -0,0 +1,404 @@
+import os
+import zlib
+import struct
+from multiprocessing import shared_memory
+import numpy as np
+
+class ColorCache:
+    """
+    Binary colour -> palette index cache for one palette.
+
+    In memory: sorted packed RGBA keys (uint32) and palette indices (uint16),
+    looked up with np.searchsorted.
+
+    On disk: an append-only sequence of sections (little-endian):
+        b"S2SC", version (uint8), name length (uint8), palette name (utf-8)
+        fingerprint (12 ascii bytes, ColorMatcher.palette_fingerprint())
+        count (uint32), CRC-32 of the section without this field (uint32)
+        count x uint32 keys, count x uint16 indices
+    Loading skips sections of other palettes or stale fingerprints, and stops at
+    a truncated or torn section (e.g. from a crash mid-write); saving cuts such a
+    tail off, then appends one section holding only the entries added since load.
+    """
+    MAGIC = b"S2SC"
+    VERSION = 2
+    HEAD = struct.Struct("<4sBB")
+    TAIL = struct.Struct("<12sII")
+    TAIL_V1 = struct.Struct("<12sI") # Version 1 sections had no checksum (still read)
+
+    def __init__(self, palette_name: str, fingerprint: str):
+        self.palette_name = palette_name
+        self.fingerprint = fingerprint
+        self.keys = np.zeros(0, dtype=np.uint32)
+        self.indices = np.zeros(0, dtype=np.uint16)
+        self._pending_keys = []
+        self._pending_indices = []
+
+    def __len__(self) -> int:
+        return self.keys.size
+
+    @staticmethod
+    def pack(colors: np.ndarray) -> np.ndarray:
+        """(N, 4) uint8 RGBA -> (N,) uint32 keys (r | g << 8 | b << 16 | a << 24)."""
+        c = colors.astype(np.uint32)
+        return c[:, 0] | (c[:, 1] << 8) | (c[:, 2] << 16) | (c[:, 3] << 24)
+
+    def lookup(self, colors: np.ndarray):
+        """
+        colors: (N, 4) uint8 RGBA
+        Returns: (indices, hit) where indices is (N,) int64 (0 on a miss) and hit is (N,) bool
+        """
+        return self.lookup_packed(self.pack(colors))
+
+    def lookup_packed(self, keys: np.ndarray):
+        """Same as lookup() for (N,) packed uint32 keys."""
+        if self.keys.size == 0:
+            return np.zeros(keys.size, dtype=np.int64), np.zeros(keys.size, dtype=bool)
+
+        pos = np.minimum(np.searchsorted(self.keys, keys), self.keys.size - 1)
+        hit = self.keys[pos] == keys
+        indices = np.where(hit, self.indices[pos], 0).astype(np.int64)
+        return indices, hit
+
+    def add(self, colors: np.ndarray, indices: np.ndarray):
+        """Adds (N, 4) RGBA colours with their palette indices."""
+        self.add_packed(self.pack(colors), indices)
+
+    def add_packed(self, keys: np.ndarray, indices: np.ndarray, pending: bool = True):
+        """Merges packed keys into the sorted arrays (later entries win). O(n + m)."""
+        keys = np.asarray(keys, dtype=np.uint32)
+        indices = np.asarray(indices, dtype=np.uint16)
+        if keys.size == 0:
+            return
+
+        if self.keys.size == 0 and np.all(keys[1:] > keys[:-1]):
+            # Already sorted and unique (e.g. a single saved section)
+            self.keys = keys.copy()
+            self.indices = indices.copy()
+            if pending:
+                self._pending_keys.append(keys)
+                self._pending_indices.append(indices)
+            return
+
+        # Last write wins within the batch
+        uk, first = np.unique(keys[::-1], return_index=True)
+        uv = indices[::-1][first]
+
+        pos = np.searchsorted(self.keys, uk)
+        exists = pos < self.keys.size
+        exists[exists] = self.keys[pos[exists]] == uk[exists]
+
+        self.indices[pos[exists]] = uv[exists]
+        new = ~exists
+        self.keys = np.insert(self.keys, pos[new], uk[new])
+        self.indices = np.insert(self.indices, pos[new], uv[new])
+
+        if pending:
+            self._pending_keys.append(uk)
+            self._pending_indices.append(uv)
+
+    def pending_updates(self):
+        """Returns (keys, indices) added since load/save, or None."""
+        if not self._pending_keys:
+            return None
+        keys = np.concatenate(self._pending_keys)
+        indices = np.concatenate(self._pending_indices)
+        uk, first = np.unique(keys[::-1], return_index=True)
+        return uk, indices[::-1][first]
+
+    def take_pending(self):
+        """pending_updates(), then forgets them (for a caller that persists them elsewhere)."""
+        updates = self.pending_updates()
+        self._pending_keys = []
+        self._pending_indices = []
+        return updates
+
+    @classmethod
+    def _sections(cls, data: bytes):
+        """
+        Parses the cache file contents.
+        Returns (sections, valid_end): sections is a list of (name, fingerprint, keys, indices)
+        and valid_end the byte offset where the last intact section ends. Parsing stops at
+        the first truncated, torn (checksum mismatch) or unknown section.
+        """
+        sections = []
+        offset = 0
+        while offset + cls.HEAD.size <= len(data):
+            magic, version, name_len = cls.HEAD.unpack_from(data, offset)
+            if magic != cls.MAGIC or version not in (1, cls.VERSION):
+                break
+            pos = offset + cls.HEAD.size
+            name = data[pos:pos + name_len]
+            pos += name_len
+            tail = cls.TAIL if version == cls.VERSION else cls.TAIL_V1
+            if pos + tail.size > len(data):
+                break
+            if version == cls.VERSION:
+                fp, count, checksum = tail.unpack_from(data, pos)
+            else:
+                fp, count = tail.unpack_from(data, pos) # No checksum, only guarded by its length
+                checksum = None
+            pos += tail.size
+
+            end = pos + count * 6
+            if end > len(data):
+                break # Truncated write
+            if checksum is not None and zlib.crc32(data[offset:pos - 4] + data[pos:end]) != checksum:
+                break # Torn write
+
+            sections.append((name, fp,
+                             np.frombuffer(data, dtype='<u4', count=count, offset=pos),
+                             np.frombuffer(data, dtype='<u2', count=count, offset=pos + count * 4)))
+            offset = end
+        return sections, offset
+
+    @classmethod
+    def load(cls, path: str, palette_name: str, fingerprint: str) -> "ColorCache":
+        cache = cls(palette_name, fingerprint)
+        if not os.path.exists(path):
+            return cache
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"Failed to load cache: {e}")
+            return cache
+
+        sections, valid_end = cls._sections(data)
+        if valid_end < len(data):
+            print(f"Warning: Damaged cache section in {path}, ignoring the rest (it is dropped on the next save).")
+
+        name_bytes = palette_name.encode('utf-8')
+        fp_bytes = fingerprint.encode('ascii')
+        keys = [k for name, fp, k, _ in sections if name == name_bytes and fp == fp_bytes]
+        indices = [i for name, fp, _, i in sections if name == name_bytes and fp == fp_bytes]
+
+        if keys:
+            cache.add_packed(np.concatenate(keys), np.concatenate(indices), pending=False)
+            print(f"Loaded {len(cache)} cached colors for palette '{palette_name}'.")
+        return cache
+
+    def save(self, path: str):
+        """
+        Appends the entries added since load/save as one new section.
+        A damaged tail (e.g. from a crash mid-write) is cut off first, so the new
+        section is never read as the continuation of a partial one.
+        """
+        updates = self.pending_updates()
+        if updates is None:
+            return
+        keys, indices = updates
+
+        name_bytes = self.palette_name.encode('utf-8')
+        head = self.HEAD.pack(self.MAGIC, self.VERSION, len(name_bytes)) + name_bytes + \
+               self.TAIL.pack(self.fingerprint.encode('ascii'), keys.size, 0)[:-4]
+        payload = keys.astype('<u4').tobytes() + indices.astype('<u2').tobytes()
+        section = head + struct.pack("<I", zlib.crc32(head + payload)) + payload
+
+        try:
+            with open(path, 'ab+') as f:
+                # Re-scanned here rather than at load: other caches may have appended since
+                f.seek(0)
+                _, valid_end = self._sections(f.read())
+                if valid_end < f.tell():
+                    f.truncate(valid_end)
+                f.write(section)
+            self._pending_keys = []
+            self._pending_indices = []
+            print(f"Saved {keys.size} new cache entries to {path}.")
+        except OSError as e:
+            print(f"Failed to save cache: {e}")
+
+
+class SharedColorCache:
+    """
+    Colour cache shared by pool workers through multiprocessing.shared_memory.
+    Open-addressing hash table (linear probing) of packed RGBA keys (uint32)
+    to palette indices (uint16), with the same lookup/add interface as ColorCache.
+
+    Layout: header (capacity, count as uint64), keys[capacity], values[capacity].
+    An empty slot has value EMPTY. Lookups are lock-free. Inserts hold the shared
+    lock and write the key before the value, so a reader that sees a value also
+    sees its key. Once MAX_LOAD is reached, new keys go to a local overflow cache
+    of the inserting process instead: its lookups still find them, and
+    take_overflow() hands them to whoever persists the cache (the parent).
+    """
+    EMPTY = 0xFFFF
+    MAX_LOAD = 0.7
+    HEADER_SIZE = 16
+
+    def __init__(self, shm: shared_memory.SharedMemory, lock, owner: bool = False):
+        self._shm = shm
+        self._owner = owner
+        self.lock = lock
+        self._overflow = None # ColorCache of keys that did not fit, created when the table fills up
+
+        self._header = np.ndarray((2,), dtype=np.uint64, buffer=shm.buf)
+        self.capacity = int(self._header[0])
+        self._bits = self.capacity.bit_length() - 1
+        self.keys = np.ndarray((self.capacity,), dtype=np.uint32, buffer=shm.buf, offset=self.HEADER_SIZE)
+        self.values = np.ndarray((self.capacity,), dtype=np.uint16, buffer=shm.buf, offset=self.HEADER_SIZE + 4 * self.capacity)
+
+    @classmethod
+    def create(cls, cache: ColorCache, lock, headroom: int = 1 << 18) -> "SharedColorCache":
+        """Creates a table seeded from a ColorCache with room for `headroom` new colours."""
+        needed = (len(cache) + headroom) / cls.MAX_LOAD
+        capacity = 1 << max(10, int(np.ceil(np.log2(needed))))
+
+        shm = shared_memory.SharedMemory(create=True, size=cls.HEADER_SIZE + 6 * capacity)
+        header = np.ndarray((2,), dtype=np.uint64, buffer=shm.buf)
+        header[0] = capacity
+        header[1] = 0
+        del header
+
+        table = cls(shm, lock, owner=True)
+        table.values[:] = cls.EMPTY
+        table.add_packed(cache.keys, cache.indices)
+        return table
+
+    @classmethod
+    def attach(cls, name: str, lock) -> "SharedColorCache":
+        """Attaches to a table created by another process."""
+        return cls(shared_memory.SharedMemory(name=name), lock)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __len__(self) -> int:
+        return int(self._header[1])
+
+    def _slots(self, keys: np.ndarray) -> np.ndarray:
+        # Fibonacci hashing: top bits of key * golden ratio (mod 2^32)
+        h = (keys.astype(np.uint64) * np.uint64(0x9E3779B1)) & np.uint64(0xFFFFFFFF)
+        return (h >> np.uint64(32 - self._bits)).astype(np.int64)
+
+    def lookup(self, colors: np.ndarray):
+        """
+        colors: (N, 4) uint8 RGBA
+        Returns: (indices, hit) as ColorCache.lookup
+        """
+        return self.lookup_packed(ColorCache.pack(colors))
+
+    def lookup_packed(self, keys: np.ndarray):
+        mask = self.capacity - 1
+        slot = self._slots(keys)
+        indices = np.zeros(keys.size, dtype=np.int64)
+        hit = np.zeros(keys.size, dtype=bool)
+
+        pending = np.arange(keys.size)
+        while pending.size:
+            s = slot[pending]
+            # Value before key (see class docstring)
+            v = self.values[s]
+            k = self.keys[s]
+            empty = v == self.EMPTY
+            match = ~empty & (k == keys[pending])
+            indices[pending[match]] = v[match]
+            hit[pending[match]] = True
+
+            pending = pending[~empty & ~match]
+            slot[pending] = (slot[pending] + 1) & mask
+
+        if self._overflow is not None and not hit.all():
+            miss = ~hit
+            indices[miss], hit[miss] = self._overflow.lookup_packed(keys[miss])
+        return indices, hit
+
+    def add(self, colors: np.ndarray, indices: np.ndarray):
+        self.add_packed(ColorCache.pack(colors), indices)
+
+    def add_packed(self, keys: np.ndarray, indices: np.ndarray):
+        keys = np.asarray(keys, dtype=np.uint32)
+        indices = np.asarray(indices, dtype=np.uint16)
+        if keys.size == 0:
+            return
+        with self.lock:
+            dropped = self._insert(keys, indices)
+        if dropped is not None:
+            if self._overflow is None:
+                self._overflow = ColorCache("overflow", "")
+            self._overflow.add_packed(*dropped)
+
+    def take_overflow(self):
+        """
+        Returns (keys, indices) this process added since the last call that did not fit
+        the full table, or None. They are only known to this process: a pool worker
+        returns them with its result, so the parent can add them to its ColorCache.
+        """
+        if self._overflow is None:
+            return None
+        return self._overflow.take_pending()
+
+    def _insert(self, keys: np.ndarray, indices: np.ndarray):
+        """Inserts under the lock. Returns (keys, indices) dropped because the table is full, or None."""
+        # Last write wins within the batch
+        uk, first = np.unique(keys[::-1], return_index=True)
+        uv = indices[::-1][first]
+
+        mask = self.capacity - 1
+        limit = int(self.capacity * self.MAX_LOAD)
+        count = len(self)
+        slot = self._slots(uk)
+
+        dropped = []
+        pending = np.arange(uk.size)
+        while pending.size:
+            s = slot[pending]
+            v = self.values[s]
+            occupied = v != self.EMPTY
+            same = occupied & (self.keys[s] == uk[pending])
+
+            # Existing key: update in place
+            self.values[s[same]] = uv[pending[same]]
+
+            # Empty slot: when several keys probe the same one, the first claims it
+            free = np.flatnonzero(~occupied)
+            _, win = np.unique(s[free], return_index=True)
+            win = free[win][:max(0, limit - count)]
+            self.keys[s[win]] = uk[pending[win]]
+            self.values[s[win]] = uv[pending[win]]
+            count += win.size
+
+            # Occupied by another key: probe the next slot. Losers retry the same slot.
+            other = occupied & ~same
+            slot[pending[other]] = (s[other] + 1) & mask
+
+            done = same.copy()
+            done[win] = True
+            if count >= limit:
+                # Table full: keys that are not already present are dropped
+                lost = np.zeros(pending.size, dtype=bool)
+                lost[free] = True
+                lost[win] = False
+                dropped.append(pending[lost])
+                done[free] = True
+            pending = pending[~done]
+
+        self._header[1] = count
+        if dropped:
+            dropped = np.concatenate(dropped)
+            if dropped.size:
+                return uk[dropped], uv[dropped]
+        return None
+
+    def items(self):
+        """Returns (keys, indices) of every occupied slot."""
+        occupied = self.values != self.EMPTY
+        return self.keys[occupied].copy(), self.values[occupied].copy()
+
+    def unlink(self):
+        """
+        Creating process only: removes the shared block's name right away, so nothing is
+        left in /dev/shm even if close() is never reached. Existing mappings stay valid.
+        """
+        if self._owner:
+            self._owner = False
+            self._shm.unlink()
+
+    def close(self):
+        """Detaches; the creating process also frees the shared block."""
+        self._header = self.keys = self.values = None
+        self._shm.close()
+        self.unlink()
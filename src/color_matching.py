@@ -1,4 +1,127 @@
+import os
+import json
 import math
+import hashlib
+import numpy as np
+
+class PaletteIndex:
+    """
+    Exact nearest-neighbour index over palette Lab colours (pure NumPy KD-tree).
+    The tree is implicit (node i -> children 2i+1, 2i+2) and every node keeps a
+    tight bounding box of its entries. Leaves hold up to LEAF_SIZE entries.
+    Queries walk the tree breadth-first for a whole chunk of colours at once and
+    keep only the (colour, node) pairs whose box can still hold a match at least
+    as close as the current best, so memory is bounded by CHUNK_SIZE, not N x K.
+    Ties resolve to the lowest palette index, exactly like a brute-force argmin.
+    """
+    LEAF_SIZE = 8
+    CHUNK_SIZE = 16384
+
+    def __init__(self, points):
+        """
+        points: (K, 3) palette colours in Lab space
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        n = len(points)
+
+        # Balanced tree with enough levels to get leaves of at most LEAF_SIZE
+        depth = 0
+        while (1 << depth) * self.LEAF_SIZE < n:
+            depth += 1
+        self.depth = depth
+        num_leaves = 1 << depth
+        num_nodes = 2 * num_leaves - 1
+        cap = max(1, -(-n // num_leaves))
+
+        # Empty nodes keep an inverted (infinitely far) box and are never visited
+        self.box_min = np.full((num_nodes, 3), np.inf)
+        self.box_max = np.full((num_nodes, 3), -np.inf)
+
+        # Padded leaf storage. Padding sits far away so it never wins.
+        self.leaf_points = np.full((num_leaves, cap, 3), 1e18)
+        self.leaf_ids = np.full((num_leaves, cap), -1, dtype=np.int64)
+
+        stack = [(0, 0, np.arange(n))]
+        while stack:
+            node, level, idx = stack.pop()
+            if idx.size == 0:
+                continue
+            pts = points[idx]
+            self.box_min[node] = pts.min(axis=0)
+            self.box_max[node] = pts.max(axis=0)
+
+            if level == depth:
+                # Ascending ids, so argmin inside a leaf already prefers the lowest index
+                idx = np.sort(idx)
+                pts = points[idx]
+                leaf = node - (num_leaves - 1)
+                self.leaf_points[leaf, :idx.size] = pts
+                self.leaf_ids[leaf, :idx.size] = idx
+                continue
+
+            # Median split along the widest axis
+            axis = int(np.argmax(self.box_max[node] - self.box_min[node]))
+            order = idx[np.argsort(pts[:, axis], kind='stable')]
+            half = (order.size + 1) // 2
+            stack.append((2 * node + 1, level + 1, order[:half]))
+            stack.append((2 * node + 2, level + 1, order[half:]))
+
+    def _box_dist(self, q: "np.ndarray", nodes: "np.ndarray") -> "np.ndarray":
+        # Squared distance from each point to its node's box (0 inside)
+        d = np.maximum(self.box_min[nodes] - q, 0) + np.maximum(q - self.box_max[nodes], 0)
+        return np.sum(d * d, axis=1)
+
+    def query(self, targets: "np.ndarray") -> "np.ndarray":
+        """
+        targets: (N, 3) Lab colours
+        Returns: (N,) int64 index of the nearest palette entry
+        """
+        targets = np.asarray(targets, dtype=np.float64)
+        result = np.empty(len(targets), dtype=np.int64)
+        for start in range(0, len(targets), self.CHUNK_SIZE):
+            end = start + self.CHUNK_SIZE
+            result[start:end] = self._query_chunk(targets[start:end])
+        return result
+
+    def _query_chunk(self, q: "np.ndarray") -> "np.ndarray":
+        n_q = len(q)
+        cap = self.leaf_ids.shape[1]
+        first_leaf = (1 << self.depth) - 1
+
+        # 1. Greedy descent to the nearest leaf -> initial upper bound per colour
+        node = np.zeros(n_q, dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * node + 1
+            right = left + 1
+            node = np.where(self._box_dist(q, right) < self._box_dist(q, left), right, left)
+        dists = np.sum((q[:, np.newaxis, :] - self.leaf_points[node - first_leaf]) ** 2, axis=2)
+        best = dists.min(axis=1)
+
+        # 2. Breadth-first search over every node that could still tie or win
+        q_idx = np.arange(n_q)
+        nodes = np.zeros(n_q, dtype=np.int64)
+        for _ in range(self.depth):
+            q_idx = np.repeat(q_idx, 2)
+            nodes = np.repeat(2 * nodes + 1, 2) + np.tile(np.array([0, 1]), nodes.size)
+            keep = self._box_dist(q[q_idx], nodes) <= best[q_idx]
+            q_idx = q_idx[keep]
+            nodes = nodes[keep]
+
+        # 3. Exact distances inside the surviving leaves
+        leaves = nodes - first_leaf
+        diff = q[q_idx][:, np.newaxis, :] - self.leaf_points[leaves] # (P, cap, 3)
+        dists = np.sum(diff**2, axis=2)
+        pos = np.argmin(dists, axis=1)
+        pair_d = dists[np.arange(leaves.size), pos]
+        pair_id = self.leaf_ids[leaves, pos]
+
+        # q_idx stays sorted, so each colour's pairs are contiguous.
+        # Per colour: smallest distance, then lowest palette index.
+        starts = np.flatnonzero(np.r_[True, q_idx[1:] != q_idx[:-1]])
+        best_d = np.minimum.reduceat(pair_d, starts)
+        counts = np.diff(np.r_[starts, q_idx.size])
+        pair_id = np.where(pair_d == np.repeat(best_d, counts), pair_id, np.iinfo(np.int64).max)
+        return np.minimum.reduceat(pair_id, starts)
 
 class ColorMatcher:
     # Palette definitions (Approximate average RGB)
@@ -28,8 +151,15 @@ class ColorMatcher:
             self.palette_ids_list.append(block_id)
             self.palette_lab_list.append(lab)
             
-        import numpy as np
         self.palette_lab_arr = np.array(self.palette_lab_list) # (K, 3)
+        self.palette_ids_arr = np.array(self.palette_ids_list)
+
+        # Spatial index for nearest-colour queries (built once per palette)
+        self.palette_index = PaletteIndex(self.palette_lab_arr)
+
+        # Optional precomputed RGB -> palette index table (see load_lut)
+        self.lut = None
+        self.lut_bits = 8
 
     def match_bulk(self, colors_rgba: "np.ndarray") -> "np.ndarray":
         """
@@ -37,94 +167,152 @@ class ColorMatcher:
         colors_rgba: (N, 4) uint8 numpy array
         Returns: (N,) list or array of block_ids
         """
-        import numpy as np
-        
         # Filter transparent
-        # alpha < 128 -> None
-        # We handle this by returning None or "air"?
-        # Usually checking alpha before calling this is better, but let's handle it.
-        
-        # RGB -> Lab
-        # Vectorized RGB->Lab is needed.
-        # Reuse local or static logic? 
-        # We can just implement a fast approximate or full vector helper.
-        
-        r = colors_rgba[:, 0]
-        g = colors_rgba[:, 1]
-        b = colors_rgba[:, 2]
-        a = colors_rgba[:, 3]
-        
-        # Vectorized RGB->Lab
+        # Usually checking alpha before calling this is better (Rasterizer filters alpha).
+
+        # Map to IDs
+        return self.palette_ids_arr[self.match_indices(colors_rgba)]
+
+    def match_indices(self, colors_rgba: "np.ndarray") -> "np.ndarray":
+        """
+        Like match_bulk, but returns (N,) indices into palette_ids_list.
+        """
+        # Precomputed table: a single gather, no Lab math
+        if self.lut is not None:
+            return self.lut[self._lut_keys(colors_rgba)]
+
+        # Shape (N, 3)
+        targets_lab = self.rgb_to_lab_bulk(colors_rgba)
+
+        # Argmin over palette
+        return self._nearest_indices(targets_lab)
+
+    def _nearest_indices(self, targets_lab: "np.ndarray") -> "np.ndarray":
+        """
+        Index of the nearest palette entry (CIE76) for each Lab colour.
+        targets_lab: (N, 3) float array
+        Uses the KD-tree, so memory stays bounded for large N and large palettes.
+        """
+        return self.palette_index.query(targets_lab)
+
+    @staticmethod
+    def rgb_to_lab_bulk(colors: "np.ndarray") -> "np.ndarray":
+        """
+        Vectorized RGB->Lab.
+        colors: (N, 3) or (N, 4) uint8 array (alpha ignored)
+        Returns: (N, 3) float64 Lab array
+        """
         # Scale
-        r = r / 255.0
-        g = g / 255.0
-        b = b / 255.0
-        
+        r = colors[:, 0] / 255.0
+        g = colors[:, 1] / 255.0
+        b = colors[:, 2] / 255.0
+
         # Pivot RGB
-        # mask = n > 0.04045
-        # ...
-        # Faster to use simple lambda?
         # ((n + 0.055) / 1.055) ** 2.4
-        
         def pivot_v(n):
             return np.where(n > 0.04045, ((n + 0.055) / 1.055) ** 2.4, n / 12.92)
-            
+
         rr = pivot_v(r)
         gg = pivot_v(g)
         bb = pivot_v(b)
-        
+
         x = rr * 0.4124 + gg * 0.3576 + bb * 0.1805
         y = rr * 0.2126 + gg * 0.7152 + bb * 0.0722
         z = rr * 0.0193 + gg * 0.1192 + bb * 0.9505
-        
+
         # XYZ -> Lab
         def pivot_xyz_v(n):
             return np.where(n > 0.008856, n ** (1/3), (7.787 * n) + (16/116))
-            
+
         xn, yn, zn = 0.95047, 1.00000, 1.08883
-        
+
         fx = pivot_xyz_v(x / xn)
         fy = pivot_xyz_v(y / yn)
         fz = pivot_xyz_v(z / zn)
-        
+
         l_val = 116 * fy - 16
         a_val = 500 * (fx - fy)
         b_val = 200 * (fy - fz)
-        
-        # Shape (N, 3)
-        targets_lab = np.stack([l_val, a_val, b_val], axis=1)
-        
-        # Calculate Distances to Palette (K, 3)
-        # (N, 1, 3) - (1, K, 3) -> (N, K, 3)
-        # Dist sq = sum((...)**2, axis=2) -> (N, K)
-        
-        # Memory efficient: Process in chunks if N is huge?
-        # 100k blocks * 20 palette items = 2M floats. Tiny.
-        # But if palette is large... Minecraft has many blocks.
-        # Current palette is small (wool/concrete ~ 32 items).
-        
-        diff = targets_lab[:, np.newaxis, :] - self.palette_lab_arr[np.newaxis, :, :]
-        dists = np.sum(diff**2, axis=2)
-        
-        # Argmin
-        best_indices = np.argmin(dists, axis=1)
-        
-        # Map to IDs
-        # palette_ids_list is list of str.
-        # Use np array for fast indexing?
-        palette_ids_arr = np.array(self.palette_ids_list)
-        results = palette_ids_arr[best_indices]
-        
-        # Handle alpha
-        # results[a < 128] = None # Or "air"?
-        # Actually Rasterizer filters alpha usually.
-        
-        return results
+
+        return np.stack([l_val, a_val, b_val], axis=1)
+
+    # --- Precomputed Lookup Table ---
+    # One palette index per RGB colour, quantized to `bits` per channel
+    # (8 = full 24-bit, 16.7M entries; 5/6 = 32K/262K entries).
+    # Stored as .npy and memory-mapped so all worker processes share one page-cache copy.
+
+    def palette_fingerprint(self) -> str:
+        """
+        Short hash of the palette contents and order, used to invalidate LUT and cache files.
+        Order matters: both store indices into palette_ids_list.
+        """
+        payload = json.dumps([(block_id, list(rgb)) for block_id, rgb in self.palette.items()])
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def lut_path(self, directory: str, bits: int = 8) -> str:
+        return os.path.join(directory, f"lut_{bits}bit_{self.palette_fingerprint()}.npy")
+
+    def build_lut(self, bits: int = 8) -> "np.ndarray":
+        """
+        Computes the full RGB -> palette index table.
+        Each quantization bin is matched using its centre colour.
+        """
+        levels = 1 << bits
+        shift = 8 - bits
+        dtype = np.uint8 if len(self.palette_ids_list) <= 256 else np.uint16
+
+        # Representative value of each bin
+        values = ((np.arange(levels) << shift) + ((1 << shift) >> 1)).astype(np.uint8)
+
+        # All (G, B) combinations for one R plane
+        plane = levels * levels
+        gb = np.stack(np.meshgrid(values, values, indexing='ij'), axis=-1).reshape(plane, 2)
+        rgb = np.empty((plane, 3), dtype=np.uint8)
+        rgb[:, 1:] = gb
+
+        lut = np.empty(levels ** 3, dtype=dtype)
+        for r_idx in range(levels):
+            rgb[:, 0] = values[r_idx]
+            lut[r_idx * plane:(r_idx + 1) * plane] = self._nearest_indices(self.rgb_to_lab_bulk(rgb))
+        return lut
+
+    def load_lut(self, path: str):
+        """Memory-maps a LUT file built by build_lut() and uses it in match_bulk."""
+        lut = np.load(path, mmap_mode='r')
+        bits = round(math.log2(max(1, lut.size)) / 3)
+        if lut.ndim != 1 or lut.size != (1 << bits) ** 3:
+            raise ValueError(f"Invalid colour LUT {path}: {lut.size} entries")
+        self.lut = lut
+        self.lut_bits = bits
+
+    def ensure_lut(self, directory: str, bits: int = 8) -> str:
+        """
+        Loads the LUT for this palette from `directory`, building and saving it first if missing.
+        Returns the LUT path (to hand to worker processes).
+        """
+        path = self.lut_path(directory, bits)
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            print(f"Building {bits}-bit colour LUT ({(1 << bits) ** 3} entries)...")
+            lut = self.build_lut(bits)
+
+            # Write then rename so a reader never sees a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, lut)
+            os.replace(tmp_path, path)
+            print(f"Saved colour LUT to {path}.")
+
+        self.load_lut(path)
+        return path
+
+    def _lut_keys(self, colors: "np.ndarray") -> "np.ndarray":
+        bits = self.lut_bits
+        shift = 8 - bits
+        q = colors[:, :3].astype(np.int32) >> shift
+        return (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
 
     def _load_palettes(self) -> dict:
-        import os
-        import json
-        
         # Try finding palette.json in same dir as this file
         base_dir = os.path.dirname(__file__)
         path = os.path.join(base_dir, 'palette.json')
@@ -199,9 +387,6 @@ class ColorMatcher:
         return mapping
 
     def load_cache_from_disk(self, path: str) -> dict:
-        import json
-        import os
-        
         # Determine if v2 based on filename or try load
         # We will switch to enforcing path usually passed as 'color_cache_v2.json'
         
@@ -258,7 +443,6 @@ class ColorMatcher:
             return {}
 
     def save_cache_to_disk(self, path: str, cache: dict):
-        import json
         try:
             # Expecting cache to be V2: { mode: { (r,g,b,a): id } }
             
@@ -0,0 +1,74 @@
+from typing import Tuple
+import numpy as np
+
+class Hollower:
+    """
+    Hollowing on bit-packed volumes: np.packbits along Z (big bit order, 8 voxels
+    per byte), shape (B, X, Y, ceil(Z / 8)). Voxels outside the volume are empty.
+
+    Erosion uses the 6-neighbourhood, one axis at a time, so a shell of thickness
+    1 keeps exactly the voxels with an empty 6-neighbour (the PoseTemplate
+    neighbour table rule) and thickness N keeps voxels within N steps of empty.
+    """
+
+    @staticmethod
+    def pack(batch: int, dims: Tuple[int, int, int], b: np.ndarray, gx: np.ndarray, gy: np.ndarray, gz: np.ndarray) -> np.ndarray:
+        """
+        Packs filled voxels (batch index and grid coordinates, no duplicates) into a bit volume.
+        Never builds the (B, X, Y, Z) bool volume.
+        """
+        dim_x, dim_y, dim_z = dims
+        z_bytes = (dim_z + 7) // 8
+        byte_index = ((b.astype(np.int64) * dim_x + gx) * dim_y + gy) * z_bytes + (gz >> 3)
+        # Distinct voxels set distinct bits of a byte, so summing them is OR
+        bit = (0x80 >> (gz & 7)).astype(np.float64)
+        bits = np.bincount(byte_index, weights=bit, minlength=batch * dim_x * dim_y * z_bytes)
+        return bits.astype(np.uint8).reshape(batch, dim_x, dim_y, z_bytes)
+
+    @staticmethod
+    def lookup(bits: np.ndarray, b: np.ndarray, gx: np.ndarray, gy: np.ndarray, gz: np.ndarray) -> np.ndarray:
+        """Reads single voxels back as bool."""
+        return ((bits[b, gx, gy, gz >> 3] >> (7 - (gz & 7))) & 1).astype(bool)
+
+    @staticmethod
+    def erode(bits: np.ndarray) -> np.ndarray:
+        """One 6-neighbour erosion step: a voxel survives if it and all 6 neighbours are filled."""
+        out = bits.copy()
+
+        # X and Y: whole bytes, neighbours past the edge are empty
+        out[:, 1:] &= bits[:, :-1]
+        out[:, :-1] &= bits[:, 1:]
+        out[:, 0] = 0
+        out[:, -1] = 0
+        out[:, :, 1:] &= bits[:, :, :-1]
+        out[:, :, :-1] &= bits[:, :, 1:]
+        out[:, :, 0] = 0
+        out[:, :, -1] = 0
+
+        # Z: bit shifts carrying across bytes (bit 7 is the lowest z of a byte)
+        carry = np.zeros_like(bits)
+        carry[..., :-1] = bits[..., 1:] >> 7
+        out &= (bits << 1) | carry # z + 1
+        carry[...] = 0
+        carry[..., 1:] = bits[..., :-1] << 7
+        out &= (bits >> 1) | carry # z - 1
+        return out
+
+    @staticmethod
+    def interior(bits: np.ndarray, thickness: int) -> np.ndarray:
+        """Voxels more than `thickness` steps from an empty voxel."""
+        for _ in range(thickness):
+            bits = Hollower.erode(bits)
+        return bits
+
+    @staticmethod
+    def pillars(dims: Tuple[int, int, int], origin: Tuple[int, int, int], spacing: int) -> np.ndarray:
+        """
+        Bit mask of vertical support columns at world x, z multiples of `spacing`.
+        Returns: (1, X, 1, ceil(Z / 8)) uint8, broadcastable over batch and Y
+        """
+        dim_x, _, dim_z = dims
+        on_x = (np.arange(dim_x) + origin[0]) % spacing == 0
+        on_z = (np.arange(dim_z) + origin[2]) % spacing == 0
+        columns = on_x[:, np.newaxis] & on_z[np.newaxis, :]
+        return np.packbits(columns, axis=1)[np.newaxis, :, np.newaxis, :]
@@ -119,164 +119,144 @@ class MacroVoxelizer:
     # Codebase dumper usually puts Front at +Z or similar?
     # I'll just map (x,y,z) iteratively.
 
+    @staticmethod
+    def _face_local(face_name: str, u_off: np.ndarray, v_off: np.ndarray, fw: int, bw: int, bh: int, bd: int):
+        """
+        Maps face texel offsets to local pixel coords (l_x, l_y, l_z) inside the box.
+        Standard Planar Mapping (Z=0 is Front, v goes down):
+        Top/Bottom: x=u, z=v. Front/Back: x=u, y=v. Right/Left: z=u, y=v.
+        Back and Left are flipped horizontally.
+        """
+        l_y_side = bh - 1 - v_off
+        if face_name == "top":
+            return u_off, np.full_like(u_off, bh - 1), v_off
+        if face_name == "bottom":
+            return u_off, np.zeros_like(u_off), v_off
+        if face_name == "front":
+            return u_off, l_y_side, np.zeros_like(u_off)
+        if face_name == "back":
+            return fw - 1 - u_off, l_y_side, np.full_like(u_off, bd - 1)
+        if face_name == "right":
+            return np.full_like(u_off, bw - 1), l_y_side, u_off
+        # left
+        return np.zeros_like(u_off), l_y_side, fw - 1 - u_off
+
+    @staticmethod
+    def _shell_offsets(scale: int) -> np.ndarray:
+        """
+        (M, 3) block offsets of the hollow shell around a texel cube [0, scale)^3:
+        the surface of [-2, scale + 2)^3 (1 block gap, 1 block wall), built as
+        6 non-overlapping walls so the cost is O(scale^2).
+        """
+        full = np.arange(-2, scale + 2)
+        inner = np.arange(-1, scale + 1)
+        ends = np.array([-2, scale + 1])
+        walls = [(ends, full, full), (inner, ends, full), (inner, inner, ends)]
+        return np.concatenate([np.stack(np.meshgrid(*w, indexing='ij'), axis=-1).reshape(-1, 3) for w in walls])
+
     @staticmethod
     def generate(skin_img: Image.Image, scale: int = 3, solid_mode: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         """
-        Returns (wx, wy, wz, colors) blocks.
+        Returns (wx, wy, wz, colors) blocks, one per coordinate (sparse, air is not listed).
+
+        Every opaque inner texel becomes a solid scale^3 cube and every opaque overlay
+        texel a hollow (scale + 4)^3 shell around it (1 block gap, 1 block wall).
+        Overlapping blocks resolve to the one emitted last in part / face / texel order
+        (inner cube before its shell), the same winner as adding them one by one.
+
+        Cubes are resolved on a grid with one cell per skin pixel and then expanded; shells
+        are scattered as O(scale^2) walls per texel. Overlaps are resolved on the sparse
+        set of emitted blocks, so time and memory follow the output, not the bounding box.
         """
+        if scale < 1:
+            raise ValueError(f"Macro scale must be at least 1, got {scale}")
+
         # Ensure RGBA
         skin_arr = np.array(skin_img.convert("RGBA"))
         h, w_img, _ = skin_arr.shape
-        
-        blocks_x = []
-        blocks_y = []
-        blocks_z = []
-        blocks_c = []
-        
-        # Helper to add blocks
-        def add(x, y, z, c):
-             blocks_x.extend(x)
-             blocks_y.extend(y)
-             blocks_z.extend(z)
-             blocks_c.extend(c)
 
+        def texels(u, v):
+            # Colours and opacity (alpha > 10) of texels, out of bounds counts as transparent
+            valid = (u >= 0) & (u < w_img) & (v >= 0) & (v < h)
+            pixels = np.zeros((u.size, 4), dtype=np.uint8)
+            pixels[valid] = skin_arr[v[valid], u[valid]]
+            return pixels, pixels[:, 3] > 10
+
+        positions, colors_in, colors_out, opaque_in, opaque_out = [], [], [], [], []
         for name, (bw, bh, bd), (bu, bv), (ox, oy, oz), (ou, ov) in MacroVoxelizer.DEFINITIONS:
-            
             faces = MacroVoxelizer.get_faces(bw, bh, bd)
-            
-            # Iterate Faces
+
             for face_name, (fu, fv, fw, fh, axis) in faces.items():
-                
-                # Inner Face Loop
-                for u_off in range(fw):
-                    for v_off in range(fh):
-                        # 1. INNER PIXEL
-                        u_in = bu + fu + u_off
-                        v_in = bv + fv + v_off
-                        
-                        pixel_in = None
-                        if 0 <= u_in < w_img and 0 <= v_in < h:
-                             pixel = skin_arr[v_in, u_in]
-                             if pixel[3] > 10: # Opaque enough
-                                 pixel_in = pixel
+                # All texels of the face, u major (the old u_off / v_off loop order)
+                u_off, v_off = [a.ravel() for a in np.indices((fw, fh))]
+                pixel, opaque = texels(bu + fu + u_off, bv + fv + v_off)
+                colors_in.append(pixel)
+                opaque_in.append(opaque)
+                pixel, opaque = texels(ou + fu + u_off, ov + fv + v_off)
+                colors_out.append(pixel)
+                opaque_out.append(opaque)
+
+                # Absolute Pixel Pos
+                l_x, l_y, l_z = MacroVoxelizer._face_local(face_name, u_off, v_off, fw, bw, bh, bd)
+                positions.append(np.stack([ox + l_x, oy + l_y, oz + l_z], axis=1))
+
+        # Texels are numbered in emission order; a block's rank is 2 * texel (+1 for shells)
+        pos = np.concatenate(positions)
+        colors_in = np.concatenate(colors_in)
+        colors_out = np.concatenate(colors_out)
+        seq_in = np.flatnonzero(np.concatenate(opaque_in))
+        seq_out = np.flatnonzero(np.concatenate(opaque_out))
+
+        if seq_in.size == 0 and seq_out.size == 0:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty, np.zeros((0, 4), dtype=np.uint8)
+
+        # 1. INNER VOXELS (Solid Cubes): winning texel per pixel cell (a small grid at
+        # pixel resolution, independent of scale), then one scale^3 cube per filled cell
+        p_lo = pos.min(axis=0)
+        p_dims = pos.max(axis=0) - p_lo + 1
+        cell = np.full(int(np.prod(p_dims)), -1, dtype=np.int64)
+        np.maximum.at(cell, np.ravel_multi_index(tuple((pos[seq_in] - p_lo).T), tuple(p_dims)), 2 * seq_in)
+        filled = np.flatnonzero(cell >= 0)
 
-                        # 2. OUTER PIXEL (Overlay)
-                        u_out = ou + fu + u_off
-                        v_out = ov + fv + v_off
-                        
-                        pixel_out = None
-                        if 0 <= u_out < w_img and 0 <= v_out < h:
-                             pixel = skin_arr[v_out, u_out]
-                             if pixel[3] > 10:
-                                 pixel_out = pixel
-                        
-                        if pixel_in is None and pixel_out is None:
-                            continue
+        # Blocks are linearized over the scaled bounding box plus a 2 block margin for the
+        # shells; only emitted blocks are ever materialized (sparse 1-D keys, no dense grid).
+        # Each block is packed as key << rank_bits | rank, so one sort orders blocks by key
+        # and, within a key, by rank: the last entry of every key is the winner.
+        lo = p_lo * scale - 2
+        dims = p_dims * scale + 4
+        strides = np.array([dims[1] * dims[2], dims[2], 1], dtype=np.int64)
+        rank_bits = int(2 * pos.shape[0]).bit_length()
+        strides <<= rank_bits
 
-                        # Calculate "Pixel Space" coordinate (Relative to Origin ox,oy,oz)
-                        # We need to map face (u,v) to volume (x,y,z)
-                        # Top (d, 0, w, d): u_off maps to x, v_off maps to z (roughly)
-                        # Top Face: y = bh (top). x = u_off. z = v_off.
-                        # Note: Textures are often flipped or rotated.
-                        # Standard Planar Mapping:
-                        # Top: x=[0..w], z=[0..d].
-                        # Bottom: x=[0..w], z=[0..d].
-                        # Front: x=[0..w], y=[0..h].
-                        
-                        # Let's calculate l_x, l_y, l_z (local pixel coords)
-                        l_x, l_y, l_z = 0, 0, 0
-                        
-                        # Mapping Logic (Simplified for readability, verify flips if needed)
-                        if face_name == "top":
-                             l_x = u_off
-                             l_z = v_off
-                             l_y = bh - 1 # Top layer
-                        elif face_name == "bottom":
-                             l_x = u_off
-                             l_z = v_off
-                             l_y = 0
-                             # Typically bottom is flipped?
-                             # Let's ignore complex texture flips for 'Macro' pass unless crucial.
-                             # User said "Refactor base loop".
-                        elif face_name == "front":
-                             l_x = u_off
-                             l_y = bh - 1 - v_off # v goes down
-                             l_z = 0 # Front face at 0? Or bd?
-                             # If Front is -Z, it's 0. If Back is +Z, it's bd.
-                             # Let's assume standard order: Z=0 is Front.
-                        elif face_name == "back":
-                             l_x = fw - 1 - u_off # Back often flipped horizontally?
-                             l_y = bh - 1 - v_off
-                             l_z = bd - 1
-                        elif face_name == "right":
-                             l_z = u_off
-                             l_y = bh - 1 - v_off
-                             l_x = bw - 1 # Right side
-                        elif face_name == "left":
-                             l_z = fw - 1 - u_off
-                             l_y = bh - 1 - v_off
-                             l_x = 0
-                             
-                        # Absolute Pixel Pos
-                        px = ox + l_x
-                        py = oy + l_y
-                        pz = oz + l_z
-                        
-                        # --- GENERATE BLOCKS ---
-                        
-                        # BASE WORLD COORD
-                        bx = px * scale
-                        by = py * scale
-                        bz = pz * scale
-                        
-                        # 1. INNER VOXEL (Solid Cube)
-                        if pixel_in is not None:
-                            # Generate cube [0, scale)
-                            # Vectorized add? No, small loops are fine or use repeat.
-                            # Size: scale^3
-                            
-                            # Create grid
-                            xx, yy, zz = np.indices((scale, scale, scale))
-                            xx = xx.flatten() + bx
-                            yy = yy.flatten() + by
-                            zz = zz.flatten() + bz
-                            
-                            count = xx.size
-                            cc = np.tile(pixel_in, (count, 1))
-                            
-                            add(xx, yy, zz, cc)
-                            
-                        # 2. OUTER VOXEL (Hollow Shell)
-                        if pixel_out is not None:
-                            # Shell Logic:
-                            # Offset 1 block gap.
-                            # Start: -2 (Gap 1, Shell 1).
-                            # End: scale + 1.
-                            # Range: [-2, scale + 2).
-                            # Only walls.
-                            
-                            start = -2
-                            end = scale + 2 # Exclusive
-                            full_range = range(start, end)
-                            
-                            # Iterating simply:
-                            for sx in full_range:
-                                for sy in full_range:
-                                    for sz in full_range:
-                                        # Check if boundary (Wall)
-                                        # Boundary if any coord is at start or end-1
-                                        if sx == start or sx == end - 1 or \
-                                           sy == start or sy == end - 1 or \
-                                           sz == start or sz == end - 1:
-                                           
-                                           # Add Block
-                                           add([bx + sx], [by + sy], [bz + sz], [pixel_out])
-                        
-        # Convert to arrays
+        cube_base = (np.stack(np.unravel_index(filled, tuple(p_dims)), axis=1) * scale + 2) @ strides + cell[filled]
+        cube_offsets = np.stack([a.ravel() for a in np.indices((scale, scale, scale))], axis=1) @ strides
+
+        # 2. OUTER VOXELS (Hollow Shells), by broadcasting the wall offsets
+        shell_base = (pos[seq_out] * scale - lo) @ strides + 2 * seq_out + 1
+        shell_offsets = MacroVoxelizer._shell_offsets(scale) @ strides
+
+        num_cube = cube_base.size * cube_offsets.size
+        packed = np.empty(num_cube + shell_base.size * shell_offsets.size, dtype=np.int64)
+        np.add(cube_base[:, np.newaxis], cube_offsets, out=packed[:num_cube].reshape(cube_base.size, cube_offsets.size))
+        np.add(shell_base[:, np.newaxis], shell_offsets, out=packed[num_cube:].reshape(shell_base.size, shell_offsets.size))
+        packed.sort()
+
+        keys = packed >> rank_bits
+        last = np.ones(keys.size, dtype=bool)
+        np.not_equal(keys[1:], keys[:-1], out=last[:-1])
+
+        # One block per key, in grid order (x, then y, then z)
+        blocks = keys[last]
+        winners = packed[last] & ((1 << rank_bits) - 1)
+        del packed, keys, last
+
+        texel = winners >> 1
+        colors = np.where((winners & 1 == 0)[:, np.newaxis], colors_in[texel], colors_out[texel])
+        gx, gy, gz = np.unravel_index(blocks, tuple(dims))
         return (
-            np.array(blocks_x, dtype=np.int32),
-            np.array(blocks_y, dtype=np.int32),
-            np.array(blocks_z, dtype=np.int32),
-            np.array(blocks_c, dtype=np.uint8)
+            (gx + lo[0]).astype(np.int32),
+            (gy + lo[1]).astype(np.int32),
+            (gz + lo[2]).astype(np.int32),
+            colors
         )
-
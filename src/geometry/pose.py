@@ -1,11 +1,14 @@
-from typing import Dict, Any
-from .rig import Rig
-from .primitives import Node
+from typing import Dict, Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Annotations only: listing poses must not import the (numpy) geometry
+    from .rig import Rig
+    from .primitives import Node
 
 class PoseApplicator:
     @staticmethod
     @staticmethod
-    def apply_pose(rig: Rig, pose_data: Dict[str, Dict[str, Any]]):
+    def apply_pose(rig: "Rig", pose_data: Dict[str, Dict[str, Any]]):
         """
         Applies rotations and positions to the Rig's nodes.
         Format:
@@ -20,7 +23,7 @@ class PoseApplicator:
         """
         
         nodes_map = {}
-        def traverse(node: Node):
+        def traverse(node: "Node"):
             nodes_map[node.name] = node
             for child in node.children:
                 traverse(child)
@@ -63,6 +66,9 @@ class PoseApplicator:
             else:
                 print(f"Warning: Pose references unknown part '{part_name}'")
 
+        # Setting rotation/origin only marked the posed subtrees dirty; evaluate them once here
+        rig.update_world_matrices()
+
     POSES = {
         "standing": {
 
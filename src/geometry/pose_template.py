@@ -0,0 +1,135 @@
+from typing import List, Sequence, Tuple, Union
+from PIL import Image
+import numpy as np
+
+from .hollow import Hollower
+
+class PoseTemplate:
+    """
+    Compiled, colour-independent result of rasterizing a posed rig.
+    Built by Rasterizer.compile_template(). Everything that depends only on the
+    rig, pose and flags (inverse transforms, face selection, UV mapping, overlay
+    priority) is resolved once; rendering a skin is a gather into the skin array.
+
+    Per candidate voxel we store a "fallback chain" of texel sources, highest
+    priority first. Sources index into a flattened (H*W + C + 1, 4) table made of
+    the skin pixels, C constant part colours (items) and one transparent sentinel.
+    The rendered colour is the first source in the chain with alpha > 0, which
+    reproduces the painter's algorithm of the rasterizer exactly.
+    """
+
+    def __init__(self, wx: np.ndarray, wy: np.ndarray, wz: np.ndarray, chains: np.ndarray,
+                 solid_colors: np.ndarray, neighbours: Union[np.ndarray, None], skin_size: Tuple[int, int]):
+        """
+        wx, wy, wz: (V,) int32 world coordinates of candidate voxels
+        chains: (V, L) int32 source indices, highest priority first, padded with the sentinel
+        solid_colors: (C, 4) uint8 constant colours of untextured parts
+        neighbours: (V, 6) int32 indices of the 6-neighbours (-1 = never filled, -2 = always filled), None for solid statues
+        skin_size: (width, height) of the skin this template was compiled for
+        """
+        self.wx = wx
+        self.wy = wy
+        self.wz = wz
+        self.chains = chains
+        self.solid_colors = solid_colors
+        self.neighbours = neighbours
+        self.skin_size = skin_size
+
+    @property
+    def num_voxels(self) -> int:
+        return self.wx.size
+
+    def _skin_array(self, skin: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        if isinstance(skin, Image.Image):
+            if skin.mode != "RGBA":
+                skin = skin.convert("RGBA")
+            skin = np.asarray(skin)
+
+        skin_w, skin_h = self.skin_size
+        if skin.shape[-3:] != (skin_h, skin_w, 4):
+            raise ValueError(f"Template compiled for {skin_w}x{skin_h} skins, got {skin.shape[-2]}x{skin.shape[-3]}")
+        return np.ascontiguousarray(skin, dtype=np.uint8)
+
+    def render(self, skin: Union[Image.Image, np.ndarray], shell: int = 1, pillars: int = 0):
+        """
+        Renders a skin through the template.
+        skin: PIL Image or (H, W, 4) uint8 array matching skin_size.
+        shell / pillars: Hollowing options, see render_batch.
+        Returns raw arrays (wx, wy, wz, colors) identical to Rasterizer.rasterize(return_raw=True).
+        """
+        return self.render_batch(self._skin_array(skin)[np.newaxis], shell, pillars)[0]
+
+    def render_batch(self, skins: Union[np.ndarray, Sequence[Union[Image.Image, np.ndarray]]], shell: int = 1, pillars: int = 0) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Renders a stack of skins in one vectorized pass.
+        skins: (B, H, W, 4) uint8 array, or a sequence of PIL Images / (H, W, 4) arrays.
+        shell: Wall thickness of hollow statues (voxels within `shell` 6-neighbour steps of empty space are kept).
+        pillars: If > 0, also keep interior voxels on vertical columns at world x, z multiples of `pillars`.
+        Both are ignored for solid templates.
+        Returns a list of B (wx, wy, wz, colors) tuples, one per skin.
+        """
+        if shell < 1:
+            raise ValueError(f"Shell thickness must be at least 1, got {shell}")
+
+        if not (isinstance(skins, np.ndarray) and skins.ndim == 4):
+            skins = np.stack([self._skin_array(s) for s in skins])
+        skin_data = self._skin_array(skins)
+
+        batch = skin_data.shape[0]
+        num_cand = self.num_voxels
+
+        if num_cand == 0:
+            empty = np.zeros(0, dtype=np.int32)
+            return [(empty, empty, empty, np.zeros((0, 4), dtype=np.uint8)) for _ in range(batch)]
+
+        # Source table per skin: skin pixels, then constant colours, then the transparent sentinel
+        constants = np.concatenate([self.solid_colors, np.zeros((1, 4), dtype=np.uint8)])
+        source = np.concatenate([
+            skin_data.reshape(batch, -1, 4),
+            np.broadcast_to(constants, (batch,) + constants.shape)
+        ], axis=1) # (B, T, 4)
+
+        # Alpha of every chain entry -> first opaque entry wins
+        opaque = source[:, :, 3][:, self.chains] > 0 # (B, V, L)
+        has_block = opaque.any(axis=2)
+        first = opaque.argmax(axis=2)
+        winners = self.chains[np.arange(num_cand), first] # (B, V)
+
+        keep_mask = has_block
+        if self.neighbours is not None and (shell > 1 or pillars > 0):
+            keep_mask = has_block & ~self._interior(has_block, shell, pillars)
+        elif self.neighbours is not None:
+            # Hollow: drop voxels whose 6 neighbours are all filled.
+            # Index -1 hits the appended False (never filled), -2 the appended True (always filled).
+            has_ext = np.concatenate([has_block, np.ones((batch, 1), dtype=bool), np.zeros((batch, 1), dtype=bool)], axis=1)
+            internal = has_ext[:, self.neighbours].all(axis=2)
+            keep_mask = has_block & ~internal
+
+        results = []
+        for b in range(batch):
+            keep = np.flatnonzero(keep_mask[b])
+            colors = source[b, winners[b, keep]]
+            results.append((self.wx[keep], self.wy[keep], self.wz[keep], colors))
+        return results
+
+    def _interior(self, has_block: np.ndarray, shell: int, pillars: int) -> np.ndarray:
+        """
+        (B, V) mask of filled voxels hidden behind a `shell` thick wall, minus the pillars.
+        Runs on bit-packed volumes over the template's bounding box (see Hollower).
+        """
+        if (self.neighbours == -2).any():
+            # Surface templates do not sample the inside of parts
+            raise ValueError("Surface-only templates only support a 1-voxel shell without pillars")
+
+        origin = (int(self.wx.min()), int(self.wy.min()), int(self.wz.min()))
+        dims = (int(self.wx.max()) - origin[0] + 1, int(self.wy.max()) - origin[1] + 1, int(self.wz.max()) - origin[2] + 1)
+        b, v = np.nonzero(has_block)
+        gx, gy, gz = self.wx[v] - origin[0], self.wy[v] - origin[1], self.wz[v] - origin[2]
+
+        inner = Hollower.interior(Hollower.pack(has_block.shape[0], dims, b, gx, gy, gz), shell)
+        if pillars > 0:
+            inner &= ~Hollower.pillars(dims, origin, pillars)
+
+        internal = np.zeros(has_block.shape, dtype=bool)
+        internal[b, v] = Hollower.lookup(inner, b, gx, gy, gz)
+        return internal
@@ -1,6 +1,7 @@
 import math
 from typing import List, Tuple, Optional, Dict
 from dataclasses import dataclass, field
+import numpy as np
 
 @dataclass
 class PixelBlock:
@@ -124,13 +125,34 @@ def transform_point(m: Matrix, x: float, y: float, z: float) -> Tuple[float, flo
     # w = m[12]*x ... + m[15] which is 1.0 usually
     return (nx, ny, nz)
 
+def compose_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # (4, 4) array version of multiply_matrix: C = A * B.
+    # Accumulates k in the same order (no BLAS/FMA), so results match the tuple helper bit for bit.
+    res = a[:, 0:1] * b[0:1, :]
+    for k in range(1, 4):
+        res = res + a[:, k:k+1] * b[k:k+1, :]
+    return res
+
 # --- Primitives ---
 
 class Node:
+    """
+    Transform hierarchy node.
+
+    Local and world matrices are cached as read-only (4, 4) float64 arrays (row major,
+    column vectors, same convention as the tuple helpers above). Setting origin or
+    rotation marks the node's subtree dirty; dirty world matrices are rebuilt from the
+    parent's cached one on the next get_world_matrix() or update_world_matrices().
+    Invariant: a dirty node has only dirty descendants.
+    """
     def __init__(self, name: str, parent: Optional['Node'] = None):
         self.name = name
         self.parent = parent
         self.children: List['Node'] = []
+
+        # Cached transforms (None = dirty)
+        self._local: Optional[np.ndarray] = None
+        self._world: Optional[np.ndarray] = None
         
         # Local Transform Properties
         self.origin: Tuple[float, float, float] = (0.0, 0.0, 0.0) # Pivot point relative to parent
@@ -139,35 +161,96 @@ class Node:
         
         if parent:
             parent.add_child(self)
+
+    @property
+    def origin(self) -> Tuple[float, float, float]:
+        return self._origin
+
+    @origin.setter
+    def origin(self, value: Tuple[float, float, float]):
+        self._origin = tuple(value)
+        self._local = None
+        self.invalidate()
+
+    @property
+    def rotation(self) -> Tuple[float, float, float]:
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, value: Tuple[float, float, float]):
+        self._rotation = tuple(value)
+        self._local = None
+        self.invalidate()
+
+    def invalidate(self):
+        """Marks the world matrix of this node and all its descendants dirty."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._world is None:
+                continue # Already dirty, and so is its subtree
+            node._world = None
+            stack.extend(node.children)
             
     def add_child(self, child: 'Node'):
         if child not in self.children:
             self.children.append(child)
             child.parent = self
+            child.invalidate()
             
-    def get_local_matrix(self) -> Matrix:
+    def get_local_matrix(self) -> np.ndarray:
         # T * R * S
         # Translation is self.origin
-        t_mat = translation_matrix(*self.origin)
-        r_mat = rotation_matrix(*self.rotation)
-        # We don't implement generalized scale matrix yet as we only use uniform size, 
-        # but let's effectively ignore scale in matrix for now and handle box sizing separately 
-        # UNLESS we want "Shrinking" boxes.
-        # Overlays are often "bigger" boxes, not "scaled" space (pixels don't get bigger).
-        # So scale logic might belong in the Part definition, not space transform.
-        return multiply_matrix(t_mat, r_mat)
+        if self._local is None:
+            t_mat = translation_matrix(*self.origin)
+            r_mat = rotation_matrix(*self.rotation)
+            # We don't implement generalized scale matrix yet as we only use uniform size, 
+            # but let's effectively ignore scale in matrix for now and handle box sizing separately 
+            # UNLESS we want "Shrinking" boxes.
+            # Overlays are often "bigger" boxes, not "scaled" space (pixels don't get bigger).
+            # So scale logic might belong in the Part definition, not space transform.
+            local = np.array(multiply_matrix(t_mat, r_mat)).reshape(4, 4)
+            local.setflags(write=False)
+            self._local = local
+        return self._local
+
+    def get_world_matrix(self) -> np.ndarray:
+        """World transform as a read-only (4, 4) array, rebuilt only if dirty."""
+        if self._world is None:
+            # Walk up to the nearest clean ancestor, then rebuild downwards
+            chain = []
+            node = self
+            while node is not None and node._world is None:
+                chain.append(node)
+                node = node.parent
+            for node in reversed(chain):
+                node._compute_world()
+        return self._world
 
-    def get_world_matrix(self) -> Matrix:
+    def _compute_world(self):
         local = self.get_local_matrix()
         if self.parent:
-            parent_world = self.parent.get_world_matrix()
-            return multiply_matrix(parent_world, local)
-        return local
+            world = compose_matrix(self.parent._world, local)
+            world.setflags(write=False)
+            self._world = world
+        else:
+            self._world = local
+
+    def update_world_matrices(self):
+        """Rebuilds every dirty world matrix in this subtree in one top-down pass."""
+        self.get_world_matrix()
+        stack = list(self.children)
+        while stack:
+            node = stack.pop()
+            if node._world is None:
+                node._compute_world()
+            stack.extend(node.children)
         
     def world_to_local_point(self, wx: float, wy: float, wz: float) -> Tuple[float, float, float]:
+        # Affine inverse: R^T * (p - T)
         world_mat = self.get_world_matrix()
-        inv_mat = invert_affine_matrix(world_mat)
-        return transform_point(inv_mat, wx, wy, wz)
+        local = world_mat[:3, :3].T @ (np.array([wx, wy, wz]) - world_mat[:3, 3])
+        return (float(local[0]), float(local[1]), float(local[2]))
 
 @dataclass
 class FaceUV:
@@ -200,16 +283,12 @@ class BoxPart(Node):
         ]
         
         world_mat = self.get_world_matrix()
+        c = np.array(corners, dtype=np.float64)
+        # Same operation order as transform_point
+        world = c[:, 0:1] * world_mat[:3, 0] + c[:, 1:2] * world_mat[:3, 1] + c[:, 2:3] * world_mat[:3, 2] + world_mat[:3, 3]
         
-        min_x, min_y, min_z = float('inf'), float('inf'), float('inf')
-        max_x, max_y, max_z = float('-inf'), float('-inf'), float('-inf')
-        
-        for cx, cy, cz in corners:
-            wx, wy, wz = transform_point(world_mat, cx, cy, cz)
-            min_x, min_y, min_z = min(min_x, wx), min(min_y, wy), min(min_z, wz)
-            max_x, max_y, max_z = max(max_x, wx), max(max_y, wy), max(max_z, wz)
-            
-        return (min_x, min_y, min_z), (max_x, max_y, max_z)
+        lo, hi = world.min(axis=0), world.max(axis=0)
+        return (float(lo[0]), float(lo[1]), float(lo[2])), (float(hi[0]), float(hi[1]), float(hi[2]))
         
     def get_texture_coord(self, lx: float, ly: float, lz: float) -> Optional[Tuple[int, int]]:
         """
@@ -1,48 +1,105 @@
-from typing import List, Tuple, Dict, Set, Optional
+from typing import List, Tuple, Dict, Set, Optional, Sequence
 from PIL import Image
 import numpy as np
 
 from .primitives import BoxPart, PixelBlock, Node
+from .pose_template import PoseTemplate
 
 class Rasterizer:
     @staticmethod
-    def rasterize(parts: List[BoxPart], skin: Image.Image, solid: bool = False, quality: int = 2, return_raw: bool = False, ignore_overlays: bool = False):
+    def rasterize(parts: List[BoxPart], skin: Image.Image, solid: bool = False, quality: int = 2, return_raw: bool = False, ignore_overlays: bool = False, surface: bool = False,
+                  kernel: Optional[Sequence[Sequence[float]]] = None, adaptive: bool = True, max_memory: Optional[int] = None,
+                  shell: int = 1, pillars: int = 0):
 
         """
         Generates a list of colored blocks using Vectorized Inverse Mapping.
-        Strategy:
-        1. Determine Global AABB.
-        2. Generate 3D Grid of Candidate Voxels.
-        3. For each part, Inverse Transform Grid -> Local.
-        4. Mask points strictly inside the part box.
-        5. Map Local Points -> UV -> Color.
-        6. Apply Painters Algorithm (Overlays overwrite).
-        7. Apply Hollow Optimization (Erosion) if needed.
-        
+        Compiles a PoseTemplate for the parts and renders the skin through it.
+        Callers rendering many skins with the same pose should keep the template
+        from compile_template() and call template.render() directly.
+
         quality: 1 = Center sample only (Fast). 2 = 7 samples (Center + 6 faces) to fix cracks.
         ignore_overlays: If True, skips rendering secondary skin layers.
+        surface: If True, only voxelizes the textured faces (see compile_template). Always hollow.
+        kernel / adaptive: Sampling policy, see compile_template.
+        max_memory: Byte budget for large statues, see compile_template.
+        shell / pillars: Wall thickness and interior support columns of hollow statues, see PoseTemplate.render_batch.
         """
         # Ensure skin is RGBA and numpy array
         if skin.mode != "RGBA":
             skin = skin.convert("RGBA")
-        
-        # Filter overlays if requested
-        if ignore_overlays:
-            parts = [p for p in parts if not getattr(p, 'is_overlay', False)]
 
         # skin_data: (Height, Width, 4)
         skin_data = np.array(skin)
         skin_h, skin_w, _ = skin_data.shape
-        
+
+        template = Rasterizer.compile_template(parts, solid=solid, quality=quality, ignore_overlays=ignore_overlays, skin_size=(skin_w, skin_h), surface=surface,
+                                               kernel=kernel, adaptive=adaptive, max_memory=max_memory)
+        wx, wy, wz, final_colors = template.render(skin_data, shell, pillars)
+
+        if return_raw:
+            return wx, wy, wz, final_colors
+
+        # Ensure native types
+        return [
+            PixelBlock(int(wx[i]), int(wy[i]), int(wz[i]), int(r), int(g), int(b), int(a))
+            for i, (r, g, b, a) in enumerate(final_colors)
+        ]
+
+    @staticmethod
+    def rasterize_batch(parts: List[BoxPart], skins: np.ndarray, solid: bool = False, quality: int = 2, ignore_overlays: bool = False, surface: bool = False,
+                        kernel: Optional[Sequence[Sequence[float]]] = None, adaptive: bool = True, max_memory: Optional[int] = None,
+                        shell: int = 1, pillars: int = 0) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Rasterizes a stack of skins onto the same posed parts.
+        The geometry is compiled once and colours are gathered for all skins in one pass.
+        skins: (B, H, W, 4) uint8 array (e.g. np.stack of SkinLoader results).
+        Returns a list of B raw (wx, wy, wz, colors) tuples, as rasterize(return_raw=True).
+        """
+        skins = np.asarray(skins, dtype=np.uint8)
+        skin_h, skin_w = skins.shape[1:3]
+
+        template = Rasterizer.compile_template(parts, solid=solid, quality=quality, ignore_overlays=ignore_overlays, skin_size=(skin_w, skin_h), surface=surface,
+                                               kernel=kernel, adaptive=adaptive, max_memory=max_memory)
+        return template.render_batch(skins, shell, pillars)
+
+    @staticmethod
+    def compile_template(parts: List[BoxPart], solid: bool = False, quality: int = 2, ignore_overlays: bool = False, skin_size: Tuple[int, int] = (64, 64), surface: bool = False,
+                         kernel: Optional[Sequence[Sequence[float]]] = None, adaptive: bool = True, max_memory: Optional[int] = None) -> PoseTemplate:
+        """
+        Resolves all colour-independent geometry of a posed rig into a PoseTemplate.
+        Strategy:
+        1. Determine Global AABB.
+        2. Generate 3D Grid of Candidate Voxels.
+        3. For each part, Inverse Transform the grid voxels inside its world AABB -> Local.
+        4. Mask points strictly inside the part box.
+        5. Map Local Points -> UV -> Texel index.
+        6. Order candidates per voxel by Painters Algorithm (Overlays overwrite).
+        7. Precompute 6-neighbour table for Hollow Optimization (Erosion) if needed.
+
+        skin_size: (width, height) of the skins that will be rendered.
+        surface: Only sample the voxels on the surface of each part (found by forward
+                 mapping its faces) instead of the whole volume; cost ~ surface area.
+                 Always hollow, so `solid` is ignored.
+        kernel: Sample offsets (x, y, z) inside a voxel, in [0, 1). Later samples take
+                priority. Overrides `quality` (1 = KERNELS['center'], 2 = KERNELS['cross7']).
+        adaptive: Grid-aligned parts (rotation a multiple of 90 degrees) are sampled at the
+                  voxel centre only, with the full kernel just where the nearest face is
+                  ambiguous. Gives the same result as sampling every voxel with the kernel.
+        max_memory: Approximate byte budget for the sampling working set. The grid is then
+                    processed in Y-slabs of as many rows as fit; the result is the same.
+        """
+        # Filter overlays if requested
+        if ignore_overlays:
+            parts = [p for p in parts if not getattr(p, 'is_overlay', False)]
+
+        skin_w, skin_h = skin_size
+        num_texels = skin_w * skin_h
+
         # 1. Calculate Global AABB
         min_x, min_y, min_z = float('inf'), float('inf'), float('inf')
         max_x, max_y, max_z = float('-inf'), float('-inf'), float('-inf')
-        
+
         # Sort candidates to ensure overlays overwrite
-        # Actually logic is: Iterate all parts. 
-        # If multiple parts claim a voxel, which one wins?
-        # Overlays should win over Body.
-        # Small parts inside big parts? (e.g. Arms inside Body?)
         # Standard: Overlays (secondary layer) > Body (primary).
         # We process in order: Base, then Overlay. Later overwrites earlier.
         sorted_parts = sorted(parts, key=lambda p: getattr(p, 'is_overlay', False))
@@ -60,347 +117,591 @@ class Rasterizer:
         pad = 1
         ix_min, iy_min, iz_min = int(min_x), int(min_y), int(min_z)
         ix_max, iy_max, iz_max = int(max_x) + 1, int(max_y) + 1, int(max_z) + 1
-        
+
         # 2. Generate Grid
-        # Meshgrid of World Coordinates (Centers = +0.5)
+        # World Coordinates of the grid (Centers = +0.5)
         # We work with Integer coordinates for the grid, add 0.5 for sampling
-        
+
         x_range = np.arange(ix_min, ix_max + 1)
         y_range = np.arange(iy_min, iy_max + 1)
         z_range = np.arange(iz_min, iz_max + 1)
-        
-        # Create full 3D grid: (Z, Y, X) order in indexing usually, but we want (Nx3)
-        # indexing='ij' means dimensions are (X, Y, Z)
-        grid_x, grid_y, grid_z = np.meshgrid(x_range, y_range, z_range, indexing='ij')
-        
-        # Flatten
-        flat_x = grid_x.ravel()
-        flat_y = grid_y.ravel()
-        flat_z = grid_z.ravel()
-        
-        total_voxels = flat_x.size
-        
+
         # Generate Samples
-        if quality > 1:
-            # Multi-sample: Center + 6 neighbors (0.3 offset)
-            offsets = [
-                (0.5, 0.5, 0.5), # Center
-                (0.2, 0.5, 0.5), (0.8, 0.5, 0.5), # X +/-
-                (0.5, 0.2, 0.5), (0.5, 0.8, 0.5), # Y +/-
-                (0.5, 0.5, 0.2), (0.5, 0.5, 0.8), # Z +/-
-            ]
-            num_samples = len(offsets)
+        if kernel is None:
+            kernel = Rasterizer.KERNELS['cross7'] if quality > 1 else Rasterizer.KERNELS['center']
+        off_arr = np.array(kernel, dtype=np.float64).reshape(-1, 3) # (S, 3)
+        num_samples = len(off_arr)
+        ranges = (x_range, y_range, z_range)
+
+        # Voxels are tracked by int32 linear grid index
+        if x_range.size * y_range.size * z_range.size >= 2**31:
+            raise ValueError(f"Statue too large: {x_range.size}x{y_range.size}x{z_range.size} voxel grid")
+
+        if surface:
+            return Rasterizer._compile_surface(sorted_parts, ranges, off_arr, skin_size, adaptive)
+
+        # Matrices and grid bounds of every part
+        placed = []
+        for rank, part in enumerate(sorted_parts):
+            # Get Matrix (cached on the node)
+            mat = part.get_world_matrix()
+
+            # Invert Matrix for World -> Local
+            try:
+                inv_mat = np.linalg.inv(mat)
+            except np.linalg.LinAlgError:
+                continue
+
+            # 3. Only sample the grid voxels inside this part's own world AABB.
+            lo, hi = Rasterizer._part_grid_bounds(part, ranges)
+            if any(h <= l for l, h in zip(lo, hi)):
+                continue
+            placed.append((rank, part, inv_mat, lo, hi))
+
+        # Y-slabs: every voxel's candidates come from its own samples only, so slabs are
+        # independent and the hollow neighbour table is built once over all of them.
+        slab_rows = y_range.size
+        if max_memory:
+            row_samples = num_samples * sum((hi[0] - lo[0]) * (hi[2] - lo[2]) for _, _, _, lo, hi in placed)
+            slab_rows = int(np.clip(max_memory // max(row_samples * Rasterizer.BYTES_PER_SAMPLE, 1), 1, y_range.size))
+
+        solid_colors = []
+        slab_voxels = []
+        slab_chains = []
+        for y0 in range(0, y_range.size, slab_rows):
+            y1 = y0 + slab_rows
+
+            # Candidate lists (one entry per sample that hits a part)
+            cand_voxels = []
+            cand_priority = []
+            cand_source = []
+
+            for rank, part, inv_mat, lo, hi in placed:
+                ylo, yhi = max(lo[1], y0), min(hi[1], y1)
+                if yhi <= ylo:
+                    continue
+
+                # indexing='ij' means dimensions are (X, Y, Z)
+                grid_x, grid_y, grid_z = np.meshgrid(np.arange(lo[0], hi[0]), np.arange(ylo, yhi), np.arange(lo[2], hi[2]), indexing='ij')
+
+                hits = Rasterizer._sample_part(part, inv_mat, grid_x.ravel(), grid_y.ravel(), grid_z.ravel(), ranges, off_arr, skin_size, solid_colors, adaptive)
+                if hits is None:
+                    continue
+
+                # Later parts (and later samples of the same part) overwrite earlier ones
+                voxels, sample, source = hits
+                cand_voxels.append(voxels)
+                cand_priority.append(rank * num_samples + sample)
+                cand_source.append(source)
+
+            if cand_voxels:
+                voxels, chains = Rasterizer._build_chains(cand_voxels, cand_priority, cand_source, num_texels, len(solid_colors))
+                slab_voxels.append(voxels)
+                slab_chains.append(chains)
+
+        if len(slab_voxels) <= 1:
+            voxels = slab_voxels[0] if slab_voxels else np.zeros(0, dtype=np.int32)
+            chains = slab_chains[0] if slab_chains else np.full((0, 1), -1, dtype=np.int32)
         else:
-            offsets = [(0.5, 0.5, 0.5)]
-            num_samples = 1
-
-        # Expand points: Repeat each voxel S times
-        # Shape: (N*S,)
-        flat_x_rep = np.repeat(flat_x, num_samples)
-        flat_y_rep = np.repeat(flat_y, num_samples)
-        flat_z_rep = np.repeat(flat_z, num_samples)
-        
-        # Tracking indices
-        voxel_indices = np.repeat(np.arange(total_voxels), num_samples)
-        
-        # Apply offsets
-        # Create offset array (S, 3) -> Tile to (N*S, 3)
-        off_arr = np.array(offsets) # (S, 3)
-        off_tiled = np.tile(off_arr, (total_voxels, 1)) # (N*S, 3)
-        
-        # World Sampling Points
-        # X, Y, Z, 1
-        world_points = np.stack((
-            flat_x_rep + off_tiled[:, 0],
-            flat_y_rep + off_tiled[:, 1],
-            flat_z_rep + off_tiled[:, 2],
-            np.ones_like(flat_x_rep)
-        ), axis=1)
-        
-        # Buffer to store result: (N, 4) - RGBA. Init with 0.
-        # We can map back to 3D array for Hollow check later.
-        # Dimensions of grid:
-        dim_x = x_range.size
-        dim_y = y_range.size
-        dim_z = z_range.size
-        
-        volume_colors = np.zeros((dim_x*dim_y*dim_z, 4), dtype=np.uint8)
-        
+            # Merge the slabs back into linear index order, padding chains to the longest
+            voxels = np.concatenate(slab_voxels)
+            chains = np.full((voxels.size, max(c.shape[1] for c in slab_chains)), -1, dtype=np.int32)
+            start = 0
+            for c in slab_chains:
+                chains[start:start + c.shape[0], :c.shape[1]] = c
+                start += c.shape[0]
+            order = np.argsort(voxels, kind='stable')
+            voxels = voxels[order]
+            chains = chains[order]
+
+        return Rasterizer._finish_template(voxels, chains, solid_colors, num_texels, ranges, hollow=not solid, skin_size=skin_size)
+
+    @staticmethod
+    def _part_grid_bounds(part: BoxPart, ranges: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> Tuple[List[int], List[int]]:
+        """
+        Grid index range [lo, hi) per axis covering the part's world AABB.
+        One voxel of margin keeps samples within the bounds epsilon.
+        """
+        p_min, p_max = part.get_aabb_world()
+        lo = [max(int(np.floor(p_min[a])) - 1 - int(r[0]), 0) for a, r in enumerate(ranges)]
+        hi = [min(int(np.floor(p_max[a])) + 2 - int(r[0]), r.size) for a, r in enumerate(ranges)]
+        return lo, hi
+
+    @staticmethod
+    def _sample_part(part: BoxPart, inv_mat: np.ndarray, gx: np.ndarray, gy: np.ndarray, gz: np.ndarray,
+                     ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], off_arr: np.ndarray,
+                     skin_size: Tuple[int, int], solid_colors: list, adaptive: bool = False):
+        """
+        Samples grid voxels (gx, gy, gz grid indices) against one part.
+        Appends the part's constant colour to solid_colors if it is hit.
+        Returns (voxel linear indices, sample indices, texel sources) per hit sample, or None.
+        """
+        if adaptive and Rasterizer._is_grid_aligned(part, inv_mat, off_arr):
+            return Rasterizer._sample_aligned_part(part, inv_mat, gx, gy, gz, ranges, off_arr, skin_size, solid_colors)
+
+        x_range, y_range, z_range = ranges
+        dim_y, dim_z = y_range.size, z_range.size
+        num_samples = len(off_arr)
+        skin_w, skin_h = skin_size
+        num_texels = skin_w * skin_h
+
+        # Tracking indices (linear index into the global grid), one per sample
+        voxel_indices = np.repeat(((gx * dim_y + gy) * dim_z + gz).astype(np.int32), num_samples)
+
+        # Transform Points to Local
+        local_points = Rasterizer._sample_points_local(inv_mat, gx, gy, gz, ranges, off_arr)
+
+        # Extract lx, ly, lz
+        lx = local_points[:, 0]
+        ly = local_points[:, 1]
+        lz = local_points[:, 2]
+
+        # Check Bounds (Strictly inside [0, w) )
+        w, h, d = part.size
+        epsilon = 0.001
+        # Note: 0 <= lx < w.
+        mask = (lx >= -epsilon) & (lx < w + epsilon) & \
+               (ly >= -epsilon) & (ly < h + epsilon) & \
+               (lz >= -epsilon) & (lz < d + epsilon)
+
+        if not np.any(mask):
+            return None
+
+        valid_indices = np.flatnonzero(mask).astype(np.int32)
+
+        # --- Solid Color Override (Item Support) ---
+        if part.color:
+            source = np.full(valid_indices.size, Rasterizer._solid_source(part, solid_colors, num_texels), dtype=np.int32)
+            sample_hits = valid_indices
+        else:
+            # --- Textured Part (UV Map) ---
+            us, vs, valid_uv_mask = Rasterizer._map_uvs(part, lx[valid_indices], ly[valid_indices], lz[valid_indices])
+            sample_hits = valid_indices[valid_uv_mask]
+            if sample_hits.size == 0:
+                return None
+
+            # Clip to safe bounds
+            us = np.clip(us[valid_uv_mask], 0, skin_w - 1)
+            vs = np.clip(vs[valid_uv_mask], 0, skin_h - 1)
+
+            # skin_data is [Y, X] -> flat texel index
+            source = (vs * skin_w + us).astype(np.int32)
+
+        return voxel_indices[sample_hits], sample_hits % np.int32(num_samples), source
+
+    @staticmethod
+    def _solid_source(part: BoxPart, solid_colors: list, num_texels: int) -> int:
+        """Source index of a part's constant colour, registering the colour on first use."""
+        # Constant colours live after the skin texels in the source table
+        rgba = tuple(part.color) + (255,)
+        if rgba not in solid_colors:
+            solid_colors.append(rgba)
+        return num_texels + solid_colors.index(rgba)
+
+    @staticmethod
+    def _sample_points_local(inv_mat: np.ndarray, gx: np.ndarray, gy: np.ndarray, gz: np.ndarray,
+                             ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], off_arr: np.ndarray) -> np.ndarray:
+        """
+        Local coordinates of every sample of the grid voxels (gx, gy, gz), voxel-major.
+        float32 and 3 columns: the affine is applied as a 3x3 matmul plus translation
+        into one preallocated buffer, so the only (N*S, 3) arrays are the world points
+        and the result.
+        Returns: (N*S, 3) float32
+        """
+        num_samples = len(off_arr)
+        off = off_arr.astype(np.float32)
+
+        world = np.empty((gx.size, num_samples, 3), dtype=np.float32)
+        for axis, (r, g) in enumerate(zip(ranges, (gx, gy, gz))):
+            np.add(r[g].astype(np.float32)[:, np.newaxis], off[:, axis], out=world[:, :, axis])
+        world = world.reshape(-1, 3)
+
+        local = np.empty_like(world)
+        np.matmul(world, inv_mat[:3, :3].T.astype(np.float32), out=local)
+        local += inv_mat[:3, 3].astype(np.float32)
+        return local
+
+    @staticmethod
+    def _is_grid_aligned(part: BoxPart, inv_mat: np.ndarray, off_arr: np.ndarray) -> bool:
+        """
+        True if grid cells map exactly onto the part's local unit cells: rotation a multiple
+        of 90 degrees, integer translation and size, and every sample strictly inside its voxel.
+        """
+        affine = inv_mat[:3]
+        return (np.allclose(affine, np.round(affine), atol=1e-6) and
+                np.allclose(part.size, np.round(part.size)) and
+                bool(np.all((off_arr > 0.01) & (off_arr < 0.99))))
+
+    @staticmethod
+    def _sample_aligned_part(part: BoxPart, inv_mat: np.ndarray, gx: np.ndarray, gy: np.ndarray, gz: np.ndarray,
+                             ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], off_arr: np.ndarray,
+                             skin_size: Tuple[int, int], solid_colors: list):
+        """
+        _sample_part for grid-aligned parts, with the same result.
+        All samples of a voxel land in the same local cell, so transforming the centre
+        decides whether the voxel is hit and which texel cell it reads. Samples can
+        only differ in the nearest face, so the full kernel is evaluated just where the
+        two nearest faces are closer than the kernel's spread (edges and corners).
+        """
+        x_range, y_range, z_range = ranges
+        dim_y, dim_z = y_range.size, z_range.size
+        num_samples = len(off_arr)
+        skin_w, skin_h = skin_size
+        num_texels = skin_w * skin_h
+
+        local = Rasterizer._sample_points_local(inv_mat, gx, gy, gz, ranges, np.full((1, 3), 0.5))
+
+        size = np.array(part.size, dtype=np.float32)
+        inside = np.flatnonzero(((local >= 0) & (local < size)).all(axis=1))
+        if inside.size == 0:
+            return None
+
+        gx, gy, gz = gx[inside], gy[inside], gz[inside]
+        voxels = ((gx * dim_y + gy) * dim_z + gz).astype(np.int32)
+        local = local[inside]
+
+        # --- Solid Color Override (Item Support) ---
+        if part.color:
+            source = np.full(voxels.size, Rasterizer._solid_source(part, solid_colors, num_texels), dtype=np.int32)
+            return voxels, np.zeros(voxels.size, dtype=np.int32), source
+
+        # An offset moves every face distance by at most `spread`
+        spread = np.abs(off_arr - 0.5).max()
+        nearest = np.partition(np.concatenate([local, size - local], axis=1), 1, axis=1)
+        ambiguous = (nearest[:, 1] - nearest[:, 0]) <= 2 * spread
+        single = np.flatnonzero(~ambiguous)
+        multi = np.flatnonzero(ambiguous)
+
+        # Ambiguous voxels get every sample. Transformed exactly like _sample_part, as exact
+        # ties between faces are then broken by the same rounding.
+        points = np.concatenate([local[single], Rasterizer._sample_points_local(inv_mat, gx[multi], gy[multi], gz[multi], ranges, off_arr)])
+        voxels = np.concatenate([voxels[single], np.repeat(voxels[multi], num_samples)])
+        sample = np.concatenate([np.zeros(single.size, dtype=np.int32), np.tile(np.arange(num_samples, dtype=np.int32), multi.size)])
+
+        us, vs, valid_uv_mask = Rasterizer._map_uvs(part, points[:, 0], points[:, 1], points[:, 2])
+        if not np.any(valid_uv_mask):
+            return None
+
+        us = np.clip(us[valid_uv_mask], 0, skin_w - 1)
+        vs = np.clip(vs[valid_uv_mask], 0, skin_h - 1)
+        source = (vs * skin_w + us).astype(np.int32)
+        return voxels[valid_uv_mask], sample[valid_uv_mask], source
+
+    @staticmethod
+    def _cover(extent: float, n: int, margin: float) -> np.ndarray:
+        """Points 1/n apart covering [-margin, extent + margin]."""
+        return (np.arange(int(np.ceil((extent + 2 * margin) * n))) + 0.5) / n - margin
+
+    # Approximate peak bytes per sample of a slab (parts are sampled one at a time, only hits are kept)
+    BYTES_PER_SAMPLE = 16
+
+    NEIGHBOUR_STEPS = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1)]
+
+    # Sample kernels: offsets inside a voxel, lowest priority first
+    KERNELS = {
+        'center': [(0.5, 0.5, 0.5)],
+        # Center + 6 neighbors (0.3 offset), fixes cracks between rotated parts
+        'cross7': [
+            (0.5, 0.5, 0.5), # Center
+            (0.2, 0.5, 0.5), (0.8, 0.5, 0.5), # X +/-
+            (0.5, 0.2, 0.5), (0.5, 0.8, 0.5), # Y +/-
+            (0.5, 0.5, 0.2), (0.5, 0.5, 0.8), # Z +/-
+        ],
+        # 3x3x3 grid, for steep rotations of thin parts
+        'cube27': [(x, y, z) for x in (0.2, 0.5, 0.8) for y in (0.2, 0.5, 0.8) for z in (0.2, 0.5, 0.8)],
+    }
+
+    @staticmethod
+    def _compile_surface(sorted_parts: List[BoxPart], ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], off_arr: np.ndarray,
+                         skin_size: Tuple[int, int], adaptive: bool, points_per_voxel: int = 2) -> PoseTemplate:
+        """
+        Surface-only rasterization: interior voxels are never sampled.
+        1. Forward pass: the one-voxel layer under each textured face (whole face for
+           constant-colour parts), widened by the kernel's sample offset on every side, is
+           filled with points 1/points_per_voxel of a voxel apart, transformed to world
+           space and floored. Every voxel whose centre lies in that layer has a point
+           within 0.45 of its centre, so this finds all voxels the volume path could
+           keep (inside the part with a neighbour outside it), also under rotation.
+           Extra candidates are harmless: sampling and hollowing drop them.
+        2. Only those shell voxels are sampled against the parts (same samples,
+           priorities and UV mapping as the volume path), so colours match it.
+        3. The 6-neighbours of the shell are sampled too and anything deeper counts as
+           filled, so hollowing drops walls hidden between touching parts or under opaque
+           overlays and shows the first layers behind transparent texels, like the volume
+           path. Only cavities more than two voxels deep (behind holes in the base layer)
+           are not reproduced.
+        """
+        x_range, y_range, z_range = ranges
+        dims = np.array([x_range.size, y_range.size, z_range.size])
+        origin = np.array([x_range[0], y_range[0], z_range[0]])
+        num_samples = len(off_arr)
+        spread = np.abs(off_arr - 0.5).max()
+        skin_w, skin_h = skin_size
+        num_texels = skin_w * skin_h
+
+        # 1. Forward pass over the faces
+        shell = []
+        inverses = []
         for part in sorted_parts:
-            # Get Matrix
-            mat_tuple = part.get_world_matrix()
-            mat = np.array(mat_tuple).reshape(4, 4)
-            
-            # Invert Matrix for World -> Local
+            mat = part.get_world_matrix()
             try:
                 inv_mat = np.linalg.inv(mat)
             except np.linalg.LinAlgError:
+                inverses.append(None)
                 continue
-                
-            # Transform All Points to Local
-            # P_local = P_world @ InvT
-            local_points = world_points @ inv_mat.T
-            
-            # Extract lx, ly, lz
-            lx = local_points[:, 0]
-            ly = local_points[:, 1]
-            lz = local_points[:, 2]
-            
-            # Check Bounds (Strictly inside [0, w) )
+            inverses.append(inv_mat)
             w, h, d = part.size
-            epsilon = 0.001
-            # Note: 0 <= lx < w. 
-            mask = (lx >= -epsilon) & (lx < w + epsilon) & \
-                   (ly >= -epsilon) & (ly < h + epsilon) & \
-                   (lz >= -epsilon) & (lz < d + epsilon)
-                   
-            if not np.any(mask):
+
+            # Point spacing in world units (local units are voxels unless the rig scales)
+            scale = np.linalg.norm(mat[:3, :3], axis=0).max()
+            n = max(1, int(np.ceil(scale * points_per_voxel)))
+
+            for face_key in ['left', 'right', 'bottom', 'top', 'front', 'back']:
+                if part.color:
+                    # (u, v) extent of the face, in the axes of the texture layout
+                    fw, fh = {'left': (d, h), 'right': (d, h), 'bottom': (w, d), 'top': (w, d), 'front': (w, h), 'back': (w, h)}[face_key]
+                elif face_key in part.uv_map:
+                    _, _, fw, fh = part.uv_map[face_key]
+                else:
+                    continue
+
+                # Face coordinates (U, V) and depth T below the face, each widened by the sample spread
+                U, V, T = np.meshgrid(Rasterizer._cover(fw, n, spread), Rasterizer._cover(fh, n, spread), Rasterizer._cover(1, n, spread), indexing='ij')
+                U, V, T = U.ravel(), V.ravel(), T.ravel()
+
+                # Inverse of the _map_uvs projections
+                if face_key == 'left':
+                    local = (T, h - V, U)
+                elif face_key == 'right':
+                    local = (w - T, h - V, U)
+                elif face_key == 'bottom':
+                    local = (U, T, V)
+                elif face_key == 'top':
+                    local = (U, h - T, V)
+                elif face_key == 'front':
+                    local = (U, h - V, T)
+                else:
+                    local = (U, h - V, d - T)
+
+                world = np.stack(local, axis=1) @ mat[:3, :3].T + mat[:3, 3]
+                shell.append(np.floor(world).astype(np.int64) - origin)
+
+        solid_colors = []
+        if not shell:
+            return Rasterizer._build_template([], [], [], solid_colors, num_texels, ranges, hollow=True, skin_size=skin_size)
+
+        # Unique shell voxels inside the grid, as grid indices
+        shell = np.concatenate(shell)
+        shell = shell[((shell >= 0) & (shell < dims)).all(axis=1)]
+        shell_lin = np.unique((shell[:, 0] * dims[1] + shell[:, 1]) * dims[2] + shell[:, 2])
+
+        # Support layer: in-grid 6-neighbours of the shell, sampled like any voxel so
+        # hollowing sees whether they are filled (a transparent texel leaves a gap)
+        sx, sy, sz = np.unravel_index(shell_lin, dims)
+        support = []
+        for stx, sty, stz in Rasterizer.NEIGHBOUR_STEPS:
+            nx, ny, nz = sx + stx, sy + sty, sz + stz
+            ok = (nx >= 0) & (nx < dims[0]) & (ny >= 0) & (ny < dims[1]) & (nz >= 0) & (nz < dims[2])
+            support.append((nx[ok] * dims[1] + ny[ok]) * dims[2] + nz[ok])
+        support_lin = np.setdiff1d(np.concatenate(support), shell_lin)
+
+        sampled_lin = np.concatenate([shell_lin, support_lin])
+        sx, sy, sz = np.unravel_index(sampled_lin, dims)
+
+        # 2. Sample the shell and support voxels inside each part's AABB
+        cand_voxels = []
+        cand_priority = []
+        cand_source = []
+        for rank, (part, inv_mat) in enumerate(zip(sorted_parts, inverses)):
+            if inv_mat is None:
+                continue
+            lo, hi = Rasterizer._part_grid_bounds(part, ranges)
+            sel = (sx >= lo[0]) & (sx < hi[0]) & (sy >= lo[1]) & (sy < hi[1]) & (sz >= lo[2]) & (sz < hi[2])
+            if not np.any(sel):
                 continue
-                
-            valid_indices = np.where(mask)[0]
-            
-            # --- Solid Color Override (Item Support) ---
-            if part.color:
-                r, g, b = part.color
-                a = 255
-                # For all valid pixels in this volume, apply the solid color.
-                # We simply write to the volume buffer.
-                # The painter's algorithm order assumes later parts overwrite earlier ones.
-                # Since we are iterating 'sorted_parts', we just overwrite.
-                
-                # Create color array
-                cols = np.array([r, g, b, a], dtype=np.uint8)
-                
-                # Write to buffer
-                # Map back to voxel indices (for multi-sampling)
-                v_idxs = voxel_indices[valid_indices]
-                volume_colors[v_idxs] = cols
-                continue # Skip UV mapping
 
-            # --- Textured Part (UV Map) ---
-            
-            # Filter valid points
-            vlx = lx[valid_indices]
-            vly = ly[valid_indices]
-            vlz = lz[valid_indices]
-            
-            # Map to UV
-            # Vectorized "get_texture_coord"
-            
-            # Determine distances to faces
-            # faces: left(x=0), right(x=w), bottom(y=0), top(y=h), front(z=0), back(z=d)
-            dist_left = np.abs(vlx)
-            dist_right = np.abs(w - vlx)
-            dist_bot = np.abs(vly)
-            dist_top = np.abs(h - vly)
-            dist_front = np.abs(vlz) # Correct? Front assumed Z=0 in prvious logic
-            dist_back = np.abs(d - vlz)
-            
-            # We want "Nearest Face".
-            # Stack distances: (M, 6)
-            dists = np.stack([dist_left, dist_right, dist_bot, dist_top, dist_front, dist_back], axis=1)
-            min_dists = np.min(dists, axis=1)
-            
-            # Argmin to find which face
-            # 0: left, 1: right, 2: bot, 3: top, 4: front, 5: back
-            face_indices = np.argmin(dists, axis=1)
-            
-            # We also need UVs. Init arrays.
-            # We'll compute u_local, v_local for valid points.
-            u_final = np.zeros_like(vlx, dtype=np.int32)
-            v_final = np.zeros_like(vlx, dtype=np.int32)
-            valid_uv_mask = np.zeros_like(vlx, dtype=bool)
-            
-            # Helper to apply logic per face type
-            def map_face(idx, face_key, u_expr, v_expr, cond_mask_subset):
-                # idx: face index (0-5)
-                # face_key: 'top', 'left' etc.
-                # u_expr: lambda lx, ly, lz
-                # v_expr: lambda lx, ly, lz
-                # cond_mask_subset: boolean mask of checks that matched this face
-                
-                if face_key not in part.uv_map:
-                    return
-                
-                # Get UV rect
-                base_u, base_v, fw, fh = part.uv_map[face_key]
-                
-                # Get coordinates for these points
-                # Note: These are float local coords
-                # We need to map them to integer texture offsets
-                # Usually floor() or round()?
-                # Since we sampled center +0.5 and transformed, we are at some float position.
-                # Simply clamping/floor is standard.
-                
-                # Example: lx=0.5 -> pixel 0.
-                
-                f_lx = vlx[cond_mask_subset]
-                f_ly = vly[cond_mask_subset]
-                f_lz = vlz[cond_mask_subset]
-                
-                u_off = u_expr(f_lx, f_ly, f_lz)
-                v_off = v_expr(f_lx, f_ly, f_lz)
-                
-                # Floor and Clamp
-                # E.g. top face is WxD. u_off should be in [0, w).
-                # Due to projection, it might be slightly off.
-                
-                iu_off = np.floor(u_off).astype(np.int32)
-                iv_off = np.floor(v_off).astype(np.int32)
-                
-                # Verify bounds of texture rect
-                # This is important. If we project a point deep inside the box to the surface,
-                # it maps to valid UV.
-                
-                # Check constraints: 0 <= iu < fw
-                valid_proj = (iu_off >= 0) & (iu_off < fw) & (iv_off >= 0) & (iv_off < fh)
-                
-                # Write results
-                # We need indices in 'face_indices' array
-                # cond_mask_subset is boolean mask relative to 'valid_indices'
-                
-                # Actually, simpler: 
-                # global indices for this part calc: valid_indices
-                # subset: valid_indices[cond_mask_subset]
-                
-                # Wait, 'cond_mask_subset' is size sum(cond).
-                
-                # Let's write to temp arrays u_final, v_final using boolean indexing on them?
-                # Yes.
-                
-                np.place(u_final, cond_mask_subset, base_u + iu_off[valid_proj]) # This relies on alignment... risky
-                # Safer:
-                
-                # Indices where this face matched AND projection valid
-                # Relative to `valid_indices` array
-                
-                # First, fill temp arrays of matching size
-                temp_u = np.zeros(np.sum(cond_mask_subset), dtype=np.int32)
-                temp_v = np.zeros(np.sum(cond_mask_subset), dtype=np.int32)
-                temp_valid = np.zeros(np.sum(cond_mask_subset), dtype=bool)
-                
-                temp_u[valid_proj] = base_u + iu_off[valid_proj]
-                temp_v[valid_proj] = base_v + iv_off[valid_proj]
-                temp_valid[valid_proj] = True
-                
-                # Transfer to main arrays
-                # u_final[cond_mask_subset] = temp_u
-                # We can do this if shapes match.
-                
-                # Actually, just looping is easier or boolean indexing.
-                u_final[cond_mask_subset] = temp_u
-                v_final[cond_mask_subset] = temp_v
-                valid_uv_mask[cond_mask_subset] = temp_valid
-
-            # Define expressions (matching previous logic)
-            # Top: x=x, z=y (UV space). Map u=lx, v=lz
-            map_face(3, 'top', lambda x,y,z: x, lambda x,y,z: z, face_indices == 3)
-            
-            # Bottom: u=lx, v=lz
-            map_face(2, 'bottom', lambda x,y,z: x, lambda x,y,z: z, face_indices == 2)
-            
-            # Front: u=lx, v=h-ly-1
-            # Note: h is part height.
-            map_face(4, 'front', lambda x,y,z: x, lambda x,y,z: h - y, face_indices == 4)
-            # -1 or not? floor(h - 0.5) = h-1. Correct. 
-            
-            # Back: u=lx, v=h-ly
-            map_face(5, 'back', lambda x,y,z: x, lambda x,y,z: h - y, face_indices == 5)
-            
-            # Left: u=lz, v=h-ly
-            map_face(0, 'left', lambda x,y,z: z, lambda x,y,z: h - y, face_indices == 0)
-            
-            # Right: u=lz, v=h-ly
-            map_face(1, 'right', lambda x,y,z: z, lambda x,y,z: h - y, face_indices == 1)
-            
-            # Get Colors
-            # Only where valid_uv_mask is True
-            final_valid_indices = valid_indices[valid_uv_mask]
-            
-            if final_valid_indices.size > 0:
-                # Get UVs
-                us = u_final[valid_uv_mask]
-                vs = v_final[valid_uv_mask]
-                
-                # Sample Skin
-                # skin_data is [Y, X]
-                # Clip to safe bounds
-                us = np.clip(us, 0, skin_w - 1)
-                vs = np.clip(vs, 0, skin_h - 1)
-                
-                colors = skin_data[vs, us] # (M, 4)
-                
-                # Alpha Threshold
-                alpha_mask = colors[:, 3] > 0
-                
-                final_cols = colors[alpha_mask]
-                final_grid_indices = final_valid_indices[alpha_mask]
-                
-                # Update Volume Buffer
-                if final_grid_indices.size > 0:
-                    v_idxs = voxel_indices[final_grid_indices]
-                    volume_colors[v_idxs] = final_cols
-                    
-        # 3. Optimizations (Solid/Hollow)
-        # Reshape volume to 3D
-        volume_3d = volume_colors.reshape(dim_x, dim_y, dim_z, 4)
-        
-        # Identify non-empty
-        # Using alpha > 0
-        has_block = volume_3d[:, :, :, 3] > 0
-        
-        # If Hollow requested (not solid)
-        if not solid:
-            # Erode: Keep only if surface
-            # Surface = Has at least one empty neighbor (6-neighbors)
-            # Pad to handle edges easily
-            padded = np.pad(has_block, 1, mode='constant', constant_values=0)
-            
-            # Neighbors
-            n_x1 = padded[2:, 1:-1, 1:-1]
-            n_x2 = padded[:-2, 1:-1, 1:-1]
-            n_y1 = padded[1:-1, 2:, 1:-1]
-            n_y2 = padded[1:-1, :-2, 1:-1]
-            n_z1 = padded[1:-1, 1:-1, 2:]
-            n_z2 = padded[1:-1, 1:-1, :-2]
-            
-            # Internal = All 6 neighbors are present
-            internal = n_x1 & n_x2 & n_y1 & n_y2 & n_z1 & n_z2
-            
-            # We remove internals
-            # Keep = has_block AND NOT internal
-            keep_mask = has_block & (~internal)
-        else:
-            keep_mask = has_block
-            
-        # Extract Final List
-        # Get coordinates where keep_mask is True
-        # Note: These are indices into x_range, etc.
-        valid_z, valid_y, valid_x = np.where(keep_mask) # Note indices are from indexing='ij' -> X,Y,Z?
-        # Checked meshgrid earlier: indexing='ij' -> dim_x, dim_y, dim_z.
-        # So mask indices are ix, iy, iz.
-        # But wait, np.where returns in tuple(dim0_indices, dim1_indices...)
-        # dim0 is X, dim1 is Y, dim2 is Z.
-        valid_ix, valid_iy, valid_iz = np.where(keep_mask)
-        
+            hits = Rasterizer._sample_part(part, inv_mat, sx[sel], sy[sel], sz[sel], ranges, off_arr, skin_size, solid_colors, adaptive)
+            if hits is None:
+                continue
+            voxels, sample, source = hits
+            cand_voxels.append(voxels)
+            cand_priority.append(rank * num_samples + sample)
+            cand_source.append(source)
+
+        template = Rasterizer._build_template(cand_voxels, cand_priority, cand_source, solid_colors, num_texels,
+                                              ranges, hollow=True, skin_size=skin_size)
+
+        # 3. Unsampled neighbours of the support layer lie deeper inside a part: always filled (-2).
+        # Every in-grid neighbour of a shell voxel was sampled, so -1 there still means never filled.
+        gx, gy, gz = template.wx - origin[0], template.wy - origin[1], template.wz - origin[2]
+        for n, (stx, sty, stz) in enumerate(Rasterizer.NEIGHBOUR_STEPS):
+            missing = np.flatnonzero(template.neighbours[:, n] == -1)
+            nx, ny, nz = gx[missing] + stx, gy[missing] + sty, gz[missing] + stz
+            ok = (nx >= 0) & (nx < dims[0]) & (ny >= 0) & (ny < dims[1]) & (nz >= 0) & (nz < dims[2])
+            deeper = ~np.isin((nx * dims[1] + ny) * dims[2] + nz, sampled_lin)
+            template.neighbours[missing[ok & deeper], n] = -2
+
+        return template
+
+    @staticmethod
+    def _build_template(cand_voxels: List[np.ndarray], cand_priority: List[np.ndarray], cand_source: List[np.ndarray],
+                        solid_colors: list, num_texels: int, ranges: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                        hollow: bool, skin_size: Tuple[int, int]) -> PoseTemplate:
+        """
+        Packs per-sample candidates into a PoseTemplate.
+        cand_*: lists of arrays of linear grid voxel index, priority (higher wins) and texel source
+        ranges: world coordinates of the grid along X, Y, Z (linear index is C order over X, Y, Z)
+        hollow: build the 6-neighbour table for the Hollow Optimization
+        """
+        unique_voxels, chains = Rasterizer._build_chains(cand_voxels, cand_priority, cand_source, num_texels, len(solid_colors))
+        return Rasterizer._finish_template(unique_voxels, chains, solid_colors, num_texels, ranges, hollow, skin_size)
+
+    @staticmethod
+    def _build_chains(cand_voxels: List[np.ndarray], cand_priority: List[np.ndarray], cand_source: List[np.ndarray],
+                      num_texels: int, num_colors: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Orders the candidates of each voxel into a fallback chain.
+        Returns (unique_voxels, chains): sorted (V,) linear indices and (V, L) int32 chains padded with -1
+        """
+        if not cand_voxels:
+            return np.zeros(0, dtype=np.int32), np.full((0, 1), -1, dtype=np.int32)
+
+        voxels = np.concatenate(cand_voxels)
+        priority = np.concatenate(cand_priority)
+        source = np.concatenate(cand_source)
+
+        # 6. Sort candidates: voxel ascending, priority descending (winner first)
+        order = np.lexsort((-priority, voxels))
+        voxels = voxels[order]
+        source = source[order]
+
+        # Constant colours are always opaque: nothing behind them can show through
+        is_const = (source >= num_texels).astype(np.int32)
+        group_start = np.maximum.accumulate(np.where(np.r_[True, voxels[1:] != voxels[:-1]], np.arange(voxels.size), 0))
+        const_before = np.cumsum(is_const) - is_const
+        visible = (const_before - const_before[group_start]) == 0
+        voxels = voxels[visible]
+        source = source[visible]
+
+        # Repeated texels within a chain can never change the result, keep the first
+        _, first_idx = np.unique(voxels.astype(np.int64) * (num_texels + num_colors) + source, return_index=True)
+        first_idx.sort()
+        voxels = voxels[first_idx]
+        source = source[first_idx]
+
+        # Pack into (V, L) chains
+        unique_voxels, starts, counts = np.unique(voxels, return_index=True, return_counts=True)
+        chains = np.full((unique_voxels.size, counts.max()), -1, dtype=np.int32)
+        group = np.repeat(np.arange(unique_voxels.size), counts)
+        chains[group, np.arange(voxels.size) - starts[group]] = source
+        return unique_voxels, chains
+
+    @staticmethod
+    def _finish_template(unique_voxels: np.ndarray, chains: np.ndarray, solid_colors: list, num_texels: int,
+                         ranges: Tuple[np.ndarray, np.ndarray, np.ndarray], hollow: bool, skin_size: Tuple[int, int]) -> PoseTemplate:
+        """
+        Builds the PoseTemplate from sorted voxels and their chains (see _build_chains).
+        """
+        x_range, y_range, z_range = ranges
+        dim_x, dim_y, dim_z = x_range.size, y_range.size, z_range.size
+        num_cand = unique_voxels.size
+
+        # Pad chains with the transparent sentinel
+        sentinel = num_texels + len(solid_colors)
+        chains[chains < 0] = sentinel
+        solid_arr = np.array(solid_colors, dtype=np.uint8).reshape(-1, 4)
+
+        # Grid indices (C order over X, Y, Z)
+        gix = unique_voxels // (dim_y * dim_z)
+        giy = (unique_voxels // dim_z) % dim_y
+        giz = unique_voxels % dim_z
+
+        # 7. Hollow neighbour table (-1 = neighbour can never be filled)
+        neighbours = None
+        if hollow:
+            neighbours = np.full((num_cand, 6), -1, dtype=np.int32)
+            for n, (sx, sy, sz) in enumerate(Rasterizer.NEIGHBOUR_STEPS):
+                if num_cand == 0:
+                    break
+                nx, ny, nz = gix + sx, giy + sy, giz + sz
+                in_grid = (nx >= 0) & (nx < dim_x) & (ny >= 0) & (ny < dim_y) & (nz >= 0) & (nz < dim_z)
+                n_lin = (nx * dim_y + ny) * dim_z + nz
+                pos = np.minimum(np.searchsorted(unique_voxels, n_lin), num_cand - 1)
+                found = in_grid & (unique_voxels[pos] == n_lin)
+                neighbours[found, n] = pos[found]
+
         # Map to World Coordinates
-        wx = x_range[valid_ix]
-        wy = y_range[valid_iy]
-        wz = z_range[valid_iz]
-        
-        # Get Colors
-        final_colors = volume_3d[valid_ix, valid_iy, valid_iz]
-        
-        # Build List
-        # Zip and Create
-        # Vectorized list creation?
-        # Standard Python list comp is fast enough for <100k items
-        
-        if return_raw:
-            return wx.astype(np.int32), wy.astype(np.int32), wz.astype(np.int32), final_colors
+        wx = x_range[gix].astype(np.int32)
+        wy = y_range[giy].astype(np.int32)
+        wz = z_range[giz].astype(np.int32)
 
-        # Ensure native types
-        return [
-            PixelBlock(int(wx[i]), int(wy[i]), int(wz[i]), int(r), int(g), int(b), int(a))
-            for i, (r, g, b, a) in enumerate(final_colors)
+        return PoseTemplate(wx, wy, wz, chains, solid_arr, neighbours, skin_size)
+
+    @staticmethod
+    def _map_uvs(part: BoxPart, vlx: np.ndarray, vly: np.ndarray, vlz: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized "get_texture_coord" for points inside a part.
+        Returns (u, v, valid) arrays; u/v are texture pixel coordinates (unclipped).
+        """
+        w, h, d = part.size
+
+        # Determine distances to faces
+        # faces: left(x=0), right(x=w), bottom(y=0), top(y=h), front(z=0), back(z=d)
+        dist_left = np.abs(vlx)
+        dist_right = np.abs(w - vlx)
+        dist_bot = np.abs(vly)
+        dist_top = np.abs(h - vly)
+        dist_front = np.abs(vlz)
+        dist_back = np.abs(d - vlz)
+
+        # We want "Nearest Face".
+        # Stack distances: (M, 6)
+        dists = np.stack([dist_left, dist_right, dist_bot, dist_top, dist_front, dist_back], axis=1)
+
+        # Argmin to find which face
+        # 0: left, 1: right, 2: bot, 3: top, 4: front, 5: back
+        face_indices = np.argmin(dists, axis=1)
+
+        u_final = np.zeros_like(vlx, dtype=np.int32)
+        v_final = np.zeros_like(vlx, dtype=np.int32)
+        valid_uv_mask = np.zeros_like(vlx, dtype=bool)
+
+        # (face index, face key, u expr, v expr)
+        # Top/Bottom: u=lx, v=lz. Front/Back: u=lx, v=h-ly. Left/Right: u=lz, v=h-ly.
+        # floor(h - 0.5) = h-1, so no extra -1 is needed on the vertical faces.
+        face_exprs = [
+            (3, 'top', lambda x, y, z: x, lambda x, y, z: z),
+            (2, 'bottom', lambda x, y, z: x, lambda x, y, z: z),
+            (4, 'front', lambda x, y, z: x, lambda x, y, z: h - y),
+            (5, 'back', lambda x, y, z: x, lambda x, y, z: h - y),
+            (0, 'left', lambda x, y, z: z, lambda x, y, z: h - y),
+            (1, 'right', lambda x, y, z: z, lambda x, y, z: h - y),
         ]
+
+        for idx, face_key, u_expr, v_expr in face_exprs:
+            if face_key not in part.uv_map:
+                continue
+
+            sel = face_indices == idx
+            if not np.any(sel):
+                continue
+
+            # Get UV rect
+            base_u, base_v, fw, fh = part.uv_map[face_key]
+
+            f_lx = vlx[sel]
+            f_ly = vly[sel]
+            f_lz = vlz[sel]
+
+            # Floor to integer texture offsets (sampled at centers, e.g. lx=0.5 -> pixel 0)
+            iu_off = np.floor(u_expr(f_lx, f_ly, f_lz)).astype(np.int32)
+            iv_off = np.floor(v_expr(f_lx, f_ly, f_lz)).astype(np.int32)
+
+            # Check constraints: 0 <= iu < fw
+            valid_proj = (iu_off >= 0) & (iu_off < fw) & (iv_off >= 0) & (iv_off < fh)
+
+            u_final[sel] = np.where(valid_proj, base_u + iu_off, 0)
+            v_final[sel] = np.where(valid_proj, base_v + iv_off, 0)
+            valid_uv_mask[sel] = valid_proj
+
+        return u_final, v_final, valid_uv_mask
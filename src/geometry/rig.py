@@ -9,6 +9,10 @@ class Rig:
     def get_parts(self) -> List[BoxPart]:
         return self.parts
 
+    def update_world_matrices(self):
+        """Rebuilds the dirty world matrices of the whole rig, top-down."""
+        self.root.update_world_matrices()
+
 class RigFactory:
     """
     Constructs the Hierarchical Rig for Minecraft Characters.
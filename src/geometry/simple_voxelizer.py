@@ -1,171 +1,150 @@
-from typing import List
+from typing import List, Tuple
 from PIL import Image
 import numpy as np
 
-from .primitives import BoxPart, PixelBlock
+from .primitives import BoxPart
 
 class SimpleVoxelizer:
+    # Faces in nearest-face tie-break order (first wins, like list.index(min(...)))
+    FACES = ['left', 'right', 'bottom', 'top', 'front', 'back']
+
     @staticmethod
-    def generate(parts: List[BoxPart], skin: Image.Image, ignore_overlays: bool = False) -> List[PixelBlock]:
+    def generate(parts: List[BoxPart], skin: Image.Image, ignore_overlays: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         """
         Generates blocks by iterating box dimensions and mapping directly to UVs.
         Assumes parts are axis-aligned (rotation is ignored).
+        Returns (wx, wy, wz, colors): (N,) int32 world coordinates and (N, 4) uint8 RGBA,
+        in order of first placement.
         """
         if skin.mode != "RGBA":
             skin = skin.convert("RGBA")
-        
+
         skin_data = np.array(skin)
         skin_h, skin_w, _ = skin_data.shape
-        
-        blocks = []
-        
-        # Sort parts: Body first, then Overlays. 
-        # Overlays overwriting body is handled by order since we just append?
-        # No, for a single list of blocks, we need to handle duplicates.
-        # Dictionary {(x,y,z) -> block}
-        
-        block_map = {}
-        
+
         # Process base parts first, then overlays
         sorted_parts = sorted(parts, key=lambda p: getattr(p, 'is_overlay', False))
-        
+
+        # Visible texels of every part, in placement order
+        layers = []
         for part in sorted_parts:
             if ignore_overlays and getattr(part, 'is_overlay', False):
                 continue
-                
-            # Get World Position (Translation Only)
-            # We assume rotation is Identity for 'standing'
-            # Node.origin is the offset. 
-            # We need absolute world position.
-            # Ideally "standing" pose yields correct world transforms.
-            
-            # Since we can't easily rely on matrix decomposition if rotation exists,
-            # we will trust the user uses this validly (Standing pose).
-            
-            # Inspect matrix from get_world_matrix
-            mat_tuple = part.get_world_matrix()
-            mat = np.array(mat_tuple).reshape(4, 4)
-            
-            # Extract translation (Matrix is Row, Col -> [0,3])
-            tx = int(mat[0, 3])
-            ty = int(mat[1, 3])
-            tz = int(mat[2, 3])
-            
-            w, h, d = part.size
-            w, h, d = int(w), int(h), int(d)
-            
-            # Iterate Physical Bounds (Restore 10x10x10 for Hat)
-            for lx in range(w):
-                for ly in range(h):
-                    for lz in range(d):
-                        
-                        # Calculate UV
-                        u, v = -1, -1
-                        
-                        # Face logic (Simple Box mapping)
-                        # Determine nearest face to handle Volume -> Surface mapping
-                        dist_left = lx
-                        dist_right = w - 1 - lx
-                        dist_bot = ly
-                        dist_top = h - 1 - ly
-                        dist_front = lz
-                        dist_back = d - 1 - lz
-                        
-                        dists = [dist_left, dist_right, dist_bot, dist_top, dist_front, dist_back]
-                        face_idx = dists.index(min(dists))
-                        
-                        face_key = None
-                        if face_idx == 0: face_key = 'left'
-                        elif face_idx == 1: face_key = 'right'
-                        elif face_idx == 2: face_key = 'bottom'
-                        elif face_idx == 3: face_key = 'top'
-                        elif face_idx == 4: face_key = 'front'
-                        elif face_idx == 5: face_key = 'back'
-                        
-                        if face_key not in part.uv_map:
-                            continue
-                            
-                        # Texture Face Dimensions
-                        base_u, base_v, fw, fh = part.uv_map[face_key]
-                        
-                        # Face-Specific Dimensions on Box
-                        # used for Scaling Ratio (Texture Dim / Box Dim)
-                        box_fw, box_fh = 1, 1
-                        u_source, v_source = 0, 0
-                        
-                        if face_key == 'top': # x, z
-                            box_fw, box_fh = w, d
-                            u_source, v_source = lx, lz
-                        elif face_key == 'bottom': # x, z
-                            box_fw, box_fh = w, d
-                            u_source, v_source = lx, lz
-                        elif face_key == 'front': # x, y
-                            box_fw, box_fh = w, h
-                            u_source, v_source = lx, h - 1 - ly
-                        elif face_key == 'back': # x, y
-                            box_fw, box_fh = w, h
-                            u_source, v_source = lx, h - 1 - ly
-                        elif face_key == 'left': # z, y
-                            box_fw, box_fh = d, h
-                            u_source, v_source = lz, h - 1 - ly
-                        elif face_key == 'right': # z, y
-                            box_fw, box_fh = d, h
-                            u_source, v_source = lz, h - 1 - ly
-                            
-                        # Nearest Neighbor Scaling
-                        # Map Box Coordinate (0..box_fw) to Texture Coordinate (0..fw)
-                        # Avoid div by zero
-                        scale_x = fw / max(1, box_fw)
-                        scale_y = fh / max(1, box_fh)
-                        
-                        u_off = int(u_source * scale_x)
-                        v_off = int(v_source * scale_y)
-                        
-                        # Clamp for safety (floating point jitter)
-                        u_off = min(u_off, fw - 1)
-                        v_off = min(v_off, fh - 1)
-                        
-                        u = base_u + u_off
-                        v = base_v + v_off
-                        
-                        # Sample
-                        if 0 <= u < skin_w and 0 <= v < skin_h:
-                            rgba = skin_data[v, u]
-                            if rgba[3] > 0: # Alpha check
-                                
-                                # World Coord
-                                wx = tx + lx
-                                wy = ty + ly
-                                wz = tz + lz
-                                key = (wx, wy, wz)
-                                
-                                # Alpha Blending (Over operator)
-                                fg_a = rgba[3] / 255.0
-                                
-                                if fg_a < 0.01: # Skip invisible
-                                    continue
-                                    
-                                if key in block_map:
-                                    bg_rgba = block_map[key]
-                                    bg_a = bg_rgba[3] / 255.0
-                                    
-                                    out_a = fg_a + bg_a * (1.0 - fg_a)
-                                    if out_a <= 0:
-                                        continue
-                                        
-                                    fg_rgb = rgba[:3].astype(float)
-                                    bg_rgb = bg_rgba[:3].astype(float)
-                                    
-                                    out_rgb = (fg_rgb * fg_a + bg_rgb * bg_a * (1.0 - fg_a)) / out_a
-                                    out_rgba = np.zeros(4, dtype=np.uint8)
-                                    out_rgba[:3] = np.clip(out_rgb, 0, 255)
-                                    out_rgba[3] = int(out_a * 255)
-                                    block_map[key] = out_rgba
-                                else:
-                                    block_map[key] = rgba
-                                
-        # Convert to list
-        for (x, y, z), (r, g, b, a) in block_map.items():
-            blocks.append(PixelBlock(x, y, z, int(r), int(g), int(b), int(a)))
-            
-        return blocks
+            layer = SimpleVoxelizer._sample_part(part, skin_data)
+            if layer is not None:
+                layers.append(layer)
+
+        if not layers:
+            empty = np.zeros(0, dtype=np.int32)
+            return empty, empty, empty, np.zeros((0, 4), dtype=np.uint8)
+
+        # Number the distinct world voxels in order of first placement
+        coords = np.concatenate([np.stack(layer[:3], axis=1) for layer in layers])
+        uniq, first, inverse = np.unique(coords, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+        # Composite part by part (a part never covers a voxel twice)
+        out = np.zeros((uniq.shape[0], 4), dtype=np.uint8)
+        filled = np.zeros(uniq.shape[0], dtype=bool)
+        start = 0
+        for layer in layers:
+            rgba = layer[3]
+            idx = inverse[start:start + rgba.shape[0]]
+            start += rgba.shape[0]
+
+            old = filled[idx]
+            new_idx = idx[~old]
+            out[new_idx] = rgba[~old]
+            filled[new_idx] = True
+
+            if old.any():
+                # Alpha Blending (Over operator)
+                fg = rgba[old]
+                bg = out[idx[old]]
+                fg_a = fg[:, 3] / 255.0
+                bg_a = bg[:, 3] / 255.0
+                out_a = fg_a + bg_a * (1.0 - fg_a)
+                out_rgb = (fg[:, :3] * fg_a[:, np.newaxis] + bg[:, :3] * bg_a[:, np.newaxis] * (1.0 - fg_a)[:, np.newaxis]) / out_a[:, np.newaxis]
+                blended = np.empty_like(fg)
+                blended[:, :3] = np.clip(out_rgb, 0, 255)
+                blended[:, 3] = out_a * 255
+                out[idx[old]] = blended
+
+        order = np.argsort(first, kind='stable')
+        uniq = uniq[order].astype(np.int32)
+        return uniq[:, 0], uniq[:, 1], uniq[:, 2], out[order]
+
+    @staticmethod
+    def _sample_part(part: BoxPart, skin_data: np.ndarray):
+        """
+        Maps every voxel of a part to the texel of its nearest face.
+        Returns (wx, wy, wz, rgba) of the visible voxels, or None.
+        """
+        skin_h, skin_w, _ = skin_data.shape
+
+        # Get World Position (Translation Only)
+        # We assume rotation is Identity for 'standing'
+        # Since we can't easily rely on matrix decomposition if rotation exists,
+        # we will trust the user uses this validly (Standing pose).
+        mat = part.get_world_matrix()
+
+        # Extract translation (Matrix is Row, Col -> [0,3])
+        tx = int(mat[0, 3])
+        ty = int(mat[1, 3])
+        tz = int(mat[2, 3])
+
+        w, h, d = part.size
+        w, h, d = int(w), int(h), int(d)
+        if w <= 0 or h <= 0 or d <= 0:
+            return None
+
+        # Iterate Physical Bounds (Restore 10x10x10 for Hat)
+        lx, ly, lz = [a.ravel() for a in np.indices((w, h, d))]
+
+        # Face logic (Simple Box mapping)
+        # Determine nearest face to handle Volume -> Surface mapping
+        dists = np.stack([lx, w - 1 - lx, ly, h - 1 - ly, lz, d - 1 - lz])
+        face_idx = dists.argmin(axis=0)
+
+        # Per face: texture rect, source coordinate axes and box face size
+        #   left/right: (z, y) on d x h, bottom/top: (x, z) on w x d, front/back: (x, y) on w x h
+        flipped_y = h - 1 - ly
+        u_source = np.choose(face_idx // 2, [lz, lx, lx])
+        v_source = np.choose(face_idx // 2, [flipped_y, lz, flipped_y])
+        box_size = [(d, h), (d, h), (w, d), (w, d), (w, h), (w, h)]
+
+        has_face = np.zeros(6, dtype=bool)
+        base_u = np.zeros(6, dtype=np.int64)
+        base_v = np.zeros(6, dtype=np.int64)
+        face_w = np.zeros(6, dtype=np.int64)
+        face_h = np.zeros(6, dtype=np.int64)
+        scale_x = np.zeros(6)
+        scale_y = np.zeros(6)
+        for f, face_key in enumerate(SimpleVoxelizer.FACES):
+            if face_key not in part.uv_map:
+                continue
+            has_face[f] = True
+            base_u[f], base_v[f], face_w[f], face_h[f] = part.uv_map[face_key]
+            # Nearest Neighbor Scaling
+            # Map Box Coordinate (0..box_fw) to Texture Coordinate (0..fw)
+            box_fw, box_fh = box_size[f]
+            scale_x[f] = face_w[f] / max(1, box_fw)
+            scale_y[f] = face_h[f] / max(1, box_fh)
+
+        # Clamp for safety (floating point jitter)
+        u_off = np.minimum((u_source * scale_x[face_idx]).astype(np.int64), face_w[face_idx] - 1)
+        v_off = np.minimum((v_source * scale_y[face_idx]).astype(np.int64), face_h[face_idx] - 1)
+        u = base_u[face_idx] + u_off
+        v = base_v[face_idx] + v_off
+
+        # Sample
+        inside = has_face[face_idx] & (u >= 0) & (u < skin_w) & (v >= 0) & (v < skin_h)
+        keep = np.flatnonzero(inside)
+        rgba = skin_data[v[keep], u[keep]]
+
+        # Skip invisible (alpha < 0.01)
+        visible = rgba[:, 3] / 255.0 >= 0.01
+        keep = keep[visible]
+        if keep.size == 0:
+            return None
+        return tx + lx[keep], ty + ly[keep], tz + lz[keep], rgba[visible]
@@ -0,0 +1,87 @@
+# Everything that needs litemapy / nbtlib. SchematicBuilder imports this when a statue
+# is written, so start-up and the geometry / colour passes never pay for it.
+import numpy as np
+from schematic_builder import pack_bit_array
+try:
+    import nbtlib
+    from litemapy import Schematic, Region, BlockState, TileEntity
+    from nbtlib import Compound, String, Int, List, LongArray
+except ImportError:
+    print("Error: litemapy or nbtlib not found. Please install litemapy.")
+    raise
+
+# Monkeypatch litemapy to fix OverflowError with large ints (Python 3.14 / Numpy 2 compat)
+import litemapy.storage
+def patched_setitem(self, index: int, value: int) -> None:
+    index = int(index) # Ensure index is python int (fixes numpy contamination)
+    if not 0 <= index < len(self):
+        raise IndexError("Invalid index {}".format(index))
+    if not 0 <= value <= self._LitematicaBitArray__mask: # Access private via name mangling or getattr
+        # In patched method, self.__mask becomes self._LitematicaBitArray__mask
+        raise ValueError("Invalid value {}, maximum value is {}".format(value, self._LitematicaBitArray__mask))
+            
+    start_offset = index * self.nbits
+    start_arr_index = start_offset >> 6
+    end_arr_index = ((index + 1) * self.nbits - 1) >> 6
+    start_bit_offset = start_offset & 0x3F
+    m = (1 << 64) - 1
+    
+    # Force int conversion to avoid numpy overflow issues
+    current_val = int(self.array[start_arr_index])
+    mask = int(self._LitematicaBitArray__mask)
+    
+    zeroed = current_val & ~(mask << start_bit_offset)
+    updated = zeroed | (int(value) & mask) << start_bit_offset
+    self.array[start_arr_index] = int(updated & m)
+
+    if start_arr_index != end_arr_index:
+        end_offset = 64 - start_bit_offset
+        j1 = self.nbits - end_offset
+        
+        current_end = int(self.array[end_arr_index])
+        
+        # self.array[end_arr_index] = (self.array[end_arr_index] >> j1 << j1 | (value & self.__mask) >> end_offset) & m
+        # Break it down safely
+        term1 = (current_end >> j1) << j1
+        term2 = (int(value) & mask) >> end_offset
+        self.array[end_arr_index] = int((term1 | term2) & m)
+
+litemapy.storage.LitematicaBitArray.__setitem__ = patched_setitem
+
+AIR = BlockState("minecraft:air")
+
+class PackedRegion(Region):
+    """
+    litemapy Region filled from a NumPy index volume.
+    Region.setblock() looks the state up in a list per call and Region.to_nbt()
+    packs the storage one block at a time; this sets the palette and volume
+    directly and packs them with pack_bit_array().
+    """
+    def set_volume(self, palette: list, volume: np.ndarray):
+        """
+        palette: list of BlockState, palette[0] must be air
+        volume: (width, height, length) palette indices
+        """
+        self._Region__palette = list(palette)
+        self._Region__blocks = volume.astype(np.uint32, copy=False)
+
+    def to_nbt(self) -> Compound:
+        # Same layout as Region.to_nbt(), minus the per-block loop.
+        # The palette is built unique and used, so _optimize_palette() is not needed.
+        palette = self._Region__palette
+        width, height, length = self.width, self.height, self.length
+
+        root = Compound()
+        root["Position"] = Compound({"x": Int(self.x), "y": Int(self.y), "z": Int(self.z)})
+        root["Size"] = Compound({"x": Int(width), "y": Int(height), "z": Int(length)})
+        root["BlockStatePalette"] = List[Compound]([blk.to_nbt() for blk in palette])
+        root["Entities"] = List[Compound]([entity.to_nbt() for entity in self.entities])
+        root["TileEntities"] = List[Compound]([te.to_nbt() for te in self.tile_entities])
+        root["PendingBlockTicks"] = List[Compound](self.block_ticks)
+        root["PendingFluidTicks"] = List[Compound](self.fluid_ticks)
+
+        # Storage order is x fastest, then z, then y: (W, H, L) -> (H, L, W)
+        ordered = self._Region__blocks.transpose(1, 2, 0).reshape(-1)
+        nbits = max(int(np.ceil(np.log2(len(palette)))), 2)
+        root["BlockStates"] = LongArray(pack_bit_array(ordered, nbits))
+        return root
@@ -1,351 +1,602 @@
+from __future__ import annotations # Annotations name pipeline classes that are imported lazily
 import argparse
 import sys
 import os
+import io
+import re
+import contextlib
 import json
 import glob
+import hashlib
+import shutil
+import signal
 import multiprocessing
-import numpy as np
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, List, Tuple
 
 # Adjust path to find modules if running from src directly
 # sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from skin_loader import SkinLoader
-from color_matching import ColorMatcher
-from schematic_builder import SchematicBuilder
-
-# New Geometry System
-from geometry.rig import RigFactory
+# Light modules only: numpy, PIL and the rest of the pipeline are imported by
+# import_pipeline() once a code path needs them (see --list-poses, --help)
+from build_manifest import BuildManifest
 from geometry.pose import PoseApplicator
-from geometry.rasterizer import Rasterizer
-from geometry.simple_voxelizer import SimpleVoxelizer
-from dithering import Ditherer
-from geometry.items import ItemFactory 
-from geometry.macro_voxelizer import MacroVoxelizer
 
-SCALE_FACTOR = 3
+LUT_DIR = "color_lut"
+CACHE_FILE = "color_cache_v3.bin"
+LEGACY_CACHE_FILE = "color_cache_v2.json"
+PROGRESS_INTERVAL = 2.0 # Seconds between batch progress lines
+POOL_STOP_TIMEOUT = 5.0 # Seconds watch mode waits for its worker pool to shut down
+PALETTES = ["all", "wool", "concrete", "terracotta", "wood", "stone", "glass", "nature", "precious", "misc"]
+MAX_SERVICE_MACRO_SCALE = 16 # Bounds the statue size a single service request can ask for
+GEOMETRY_CACHE_SIZE = 64 # Templates / parts kept per process, a debug_all gallery of both models is 44
 
-def process_skin_wrapper(args):
+# Compiled pose templates and posed rig parts, keyed by everything that shapes
+# the geometry. Module level so pool workers reuse them across all the skins they process.
+# Least recently used first: a long-running service must not keep every variant it was asked for.
+_TEMPLATE_CACHE = OrderedDict()
+_PARTS_CACHE = OrderedDict()
+
+# Per-worker state built once by init_worker: the matcher, a handle on the
+# parent's shared colour cache and the batch's pixel digest claims (see process_unique_skin)
+_WORKER_MATCHER = None
+_WORKER_CACHE = None
+_WORKER_CLAIMS = None
+
+def import_pipeline():
     """
-    Wrapper for multiprocessing.
-    args: (input_path, output_path, model, pose_name, solid, palette, ignore_layers, simple_mode, dither, macro_mode, cache_copy)
-    Returns: (bool, cache_updates)
+    Imports the conversion pipeline (numpy, PIL, colour matching, geometry) into the
+    module globals on first call. Every code path that converts skins calls it first,
+    including pool workers (init_worker) so spawned processes get it too.
+    litemapy is imported later still, when a statue is written (SchematicBuilder).
     """
-    input_path, output_path, model, pose_name, solid, palette, ignore_layers, simple_mode, dither, macro_mode, cache_copy = args
-    # Re-init matcher to avoid pickling large objects or sharing state issues
-    matcher = ColorMatcher(mode=palette)
-    return process_skin(input_path, output_path, model, pose_name, solid, palette, ignore_layers, simple_mode, dither, macro_mode, matcher, cache_copy)
+    global np, SkinLoader, ColorMatcher, ColorCache, SharedColorCache, SchematicBuilder
+    global RigFactory, Rasterizer, SimpleVoxelizer, Ditherer, ItemFactory, MacroVoxelizer
+    import numpy as np
+    from skin_loader import SkinLoader
+    from color_matching import ColorMatcher
+    from color_cache import ColorCache, SharedColorCache
+    from schematic_builder import SchematicBuilder
+
+    # New Geometry System
+    from geometry.rig import RigFactory
+    from geometry.rasterizer import Rasterizer
+    from geometry.simple_voxelizer import SimpleVoxelizer
+    from dithering import Ditherer
+    from geometry.items import ItemFactory
+    from geometry.macro_voxelizer import MacroVoxelizer
+
+def find_node(node, name: str):
+    """Depth-first search for a named node in the rig hierarchy."""
+    if node.name == name:
+        return node
+    for child in node.children:
+        found = find_node(child, name)
+        if found:
+            return found
+    return None
+
+def build_parts(model: str, pose_data: dict, item_type: Optional[str], item_material: Optional[str]) -> list:
+    """Builds the posed rig for a model and returns its parts, including held items."""
+    rig = RigFactory.create_rig(model_type=model)
+    PoseApplicator.apply_pose(rig, pose_data)
+
+    # Attach Items
+    parts = rig.get_parts()
+    if item_type == "sword":
+        hand_node = find_node(rig.root, "RightArmJoint")
+        if hand_node:
+            parts.extend(ItemFactory.create_sword(item_material, hand_node))
 
-def process_skin(input_path: str, output_path: str, model: str, pose_name: str, solid: bool, palette: str, ignore_layers: bool, simple_mode: bool, dither: bool, macro_mode: bool, matcher: ColorMatcher, cache: dict) -> Tuple[bool, dict]:
+    elif item_type == "bow":
+        hand_node = find_node(rig.root, "RightArmJoint")
+        if hand_node:
+            parts.extend(ItemFactory.create_bow(hand_node))
+
+    return parts
+
+def resolve_poses(pose_name: str) -> list:
     """
-    Process a single skin file. 
-    Returns: (Success, Cache_Updates_Dict)
+    Expands a pose argument (name, json path, sword_charge_<material>, debug_all)
+    into the list of (name, pose_data, item_type, item_material) to render.
+    """
+    # Determine Pose and Item
+    pose_key = pose_name
+    item_type = None
+    item_material = None
+
+    if pose_name.startswith("sword_charge"):
+        pose_key = "sword_charge"
+        parts = pose_name.split('_')
+        # sword_charge or sword_charge_diamond
+        if len(parts) > 2:
+            item_material = parts[2] # diamond
+        else:
+            item_material = "iron" # default
+        item_type = "sword"
+
+    elif pose_name == "bow_aim":
+        pose_key = "bow_aim"
+        item_type = "bow"
+
+    # Get Pose Data
+    pose_data = {}
+    if pose_key == "debug_all":
+        pass # Handled below
+    elif pose_key in PoseApplicator.POSES:
+        pose_data = PoseApplicator.get_pose(pose_key)
+    else:
+        # Fallback for file or default
+        if pose_key.endswith(".json") and os.path.exists(pose_key):
+            with open(pose_key, 'r') as f:
+                pose_data = json.load(f)
+        else:
+            pose_data = PoseApplicator.get_standing_pose()
+
+    # Prepare List of Poses to Render
+    poses_to_render = []
+    if pose_key == "debug_all":
+        for name in sorted(PoseApplicator.POSES.keys()):
+            p_item = None
+            p_mat = None
+
+            if name == "sword_charge":
+                p_item = "sword"
+                p_mat = "iron"
+            elif name == "bow_aim":
+                p_item = "bow"
+
+            poses_to_render.append((name, PoseApplicator.get_pose(name), p_item, p_mat))
+
+        if pose_key == "debug_all":
+            for mat in ["wood", "stone", "gold", "diamond", "netherite"]:
+                name = f"sword_charge_{mat}"
+                poses_to_render.append((name, PoseApplicator.get_pose("sword_charge"), "sword", mat))
+
+    else:
+         poses_to_render.append((pose_name, pose_data, item_type, item_material))
+
+    return poses_to_render
+
+def resolve_kernel(samples: str) -> tuple:
     """
-    local_cache_updates = {}
+    Expands a --samples argument (kernel name or json path to a list of [x, y, z]
+    offsets inside a voxel, lowest priority first) into a hashable kernel.
+    """
+    if samples in Rasterizer.KERNELS:
+        kernel = Rasterizer.KERNELS[samples]
+    elif samples.endswith(".json") and os.path.exists(samples):
+        with open(samples, 'r') as f:
+            kernel = json.load(f)
+    else:
+        raise ValueError(f"Unknown sample kernel '{samples}' (choose from {', '.join(Rasterizer.KERNELS)} or a .json file)")
+
+    kernel = tuple(tuple(float(c) for c in offset) for offset in kernel)
+    if not kernel or any(len(offset) != 3 or not all(0 <= c < 1 for c in offset) for offset in kernel):
+        raise ValueError(f"Sample kernel '{samples}' must be a non-empty list of [x, y, z] offsets in [0, 1)")
+    return kernel
+
+def build_settings(args, pose_name: str, kernel: Optional[tuple], shell: int, pillars: int, matcher: ColorMatcher) -> dict:
+    """Everything besides the skin that changes a statue, for the build manifest (max_memory does not)."""
+    settings = {
+        "model": args.model, "pose": pose_name, "solid": args.solid, "surface": args.surface,
+        "kernel": kernel, "shell": shell, "pillars": pillars, "palette": args.palette,
+        "palette_fingerprint": matcher.palette_fingerprint(), "no_layers": args.no_layers,
+        "simple": args.simple, "dither": args.dither, "macro": args.macro, "macro_scale": args.macro_scale,
+        "lut_bits": args.lut_bits if args.lut else None
+    }
+    if os.path.isfile(pose_name):
+        # Custom pose file: its contents matter, not its name
+        with open(pose_name, 'rb') as f:
+            settings["pose_file"] = hashlib.sha256(f.read()).hexdigest()
+    return settings
+
+def get_pose_parts(model: str, pose_data: dict, item_type: Optional[str], item_material: Optional[str]) -> list:
+    """Cached build_parts(); the voxelizers only read the parts."""
+    key = (model, json.dumps(pose_data, sort_keys=True), item_type, item_material)
+    parts = _PARTS_CACHE.get(key)
+    if parts is None:
+        parts = build_parts(model, pose_data, item_type, item_material)
+        _PARTS_CACHE[key] = parts
+        if len(_PARTS_CACHE) > GEOMETRY_CACHE_SIZE:
+            _PARTS_CACHE.popitem(last=False)
+    else:
+        _PARTS_CACHE.move_to_end(key)
+    return parts
+
+def get_pose_template(model: str, pose_data: dict, item_type: Optional[str], item_material: Optional[str], solid: bool, ignore_layers: bool, skin_size: Tuple[int, int] = (64, 64), surface: bool = False, kernel: Optional[tuple] = None, max_memory: Optional[int] = None):
+    """
+    Returns the compiled PoseTemplate for these settings, compiling it on first use.
+    The template only depends on geometry, so it is shared by every skin.
+    max_memory only bounds the compile (same template), so it is not part of the key.
+    """
+    key = (model, json.dumps(pose_data, sort_keys=True), item_type, item_material, solid, ignore_layers, skin_size, surface, kernel)
+    template = _TEMPLATE_CACHE.get(key)
+    if template is None:
+        parts = get_pose_parts(model, pose_data, item_type, item_material)
+        template = Rasterizer.compile_template(parts, solid=solid, ignore_overlays=ignore_layers, skin_size=skin_size, surface=surface, kernel=kernel, max_memory=max_memory)
+        _TEMPLATE_CACHE[key] = template
+        if len(_TEMPLATE_CACHE) > GEOMETRY_CACHE_SIZE:
+            _TEMPLATE_CACHE.popitem(last=False)
+    else:
+        _TEMPLATE_CACHE.move_to_end(key)
+    return template
+
+def load_color_cache(matcher: ColorMatcher, palette: str) -> ColorCache:
+    """
+    Loads the binary colour cache for a palette (call after loading a LUT into the matcher).
+    Imports the legacy JSON cache once if the palette has no binary entries yet.
+    A quantized LUT (< 8 bits) gives approximate matches, so they are kept in a
+    separate section and never leak into the results of exact runs.
+    """
+    exact = matcher.lut is None or matcher.lut_bits == 8
+    section = palette if exact else f"{palette}@lut{matcher.lut_bits}"
+    cache = ColorCache.load(CACHE_FILE, section, matcher.palette_fingerprint())
+    if exact and len(cache) == 0 and os.path.exists(LEGACY_CACHE_FILE):
+        legacy = matcher.load_cache_from_disk(LEGACY_CACHE_FILE).get(palette, {})
+        index_of = {block_id: i for i, block_id in enumerate(matcher.palette_ids_list)}
+        entries = [(key, index_of[block_id]) for key, block_id in legacy.items() if block_id in index_of and len(key) == 4]
+        if entries:
+            cache.add(np.array([k for k, _ in entries], dtype=np.uint8), np.array([i for _, i in entries]))
+            print(f"Imported {len(entries)} colors from {LEGACY_CACHE_FILE}.")
+    return cache
+
+def warm_geometry(model: str, pose_name: str, solid: bool, surface: bool, kernel: Optional[tuple], max_memory: Optional[int], ignore_layers: bool, simple_mode: bool):
+    """Builds the posed rigs (simple mode) or pose templates a batch will need ("auto" warms both models)."""
+    models = ["classic", "slim"] if model == "auto" else [model]
+    for m in models:
+        for _, p_data, p_item, p_mat in resolve_poses(pose_name):
+            if simple_mode:
+                get_pose_parts(m, p_data, p_item, p_mat)
+            else:
+                get_pose_template(m, p_data, p_item, p_mat, solid, ignore_layers, surface=surface, kernel=kernel, max_memory=max_memory)
+
+def init_worker(palette: str, lut_path: Optional[str], model: str, pose_name: str, solid: bool, surface: bool, kernel: Optional[tuple], max_memory: Optional[int], ignore_layers: bool, simple_mode: bool, macro_mode: bool, cache_name: str, cache_lock, claims=None):
+    """
+    Pool initializer: builds everything that does not depend on the skin once per
+    process (matcher, LUT mapping, rigs / pose templates) and attaches to the
+    parent's shared colour cache.
+    claims: dict shared by the pool (multiprocessing.Manager) to render pixel-identical skins once, or None
+    """
+    global _WORKER_MATCHER, _WORKER_CACHE, _WORKER_CLAIMS
+    # The parent owns shutdown (terminate_pool): ignore Ctrl+C, which the terminal sends to the
+    # whole process group, and drop the SIGTERM handler of watch_folder, which workers the pool
+    # forks to replace dead ones would inherit
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import_pipeline()
+    _WORKER_MATCHER = ColorMatcher(mode=palette)
+    if lut_path:
+        # Memory-mapped: every worker shares the same page-cache copy
+        _WORKER_MATCHER.load_lut(lut_path)
+    if not macro_mode: # Macro mode bypasses the pose system
+        warm_geometry(model, pose_name, solid, surface, kernel, max_memory, ignore_layers, simple_mode)
+    _WORKER_CACHE = SharedColorCache.attach(cache_name, cache_lock)
+    _WORKER_CLAIMS = claims
+
+def terminate_pool(pool: multiprocessing.pool.Pool):
+    """
+    pool.terminate() and pool.join(), giving up after POOL_STOP_TIMEOUT seconds.
+    terminate() first takes the lock of the task queue, which an idle worker holds while it
+    waits for a task. A worker killed from outside (SIGTERM to the whole process group,
+    OOM killer) never releases it, so the workers left are killed instead.
+    """
+    stopper = threading.Thread(target=lambda: (pool.terminate(), pool.join()), daemon=True)
+    stopper.start()
+    stopper.join(POOL_STOP_TIMEOUT)
+    if stopper.is_alive():
+        for process in multiprocessing.active_children():
+            process.kill()
+
+def sync_shared_cache(shared_cache: SharedColorCache, cache: ColorCache):
+    """Copies entries the workers added to the shared cache into `cache` (only new or changed ones)."""
+    keys, indices = shared_cache.items()
+    known, hit = cache.lookup_packed(keys)
+    new = ~hit | (known != indices)
+    cache.add_packed(keys[new], indices[new])
+
+def merge_overflow(cache: ColorCache, overflow: Optional[tuple]) -> int:
+    """
+    Adds colours a worker matched while the shared cache was full (SharedColorCache.take_overflow)
+    to `cache`, so they are saved with it. Returns: how many were new to `cache`
+    """
+    if overflow is None:
+        return 0
+    known = len(cache)
+    cache.add_packed(*overflow)
+    return len(cache) - known
+
+def bounded(tasks, slots: threading.Semaphore):
+    """Yields tasks, holding one slot each, so at most N tasks are queued or running at once."""
+    for task in tasks:
+        slots.acquire()
+        yield task
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+def consume_results(results, total: int, checkpoint, checkpoint_every: int, slots: Optional[threading.Semaphore] = None, on_success=None) -> int:
+    """
+    Consumes batch results, (input_path, success) pairs, as they complete.
+    Prints throughput / ETA every PROGRESS_INTERVAL seconds and calls checkpoint()
+    every `checkpoint_every` skins, so an interrupted run keeps its cache work.
+    on_success(input_path) is called for every skin that was saved.
+    Returns: number of successful skins
+    """
+    start = time.time()
+    last_report = start
+    success_count = 0
+
+    for done, (input_path, success) in enumerate(results, 1):
+        if slots is not None:
+            slots.release()
+        if success:
+            success_count += 1
+            if on_success is not None:
+                on_success(input_path)
+        if checkpoint_every > 0 and done % checkpoint_every == 0:
+            checkpoint()
+
+        now = time.time()
+        if now - last_report >= PROGRESS_INTERVAL or done == total:
+            rate = done / max(now - start, 1e-9)
+            eta = (total - done) / rate
+            print(f"[{done}/{total}] {rate:.2f} skins/s, elapsed {format_duration(now - start)}, ETA {format_duration(eta)}")
+            last_report = now
+
+    return success_count
+
+def output_file_for(input_path: str, output_path: Optional[str], pose_name: str) -> str:
+    """Path process_skin() saves the statue of a skin to (directories are not created here)."""
+    base_name = os.path.basename(input_path).rsplit('.', 1)[0]
+    suffix = f"_{pose_name}" if pose_name != "debug_all" else "_debug_all"
+    if not output_path:
+        return os.path.join(f"{base_name} output", f"{base_name}{suffix}.litematic")
+    if os.path.isdir(output_path) or output_path.endswith(os.sep):
+        return os.path.join(output_path, f"{base_name}{suffix}.litematic")
+    return output_path
+
+def skin_digest(img, model: str) -> bytes:
+    """
+    Identity of the statue a decoded skin gives: its RGBA pixels and model. Equal for
+    re-encoded PNGs, default skin copies, ...
+    """
+    skin_model = SkinLoader.detect_model(img) if model == "auto" else model
+    digest = hashlib.sha256(f"{skin_model}:{img.width}x{img.height}:".encode('ascii'))
+    digest.update(img.tobytes())
+    return digest.digest()
+
+def link_output(src: str, dst: str):
+    """Makes dst a copy of the finished statue src: a hardlink where possible, a file copy otherwise."""
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    if os.path.dirname(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = dst + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
     try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+def process_unique_skin(task: tuple, matcher: ColorMatcher, cache: ColorCache, claims: Optional[dict]) -> Tuple[str, bool, Optional[str]]:
+    """
+    process_skin(*task) for batches that render pixel-identical skins once.
+    claims: {skin_digest: input path} shared by the batch, or None to render every skin.
+            The skin is decoded once, here, and only rendered if it claims its digest first.
+    Returns: (input_path, success, path of the identical skin rendered instead or None)
+    """
+    input_path = task[0]
+    skin_img = None
+    if claims is not None:
         try:
             skin_img = SkinLoader.load_skin(input_path)
-        except Exception as e:
-            print(f"Error loading skin {os.path.basename(input_path)}: {e}")
-            return False, {}
+        except Exception:
+            pass # Unreadable: process_skin() reports it
+        else:
+            original = claims.setdefault(skin_digest(skin_img, task[2]), input_path)
+            if original != input_path:
+                return input_path, True, original
+    success, _ = process_skin(*task, matcher, cache, skin_img=skin_img)
+    return input_path, success, None
 
-        detected_model = model
-        if detected_model == "auto":
-            detected_model = SkinLoader.detect_model(skin_img)
-        
-        # Determine Pose and Item
-        pose_key = pose_name
-        item_type = None
-        item_material = None
-        
-        if pose_name.startswith("sword_charge"):
-            pose_key = "sword_charge"
-            parts = pose_name.split('_')
-            # sword_charge or sword_charge_diamond
-            if len(parts) > 2:
-                item_material = parts[2] # diamond
+def process_skin_wrapper(args):
+    """
+    Wrapper for multiprocessing. Uses the per-process state from init_worker, so
+    tasks only carry the file and settings and new matches are published in place.
+    args: (input_path, output_path, model, pose_name, solid, surface, kernel, max_memory, shell, pillars, palette, ignore_layers, simple_mode, dither, macro_mode, macro_scale)
+    Returns: (input_path, success, original) as process_unique_skin, plus the colours this
+             worker matched that did not fit the full shared cache (see merge_overflow)
+    """
+    return process_unique_skin(args, _WORKER_MATCHER, _WORKER_CACHE, _WORKER_CLAIMS) + (_WORKER_CACHE.take_overflow(),)
+
+def build_statue(skin_img, base_name: str, model: str, pose_name: str, solid: bool, surface: bool, kernel: Optional[tuple], max_memory: Optional[int], shell: int, pillars: int, ignore_layers: bool, simple_mode: bool, dither: bool, macro_mode: bool, macro_scale: int, matcher: ColorMatcher, cache: ColorCache) -> Tuple[SchematicBuilder, Optional[tuple]]:
+    """
+    Voxelizes a loaded skin for every pose of pose_name and matches the blocks.
+    Returns: (builder holding the statue, cache updates as in process_skin)
+    """
+    local_cache_updates = None
+    detected_model = model
+    if detected_model == "auto":
+        detected_model = SkinLoader.detect_model(skin_img)
+    
+    poses_to_render = resolve_poses(pose_name)
+
+    # Setup Builder
+    schem_name = f"Statue_{base_name}"
+    if pose_name == "debug_all":
+        schem_name += "_Gallery"
+    
+    builder = SchematicBuilder(name=schem_name)
+    
+    # Pre-compute unique colors logic is now handled per-pose or global?
+    # Doing it per-pose inside rasterization is more accurate for UVs but slower?
+    # Rasterizer now returns colors. We handle matching below.
+    
+    if macro_mode: # Force Macro Mode per architectural pivot
+        # FORCE T-POSE / MACRO MODE
+        # We ignore the pose arguments and specific item rendering for now
+        # as requested: "DISABLE THE POSE SYSTEM... Focus solely on generating a perfect, static... T-pose"
+        print(f"Generating Macro-Voxel T-Pose (Scale {macro_scale})...")
+        wx, wy, wz, colors = MacroVoxelizer.generate(skin_img, scale=macro_scale)
+
+        # One pass of the loop below, which matches these voxels without rasterizing
+        poses_to_render = [("macro_t_pose", None, None, None)]
+        offset_x = 0
+        shift_y = 0
+        if wx.size > 0:
+            # MacroVoxelizer puts the feet roughly at 0, only lift what is below
+            min_y = np.min(wy)
+            shift_y = -min_y if min_y < 0 else 0
+
+    # Loop variables
+    GAP_SIZE = 5
+    total_added = 0
+    last_max_x = None
+
+    for p_name, p_data, p_item, p_mat in poses_to_render:
+        if not macro_mode: # Macro mode already has wx, wy, wz, colors from MacroVoxelizer
+            # Optimized Rasterizer call
+            # Returns raw numpy arrays
+            if simple_mode:
+                parts = get_pose_parts(detected_model, p_data, p_item, p_mat)
+                wx, wy, wz, colors = SimpleVoxelizer.generate(parts, skin_img, ignore_overlays=ignore_layers)
             else:
-                item_material = "iron" # default
-            item_type = "sword"
+                # Geometry is compiled once per pose; only the colour gather runs per skin
+                template = get_pose_template(detected_model, p_data, p_item, p_mat, solid, ignore_layers, skin_img.size, surface, kernel, max_memory)
+                wx, wy, wz, colors = template.render(skin_img, shell, pillars)
             
-        elif pose_name == "bow_aim":
-            pose_key = "bow_aim"
-            item_type = "bow"
+            if wx.size == 0:
+                continue
+                
+            # Auto Grounding
+            min_y = np.min(wy)
+            shift_y = -min_y
             
-        # Get Pose Data
-        pose_data = {}
-        if pose_key == "debug_all":
-            pass # Handled below
-        elif pose_key in PoseApplicator.POSES:
-            pose_data = PoseApplicator.get_pose(pose_key)
-        else:
-            # Fallback for file or default
-            if pose_key.endswith(".json") and os.path.exists(pose_key):
-                with open(pose_key, 'r') as f:
-                    pose_data = json.load(f)
+            local_min_x = np.min(wx)
+            local_max_x = np.max(wx)
+            
+            if last_max_x is None:
+                offset_x = 0
             else:
-                pose_data = PoseApplicator.get_standing_pose()
-
-        # Prepare List of Poses to Render
-        poses_to_render = []
-        if pose_key == "debug_all":
-            for name in sorted(PoseApplicator.POSES.keys()):
-                p_item = None
-                p_mat = None
+                offset_x = last_max_x + GAP_SIZE - local_min_x
                 
-                if name == "sword_charge":
-                    p_item = "sword"
-                    p_mat = "iron"
-                elif name == "bow_aim":
-                    p_item = "bow"
-                
-                poses_to_render.append((name, PoseApplicator.get_pose(name), p_item, p_mat))
-                    
-            if pose_key == "debug_all":
-                for mat in ["wood", "stone", "gold", "diamond", "netherite"]:
-                    name = f"sword_charge_{mat}"
-                    poses_to_render.append((name, PoseApplicator.get_pose("sword_charge"), "sword", mat))
-                    
-        else:
-             poses_to_render.append((pose_name, pose_data, item_type, item_material))
+            last_max_x = local_max_x + offset_x
+            
+            # Debug Labels
+            if pose_name == "debug_all":
+                 front_z_local = np.min(wz)
+                 sign_z = int(front_z_local - 1)
+                 sign_x = int(offset_x)
+                 sign_y = 0
+                 
+                 disp_text = p_name
+                 if p_name.startswith("sword_charge_"):
+                     disp_text = p_name.replace("sword_charge_", "Sword ")
+                 
+                 builder.add_sign(sign_x, sign_y, sign_z, text=disp_text, facing="north")
 
-        # Setup Builder
-        base_name = os.path.basename(input_path).rsplit('.', 1)[0]
-        schem_name = f"Statue_{base_name}"
-        if pose_name == "debug_all":
-            schem_name += "_Gallery"
+        # Match Colors (Optimized or Dithered)
+        u_ids = None
+        inverse = None
         
-        builder = SchematicBuilder(name=schem_name)
-        
-        # Output Path Logic
-        final_output = output_path
-        if not final_output:
-            output_dir = f"{base_name} output"
-            os.makedirs(output_dir, exist_ok=True)
-            suffix = f"_{pose_name}" if pose_name != "debug_all" else "_debug_all"
-            final_output = os.path.join(output_dir, f"{base_name}{suffix}.litematic")
-        elif os.path.isdir(final_output) or final_output.endswith(os.sep):
-             os.makedirs(final_output, exist_ok=True)
-             suffix = f"_{pose_name}" if pose_name != "debug_all" else "_debug_all"
-             final_output = os.path.join(final_output, f"{base_name}{suffix}.litematic")
-        
-        # Pre-compute unique colors logic is now handled per-pose or global?
-        # Doing it per-pose inside rasterization is more accurate for UVs but slower?
-        # Rasterizer now returns colors. We handle matching below.
-        
-        if macro_mode: # Force Macro Mode per architectural pivot
-            # FORCE T-POSE / MACRO MODE
-            # We ignore the pose arguments and specific item rendering for now
-            # as requested: "DISABLE THE POSE SYSTEM... Focus solely on generating a perfect, static... T-pose"
-            
-            print(f"Generating Macro-Voxel T-Pose (Scale {SCALE_FACTOR})...")
-            wx, wy, wz, colors = MacroVoxelizer.generate(skin_img, scale=SCALE_FACTOR)
+        if dither:
+            # Dithering requires spatial context, so we cannot optimize by unique colors first.
+            # We apply dithering to all pixels, then match all pixels.
+            coords = np.stack([wx, wy, wz], axis=1) # (N, 3)
             
-            # Helper to allow downstream code to function
-            # We treat this as a single 'pass'
-            poses_to_render = [("macro_t_pose", None, None, None)]
+            # Split Alpha
+            rgb = colors[:, :3]
+            alpha = colors[:, 3:4]
             
-            # We need to skip the loop that calls Rasterizer and just use these coords.
-            # However, the loop below iterates 'poses_to_render'. 
-            # We will Refactor the loop to support pre-calculated data or just inline it.
+            # Apply Dither
+            dithered_rgb = Ditherer.apply_bayer_dither(rgb, coords)
             
-            # Let's adjust the variables that the Dithering/Matching block expects.
-            # It expects 'wx', 'wy', 'wz', 'colors' to be defined in the scope.
-            # We can break the loop structure or wrap this.
+            # Recombine (N, 4)
+            dithered_rgba = np.concatenate([dithered_rgb, alpha], axis=1)
             
-            # Since the user wants to "Refactor the base generation loop", 
-            # I will perform the matching/building here and essentially Delete/Comment the old loop.
+            # Match ALL directly (Skip Cache for Dithered? Cache is useless if every pixel varies)
+            u_idx = matcher.match_indices(dithered_rgba)
             
-            offset_x = 0
-            shift_y = 0 # No grounding needed for T-pose usually, or we can calculate min_y
-            
-            if wx.size > 0:
-                 min_y = np.min(wy)
-                 # Shift so feet are at 0?
-                 # T-pose usually has feet at 0 or 12 pixels * scale.
-                 # Our MacroVoxelizer puts feet roughly at 0.
-                 shift_y = -min_y if min_y < 0 else 0
-            
-            # Continue to Color Matching...
-            # We need to jump to line 205 (Match Colors).
-            # But the 'poses_to_render' loop structure in existing code wraps the Rasterizer call AND the Builder call.
-            # So I should output valid wx/wy/wz/colors and then fall through?
-            # No, the loop (line 144) iterates poses.
-            # I should clear 'poses_to_render' and make a dummy loop that doesn't re-calculate.
-            
-            # Hack:
-            dummy_loop = [("macro_t_pose", None, None, None)]
-            
-            # Restore loop variables
-            GAP_SIZE = 5
-            total_added = 0
-            last_max_x = None
-
-            
-        # Re-structure:
-        # We will iterate our dummy loop, but INSIDE the loop we skip the Rig/Rasterizer 
-        # if we already have data.
-        
+            # 'inverse' is just identity mapping because u_idx corresponds to colors 1:1
+            inverse = np.arange(len(colors))
         else:
-             # Standard Rig/Pose Logic
-             poses_to_render = poses_to_render # Use original list
-             
-        for p_name, p_data, p_item, p_mat in poses_to_render:
-            # Skip Rig/Rasterizer, we already have wx, wy, wz, colors from MacroVoxelizer if it was macro mode
+            # 1. Identify unique colors
+            # colors shape (N, 4)
+            u_colors, inverse = np.unique(colors, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
             
-            if not macro_mode:
-                # Need to run legacy rasterizer
-                rig = RigFactory.create_rig(model_type=detected_model)
-                PoseApplicator.apply_pose(rig, p_data)
-                
-                # Attach Items
-                parts = rig.get_parts()
-                if p_item == "sword":
-                    hand_node = find_node(rig.root, "RightArmJoint")
-                    if hand_node:
-                        sword_parts = ItemFactory.create_sword(p_mat, hand_node)
-                        parts.extend(sword_parts)
-                        
-                elif p_item == "bow":
-                    hand_node = find_node(rig.root, "RightArmJoint")
-                    if hand_node:
-                        bow_parts = ItemFactory.create_bow(hand_node)
-                        parts.extend(bow_parts)
-                
-                # Optimized Rasterizer call
-                # Returns raw numpy arrays
-                if simple_mode:
-                    pixel_blocks = SimpleVoxelizer.generate(parts, skin_img, ignore_overlays=ignore_layers)
-                    if not pixel_blocks:
-                        continue
-                    wx = np.array([b.x for b in pixel_blocks], dtype=np.int32)
-                    wy = np.array([b.y for b in pixel_blocks], dtype=np.int32)
-                    wz = np.array([b.z for b in pixel_blocks], dtype=np.int32)
-                    colors = np.array([(b.r, b.g, b.b, b.a) for b in pixel_blocks], dtype=np.uint8)
-                else:
-                    wx, wy, wz, colors = Rasterizer.rasterize(parts, skin_img, solid=solid, return_raw=True, ignore_overlays=ignore_layers)
-                
-                if wx.size == 0:
-                    continue
-                    
-                # Auto Grounding
-                min_y = np.min(wy)
-                shift_y = -min_y
-                
-                local_min_x = np.min(wx)
-                local_max_x = np.max(wx)
-                
-                if last_max_x is None:
-                    offset_x = 0
-                else:
-                    offset_x = last_max_x + GAP_SIZE - local_min_x
-                    
-                last_max_x = local_max_x + offset_x
-                
-                # Debug Labels
-                if pose_name == "debug_all":
-                     front_z_local = np.min(wz)
-                     sign_z = int(front_z_local - 1)
-                     sign_x = int(offset_x)
-                     sign_y = 0
-                     
-                     disp_text = p_name
-                     if p_name.startswith("sword_charge_"):
-                         disp_text = p_name.replace("sword_charge_", "Sword ")
-                     
-                     builder.add_sign(sign_x, sign_y, sign_z, text=disp_text, facing="north")
-
-            # Match Colors (Optimized or Dithered)
-
-
-            # Match Colors (Optimized or Dithered)
-            u_ids = None
-            inverse = None
+            # 2. Check Cache (vectorized, palette indices)
+            u_idx, hit = cache.lookup(u_colors)
             
-            if dither:
-                # Dithering requires spatial context, so we cannot optimize by unique colors first.
-                # We apply dithering to all pixels, then match all pixels.
-                coords = np.stack([wx, wy, wz], axis=1) # (N, 3)
-                
-                # Split Alpha
-                rgb = colors[:, :3]
-                alpha = colors[:, 3:4]
-                
-                # Apply Dither
-                dithered_rgb = Ditherer.apply_bayer_dither(rgb, coords)
+            # 3. Batch Match Misses
+            miss = ~hit
+            if np.any(miss):
+                miss_colors = u_colors[miss]
+                matched = matcher.match_indices(miss_colors)
+                u_idx[miss] = matched
                 
-                # Recombine (N, 4)
-                dithered_rgba = np.concatenate([dithered_rgb, alpha], axis=1)
-                
-                # Match ALL directly (Skip Cache for Dithered? Cache is useless if every pixel varies)
-                # Actually, cache might still catch same dithered results? Unlikely.
-                # Just match bulk.
-                u_ids = matcher.match_bulk(dithered_rgba)
-                
-                # 'inverse' is just identity mapping because u_ids corresponds to colors 1:1
-                inverse = np.arange(len(colors))
-                
-                # We treat u_ids as the per-pixel result
-                # But the code below expects u_ids to be the *palette* of unique colors 
-                # and 'inverse' to map pixels to that palette.
-                # If we have N pixels and N unique colors (worst case), it still works.
-                # u_ids needs to be the array of Block IDs.
-                # Wait, existing code: u_ids is list of Block IDs for UNIQ colors.
-                # Then 'final_ids = [u_ids[i] for i in inverse]' logic isn't shown but implied?
-                # Let's check lines 230+.
-            else:
-                # 1. Identify unique colors
-                # colors shape (N, 4)
-                u_colors, inverse = np.unique(colors, axis=0, return_inverse=True)
-                
-                u_ids = [None] * len(u_colors)
-                miss_indices = []
-                miss_colors = []
-                
-                # 2. Check Cache
-                for i, c in enumerate(u_colors):
-                    key = tuple(c) # (r,g,b,a)
-                    if key in cache and cache[key] in matcher.palette:
-                        u_ids[i] = cache[key]
-                    else:
-                        miss_indices.append(i)
-                        miss_colors.append(c)
-                
-                # 3. Batch Match Misses
-                if miss_colors:
-                    miss_arr = np.array(miss_colors, dtype=np.uint8)
-                    matched_ids = matcher.match_bulk(miss_arr)
-                    
-                    for idx, block_id, col in zip(miss_indices, matched_ids, miss_colors):
-                        u_ids[idx] = block_id
-                        # Update cache updates
-                        key = tuple(col)
-                        local_cache_updates[key] = block_id
-                    # Also update local scope cache to avoid re-matching same color in this loop
-                    cache[key] = block_id
-            
-            # 4. Map back to all pixels
-            u_ids_arr = np.array(u_ids)
-            all_ids = u_ids_arr[inverse]
-            
-            # 5. Bulk Add to Builder
-            # Apply offsets
-            final_x = wx + int(offset_x)
-            final_y = wy + int(shift_y)
-            final_z = wz
-            
-            coords = np.stack((final_x, final_y, final_z), axis=1)
-            builder.add_blocks_bulk(coords, all_ids)
-            total_added += len(all_ids)
-
-            # Block Usage Stats
-            unique, counts = np.unique(all_ids, return_counts=True)
-            print(f"--- Block Usage Stats ({pose_name}) ---")
-            sorted_stats = sorted(zip(unique, counts), key=lambda x: x[1], reverse=True)
-            for bid, count in sorted_stats: # Show ALL
-                print(f"  {bid}: {count}")
-            print("---------------------------------------")
+                # Also update local cache to avoid re-matching same color in later poses
+                cache.add(miss_colors, matched)
+                new_keys = ColorCache.pack(miss_colors)
+                if local_cache_updates is None:
+                    local_cache_updates = (new_keys, matched)
+                else:
+                    local_cache_updates = (np.concatenate([local_cache_updates[0], new_keys]),
+                                           np.concatenate([local_cache_updates[1], matched]))
+        
+        # 4. Map back to all pixels
+        all_ids = matcher.palette_ids_arr[u_idx][inverse]
+        
+        # 5. Bulk Add to Builder
+        # Apply offsets
+        final_x = wx + int(offset_x)
+        final_y = wy + int(shift_y)
+        final_z = wz
+        
+        coords = np.stack((final_x, final_y, final_z), axis=1)
+        builder.add_blocks_bulk(coords, all_ids)
+        total_added += len(all_ids)
+
+        # Block Usage Stats
+        unique, counts = np.unique(all_ids, return_counts=True)
+        print(f"--- Block Usage Stats ({pose_name}) ---")
+        sorted_stats = sorted(zip(unique, counts), key=lambda x: x[1], reverse=True)
+        for bid, count in sorted_stats: # Show ALL
+            print(f"  {bid}: {count}")
+        print("---------------------------------------")
+
+    return builder, local_cache_updates
+
+def process_skin(input_path: str, output_path: str, model: str, pose_name: str, solid: bool, surface: bool, kernel: Optional[tuple], max_memory: Optional[int], shell: int, pillars: int, palette: str, ignore_layers: bool, simple_mode: bool, dither: bool, macro_mode: bool, macro_scale: int, matcher: ColorMatcher, cache: ColorCache, skin_img=None) -> Tuple[bool, Optional[tuple]]:
+    """
+    Process a single skin file. 
+    skin_img: the skin if the caller already decoded input_path
+    Returns: (Success, Cache_Updates) where updates are (packed_keys, palette_indices) arrays or None
+    """
+    local_cache_updates = None
+    try:
+        try:
+            if skin_img is None:
+                skin_img = SkinLoader.load_skin(input_path)
+        except Exception as e:
+            print(f"Error loading skin {os.path.basename(input_path)}: {e}")
+            return False, None
+
+        base_name = os.path.basename(input_path).rsplit('.', 1)[0]
+        builder, local_cache_updates = build_statue(skin_img, base_name, model, pose_name, solid, surface, kernel, max_memory, shell, pillars, ignore_layers, simple_mode, dither, macro_mode, macro_scale, matcher, cache)
 
+        # Output Path Logic
+        final_output = output_file_for(input_path, output_path, pose_name)
+        if final_output != output_path:
+            os.makedirs(os.path.dirname(final_output), exist_ok=True)
         builder.save(final_output)
         return True, local_cache_updates
         
@@ -356,7 +607,282 @@ def process_skin(input_path: str, output_path: str, model: str, pose_name: str,
         # Return empty updates on failure
         return False, local_cache_updates
 
+def scan_skins(directory: str) -> dict:
+    """Returns {path: (mtime_ns, size)} of the .png files directly in directory."""
+    found = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.lower().endswith('.png'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue # Deleted between listing and stat
+                    if entry.is_file():
+                        found[entry.path] = (st.st_mtime_ns, st.st_size)
+    except OSError as e:
+        print(f"Warning: Cannot scan {directory}: {e}")
+    return found
+
+def watch_folder(watch_dir: str, output_path: Optional[str], pose_name: str, make_task, init_args: tuple, workers: int, matcher: ColorMatcher, cache: ColorCache,
+                 manifest: Optional[BuildManifest], fingerprint: Optional[str], poll_interval: float, checkpoint_every: int, force: bool = False):
+    """
+    Daemon mode: renders new or changed skins in watch_dir until interrupted (Ctrl+C).
+
+    The directory is polled (mtime and size, no OS-specific watcher). A skin is queued
+    once its stat is unchanged between two scans, so half-written uploads are skipped;
+    a skin whose output the manifest already has up to date is not rendered again
+    (unless `force`: then every skin is rendered once per change, starting with the
+    ones already in the directory).
+    The worker pool is started once (init_worker: matcher, LUT, pose templates) and
+    shares the colour cache, which is saved every `checkpoint_every` renders and on exit.
+    """
+    poll_interval = max(0.05, poll_interval)
+    rendered = {} # path -> stat it was last queued with
+    settling = {} # path -> stat seen on the previous scan
+    in_flight = {} # path -> (start time, build key, AsyncResult)
+    done_count = 0
+
+    pool = None
+    shared_cache = None
+    if workers > 1:
+        cache_lock = multiprocessing.Lock()
+        shared_cache = SharedColorCache.create(cache, cache_lock)
+        pool = multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=init_args + (shared_cache.name, cache_lock))
+    else:
+        # Serial: warm the geometry here (init_worker does it for pool workers)
+        _, _, model, _, solid, surface, kernel, max_memory, ignore_layers, simple_mode, macro_mode = init_args
+        if not macro_mode:
+            warm_geometry(model, pose_name, solid, surface, kernel, max_memory, ignore_layers, simple_mode)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    # Service managers stop daemons with SIGTERM: shut down like Ctrl+C. Installed after the
+    # pool started, so only this process handles it (init_worker resets it in the workers).
+    previous_handler = signal.signal(signal.SIGTERM, stop)
+
+    def checkpoint():
+        if shared_cache is not None:
+            sync_shared_cache(shared_cache, cache)
+        cache.save(CACHE_FILE)
+
+    def finish(path: str, success: bool, started: float, key: Optional[str]):
+        nonlocal done_count
+        done_count += 1
+        if success:
+            print(f"Rendered {os.path.basename(path)} in {time.time() - started:.2f}s")
+            if manifest is not None:
+                manifest.record(output_file_for(path, output_path, pose_name), key)
+        if checkpoint_every > 0 and done_count % checkpoint_every == 0:
+            checkpoint()
+
+    print(f"Watching {watch_dir} for skins every {poll_interval:g}s using {workers} worker(s) (Ctrl+C to stop)...")
+    try:
+        while True:
+            current = scan_skins(watch_dir)
+
+            for path, stat in current.items():
+                if path in in_flight or rendered.get(path) == stat:
+                    continue
+                if settling.get(path) != stat:
+                    settling[path] = stat # New or still being written: wait for a stable scan
+                    continue
+                del settling[path]
+                rendered[path] = stat
+
+                # Hashed before rendering, so a skin replaced mid-render is not marked current
+                key = BuildManifest.build_key(path, fingerprint) if manifest is not None else None
+                if not force and manifest is not None and manifest.is_current(output_file_for(path, output_path, pose_name), key):
+                    continue
+
+                started = time.time()
+                if pool is not None:
+                    in_flight[path] = (started, key, pool.apply_async(process_skin_wrapper, (make_task(path),)))
+                else:
+                    success, _ = process_skin(*make_task(path), matcher, cache)
+                    finish(path, success, started, key)
+
+            # Forget deleted skins, so they render again if re-added
+            for path in [p for p in rendered if p not in current]:
+                del rendered[path]
+            for path in [p for p in settling if p not in current]:
+                del settling[path]
+
+            for path, (started, key, result) in list(in_flight.items()):
+                if result.ready():
+                    del in_flight[path]
+                    try:
+                        _, success, _, overflow = result.get()
+                        merge_overflow(cache, overflow)
+                    except Exception as e:
+                        print(f"Error processing {path}: {e}")
+                        success = False
+                    finish(path, success, started, key)
+
+            if manifest is not None:
+                manifest.save()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\nStopping watch mode...")
+    finally:
+        try:
+            if pool is not None:
+                terminate_pool(pool)
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+            if shared_cache is not None:
+                shared_cache.unlink() # Before the cache I/O: an interrupted shutdown must not leave the segment behind
+        checkpoint()
+        if manifest is not None:
+            manifest.save()
+        if shared_cache is not None:
+            shared_cache.close()
+
+def parse_flag(value: str, name: str) -> bool:
+    value = value.strip().lower()
+    if value in ("1", "true", "yes", "on", ""):
+        return True # A bare ?solid also enables the flag
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Invalid value for {name}: {value}")
+
+def parse_render_request(params: dict, body: bytes, defaults) -> Tuple:
+    """
+    Parses a render service request (see render_service.RenderService).
+    params: query parameters (pose, palette, model, solid, surface, shell, pillars,
+            no_layers, simple, dither, macro, macro_scale, name), overriding
+    defaults: the parsed command line of the server
+    Returns: (skin image, statue base name, settings dict), raises ValueError on bad input
+    """
+    unknown = set(params) - {"pose", "palette", "model", "solid", "surface", "shell", "pillars", "no_layers", "simple", "dither", "macro", "macro_scale", "name"}
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+
+    server_pose = "debug_all" if defaults.debug else defaults.pose
+    settings = {
+        "model": params.get("model", defaults.model),
+        "pose": params.get("pose", server_pose),
+        "palette": params.get("palette", defaults.palette),
+    }
+    for flag in ("solid", "surface", "no_layers", "simple", "dither", "macro"):
+        settings[flag] = parse_flag(params[flag], flag) if flag in params else getattr(defaults, flag)
+    try:
+        settings["shell"] = int(params.get("shell", defaults.shell))
+        settings["pillars"] = int(params.get("pillars", defaults.pillars))
+        settings["macro_scale"] = int(params.get("macro_scale", defaults.macro_scale))
+    except ValueError:
+        raise ValueError("shell, pillars and macro_scale must be integers")
+
+    if settings["model"] not in ("auto", "classic", "slim"):
+        raise ValueError(f"Unknown model: {settings['model']}")
+    if settings["palette"] not in PALETTES:
+        raise ValueError(f"Unknown palette: {settings['palette']}")
+    # Named poses only, besides the one the server was started with (-p pose.json):
+    # other pose json paths would read files on the server, and every sword material
+    # would compile another template
+    pose = settings["pose"]
+    if pose != server_pose:
+        if pose.startswith("sword_charge_"):
+            if pose[len("sword_charge_"):] not in ItemFactory.COLORS:
+                raise ValueError(f"Unknown sword material: {pose[len('sword_charge_'):]}")
+        elif pose not in PoseApplicator.POSES and pose != "debug_all":
+            raise ValueError(f"Unknown pose: {pose}")
+    if settings["shell"] < 1 or settings["pillars"] < 0:
+        raise ValueError("shell must be at least 1 and pillars at least 0")
+    if not 1 <= settings["macro_scale"] <= MAX_SERVICE_MACRO_SCALE:
+        raise ValueError(f"macro_scale must be between 1 and {MAX_SERVICE_MACRO_SCALE}")
+
+    # Same normalisation as the command line
+    if settings["simple"]:
+        settings["pose"] = "standing"
+    if settings["surface"]:
+        settings["shell"], settings["pillars"] = 1, 0
+    if not settings["macro"]:
+        settings["macro_scale"] = MacroVoxelizer.SCALE_FACTOR
+
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', params.get("name", "skin"))[:64] or "skin"
+    skin_img = SkinLoader.load_skin_bytes(body)
+    return skin_img, name, settings
+
+def render_skins(settings: dict, jobs: list, matcher: ColorMatcher, cache: ColorCache, kernel: Optional[tuple], max_memory: Optional[int]):
+    """
+    Renders a micro-batch of render service jobs that share settings (see render_service.MicroBatcher).
+    Pose templates come from the module cache. Colours are matched for the whole batch
+    up front: every visible skin colour goes through one cache lookup and one matcher
+    call, so build_statue() only finds cache hits (voxel colours are skin pixels, except
+    item colours and blended overlays in simple mode, which it matches itself).
+    Sets job.result to the .litematic bytes (None if the skin has no blocks) or job.error.
+    """
+    if not settings["dither"]:
+        keys = np.unique(np.concatenate([ColorCache.pack(np.asarray(job.skin).reshape(-1, 4)) for job in jobs]))
+        keys = keys[(keys >> 24) > 0] # Transparent pixels never become blocks
+        _, hit = cache.lookup_packed(keys)
+        if not hit.all():
+            miss = keys[~hit]
+            cache.add_packed(miss, matcher.match_indices(miss.astype('<u4').view(np.uint8).reshape(-1, 4)))
+
+    for job in jobs:
+        try:
+            # build_statue reports per-pose block stats, too chatty for a server
+            with contextlib.redirect_stdout(io.StringIO()):
+                builder, _ = build_statue(job.skin, job.name, settings["model"], settings["pose"], settings["solid"], settings["surface"], kernel, max_memory,
+                                          settings["shell"], settings["pillars"], settings["no_layers"], settings["simple"], settings["dither"],
+                                          settings["macro"], settings["macro_scale"], matcher, cache)
+                job.result = builder.to_bytes()
+        except Exception as e:
+            job.error = f"Render failed: {e}"
+
+def serve_renders(args, pose: str, kernel: Optional[tuple], max_memory: Optional[int]):
+    """
+    --serve mode: renders skins posted over HTTP on this machine (see render_service).
+    Matchers and colour caches are created per palette on first use and stay warm;
+    the caches are saved every `--checkpoint-every` renders and on exit.
+    """
+    from render_service import serve # http.server is only needed here
+
+    palettes = {} # palette -> (matcher, cache), only touched by the render thread once serving
+    rendered = 0
+
+    def palette_state(palette: str) -> tuple:
+        state = palettes.get(palette)
+        if state is None:
+            matcher = ColorMatcher(mode=palette)
+            if args.lut:
+                matcher.ensure_lut(LUT_DIR, bits=args.lut_bits)
+            state = palettes[palette] = (matcher, load_color_cache(matcher, palette))
+        return state
+
+    def save_caches():
+        for _, cache in palettes.values():
+            cache.save(CACHE_FILE)
+
+    def render_group(settings: dict, jobs: list):
+        nonlocal rendered
+        matcher, cache = palette_state(settings["palette"])
+        render_skins(settings, jobs, matcher, cache, kernel, max_memory)
+        previous = rendered
+        rendered += len(jobs)
+        if args.checkpoint_every > 0 and rendered // args.checkpoint_every > previous // args.checkpoint_every:
+            save_caches()
+
+    def parse_request(params: dict, body: bytes):
+        return parse_render_request(params, body, args)
+
+    # Warm the server's default palette and geometry, so the first request does not pay for them
+    palette_state(args.palette)
+    if not args.macro:
+        warm_geometry(args.model, pose, args.solid, args.surface, kernel, max_memory, args.no_layers, args.simple)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    previous_handler = signal.signal(signal.SIGTERM, stop) # Shut down like Ctrl+C (see watch_folder)
+    try:
+        serve(args.host, args.serve, parse_request, render_group, args.batch_window / 1000.0, args.batch_size, on_stop=save_caches)
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
 def interactive_mode():
+    import_pipeline()
     print("\n=== Skin2Schematic Wizard ===")
     
     # 1. Scan for Skins
@@ -403,32 +929,19 @@ def interactive_mode():
     # 3. Confirm
     print(f"\nProcessing {len(selected_files)} file(s) with pose '{pose_name}'...")
     
+    # Interactive mode always uses the "all" palette
     matcher = ColorMatcher(mode="all")
     # Load Cache
-    CACHE_FILE = "color_cache_v2.json"
-    cache = matcher.load_cache_from_disk(CACHE_FILE)
+    cache = load_color_cache(matcher, "all")
     
     for idx, fpath in enumerate(selected_files):
         print(f"[{idx+1}/{len(selected_files)}] processing: {fpath}...")
         
-        # Extract sub-cache for current mode
-        # If not present, auto-create
-        current_mode = "all" # Interactive mode defaults to 'all' or implied? 
-        # Interactive doesn't ask for palette, defaults to "all" in code?
-        # Line 296: matcher = ColorMatcher(mode="all")
-        # So we use "all"
-        
-        mode_cache = cache.get("all", {})
-        
-        success, updates = process_skin(fpath, None, "auto", pose_name, False, "all", False, False, matcher, False, mode_cache)
-        if updates:
-            # Update local mode cache
-            mode_cache.update(updates)
-            # Ensure it's in main cache
-            cache["all"] = mode_cache
+        # Cache is updated in place
+        process_skin(fpath, None, "auto", pose_name, False, False, None, None, 1, 0, "all", False, False, False, False, MacroVoxelizer.SCALE_FACTOR, matcher, cache)
             
     # Save cache
-    matcher.save_cache_to_disk(CACHE_FILE, cache)
+    cache.save(CACHE_FILE)
     print("Done!")
 
 def main():
@@ -439,12 +952,31 @@ def main():
     parser.add_argument("-l", "--list-poses", action="store_true", help="List all available poses")
     parser.add_argument("--debug", action="store_true", help="Generate debug gallery (alias for --pose debug_all)")
     parser.add_argument("--solid", action="store_true", help="Disable hollow optimization")
-    parser.add_argument("--palette", default="all", choices=["all", "wool", "concrete", "terracotta", "wood", "stone", "glass", "nature", "precious", "misc"], help="Block palette")
+    parser.add_argument("--surface", action="store_true", help="Rasterize only the shell of each part (faster for large statues, always hollow)")
+    parser.add_argument("--samples", default="cross7", help="Sample kernel for rotated parts: center, cross7, cube27 or a json list of [x, y, z] offsets")
+    parser.add_argument("--max-memory", type=int, default=0, help="Memory budget in MB for compiling a pose (large statues are rasterized in slabs, 0 = unlimited)")
+    parser.add_argument("--shell", type=int, default=1, help="Wall thickness of hollow statues in blocks")
+    parser.add_argument("--pillars", type=int, default=0, help="Keep interior support pillars every N blocks in hollow statues (0 = none)")
+    parser.add_argument("--palette", default="all", choices=PALETTES, help="Block palette")
     parser.add_argument("--no-layers", action="store_true", help="Disable secondary skin layers (hat, jacket, etc.)")
     parser.add_argument("--simple", action="store_true", help="Use simple 1:1 conversion (ignores pose rotations)")
     parser.add_argument("--dither", action="store_true", help="Enable Bayer dithering for better color approximation")
     parser.add_argument("-m", "--model", default="auto", choices=["auto", "classic", "slim"], help="Model type")
     parser.add_argument("--macro", action="store_true", help="Enable Upscaled 3:1 Macro-Voxel Mode (Bypasses pose system)")
+    parser.add_argument("--macro-scale", type=int, help="Blocks per skin pixel in macro mode (default 3)")
+    parser.add_argument("--lut", action="store_true", help="Match colors with a precomputed RGB->block lookup table (built on first use)")
+    parser.add_argument("--lut-bits", type=int, default=8, choices=[5, 6, 7, 8], help="Bits per channel of the lookup table (8 = exact 24-bit)")
+    parser.add_argument("--chunk-size", type=int, default=2, help="Skins handed to a worker at a time (batch mode)")
+    parser.add_argument("--max-in-flight", type=int, default=0, help="Max skins queued or running at once (default: 4 chunks per worker)")
+    parser.add_argument("--watch", metavar="DIR", help="Keep running and render new or changed skins in DIR (use with -o DIR)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between scans of the --watch directory")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Run a local HTTP render service on PORT (POST a skin PNG to /render)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the --serve service listens on")
+    parser.add_argument("--batch-window", type=float, default=10.0, help="Milliseconds the service waits to batch concurrent requests")
+    parser.add_argument("--batch-size", type=int, default=16, help="Max skins the service renders per batch")
+    parser.add_argument("--no-dedupe", action="store_true", help="Render pixel-identical skins separately instead of copying one statue")
+    parser.add_argument("--force", action="store_true", help="Rebuild every skin, even if the build manifest says its output is up to date")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="Save the color cache every N skins (0 = only at the end)")
     
     if len(sys.argv) == 1:
         interactive_mode()
@@ -458,78 +990,223 @@ def main():
             print(f" - {p}")
         return
 
-    input_path = args.input
-    if not input_path:
-        print("Error: Input path required (use -i or interactive mode).")
-        return
-
     files_to_process = []
-    if os.path.isfile(input_path):
-        files_to_process.append(input_path)
-    elif os.path.isdir(input_path):
-        files_to_process = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.lower().endswith('.png')]
-        print(f"Found {len(files_to_process)} skins in directory.")
-        
-    if not files_to_process:
-        print("No valid input files found.")
-        return
+    if args.serve is not None:
+        if args.watch or args.input:
+            print("Note: --serve renders uploaded skins. Ignoring -i and --watch.")
+            args.input = args.watch = None
+    elif args.watch:
+        if not os.path.isdir(args.watch):
+            print(f"Error: --watch needs a directory, got {args.watch}")
+            return
+    else:
+        input_path = args.input
+        if not input_path:
+            print("Error: Input path required (use -i, --watch, --serve or interactive mode).")
+            return
+
+        if os.path.isfile(input_path):
+            files_to_process.append(input_path)
+        elif os.path.isdir(input_path):
+            files_to_process = [os.path.join(input_path, f) for f in os.listdir(input_path) if f.lower().endswith('.png')]
+            print(f"Found {len(files_to_process)} skins in directory.")
+
+        if not files_to_process:
+            print("No valid input files found.")
+            return
         
     # Setup Global components
+    import_pipeline()
     matcher = ColorMatcher(mode=args.palette)
     pose = "standing" if args.simple else ("debug_all" if args.debug else args.pose)
     if args.simple and args.pose != "standing":
         print("Note: --simple mode forces standard standing pose. Ignoring -p argument.")
+    if args.macro_scale is None:
+        args.macro_scale = MacroVoxelizer.SCALE_FACTOR
+    if args.macro_scale < 1:
+        print("Error: --macro-scale must be at least 1")
+        return
+    if args.macro_scale != MacroVoxelizer.SCALE_FACTOR and not args.macro:
+        print("Note: --macro-scale only applies with --macro. Ignoring it.")
+    if args.surface and args.solid:
+        print("Note: --surface only rasterizes the shell. Ignoring --solid.")
+    shell, pillars = args.shell, args.pillars
+    if shell < 1 or pillars < 0:
+        print("Error: --shell must be at least 1 and --pillars at least 0")
+        return
+    if args.surface and (shell > 1 or pillars > 0):
+        print("Note: --surface only rasterizes the shell. Ignoring --shell and --pillars.")
+        shell, pillars = 1, 0
+    try:
+        kernel = resolve_kernel(args.samples)
+        max_memory = args.max_memory * (1 << 20) if args.max_memory > 0 else None
+    except (ValueError, TypeError, OSError) as e:
+        print(f"Error: {e}")
+        return
 
-    # Load Cache
-    CACHE_FILE = "color_cache_v2.json"
-    full_cache = matcher.load_cache_from_disk(CACHE_FILE)
-    
-    # Get relevant sub-cache
-    target_palette = args.palette
-    current_cache = full_cache.get(target_palette, {})
+    if args.serve is not None:
+        serve_renders(args, pose, kernel, max_memory)
+        return
+
+    # Incremental builds: skip skins whose statue in the output directory is up to date
+    manifest = None
+    fingerprint = None
+    build_keys = {}
+    if args.output and (os.path.isdir(args.output) or args.output.endswith(os.sep)):
+        manifest = BuildManifest.load(args.output)
+        fingerprint = BuildManifest.settings_fingerprint(build_settings(args, pose, kernel, shell, pillars, matcher))
+    if manifest is not None and not args.watch:
+        pending = []
+        for f in files_to_process:
+            build_keys[f] = BuildManifest.build_key(f, fingerprint)
+            if args.force or not manifest.is_current(output_file_for(f, args.output, pose), build_keys[f]):
+                pending.append(f)
+        if len(pending) < len(files_to_process):
+            print(f"Skipping {len(files_to_process) - len(pending)} skin(s) with up-to-date output (use --force to rebuild).")
+        files_to_process = pending
+        if not files_to_process:
+            print("Nothing to do.")
+            return
+
+    # Render pixel-identical skins once, their statues are linked or copied afterwards.
+    # Workers decode and hash each skin as they get it (process_unique_skin).
+    dedupe = len(files_to_process) > 1 and not args.no_dedupe and output_file_for(files_to_process[0], args.output, pose) != args.output
+    finished = {} # rendered path -> success, for duplicates that arrive after it
+    waiting = {} # rendered path -> duplicates that arrived before it finished
+    linked = 0
+
+    def copy_statue(original: str, duplicate: str) -> bool:
+        nonlocal linked
+        output_file = output_file_for(original, args.output, pose)
+        duplicate_file = output_file_for(duplicate, args.output, pose)
+        try:
+            link_output(output_file, duplicate_file)
+        except OSError as e:
+            print(f"Failed to copy {output_file} to {duplicate_file}: {e}")
+            return False
+        linked += 1
+        return True
+
+    def resolve_duplicates(results):
+        """(input_path, success, original) results -> (input_path, success), a duplicate once its statue is copied."""
+        for input_path, success, original in results:
+            if original is None:
+                if dedupe:
+                    finished[input_path] = success
+                yield input_path, success
+                for duplicate in waiting.pop(input_path, ()):
+                    yield duplicate, success and copy_statue(input_path, duplicate)
+            elif original in finished:
+                yield input_path, finished[original] and copy_statue(original, input_path)
+            else:
+                waiting.setdefault(original, []).append(input_path)
+
+    def record_output(input_path: str):
+        if manifest is not None:
+            manifest.record(output_file_for(input_path, args.output, pose), build_keys.get(input_path))
+
+    def save_manifest():
+        if manifest is not None:
+            manifest.save()
+
+    lut_path = None
+    if args.lut:
+        # Build once here so workers only ever memory-map a finished file
+        lut_path = matcher.ensure_lut(LUT_DIR, bits=args.lut_bits)
+
+    # Load Cache (only the section of the selected palette)
+    current_cache = load_color_cache(matcher, args.palette)
     
     # Multiprocessing
     cpu_count = multiprocessing.cpu_count()
     workers = max(1, min(cpu_count - 1, 8)) # Use up to 8 cores, leave 1 free
+
+    def make_task(path: str) -> tuple:
+        return (path, args.output, args.model, pose, args.solid, args.surface, kernel, max_memory, shell, pillars, args.palette, args.no_layers, args.simple, args.dither, args.macro, args.macro_scale)
+
+    if args.watch:
+        init_args = (args.palette, lut_path, args.model, pose, args.solid, args.surface, kernel, max_memory, args.no_layers, args.simple, args.macro)
+        watch_folder(args.watch, args.output, pose, make_task, init_args, workers, matcher, current_cache, manifest, fingerprint, args.poll_interval, args.checkpoint_every, args.force)
+        return
     
     if len(files_to_process) > 1:
         print(f"Batch processing {len(files_to_process)} skins using {workers} workers...")
         
-        # Prepare Tasks
-        # We pass only the relevant sub-cache to workers to keep pickling small
-        tasks = [
-            (f, args.output, args.model, pose, args.solid, args.palette, args.no_layers, args.simple, args.dither, args.macro, current_cache)
-            for f in files_to_process
-        ]
+        # Prepare Tasks (lazily, so memory stays flat for very large folders)
+        # The colour cache lives in shared memory, so tasks stay a few bytes each
+        tasks = (make_task(f) for f in files_to_process)
+        total = len(files_to_process)
+        chunk_size = max(1, args.chunk_size)
         
-        success_count = 0
-        
-        # Use simple map if workers > 1
         if workers > 1:
-            with multiprocessing.Pool(processes=workers) as pool:
-                results = pool.map(process_skin_wrapper, tasks)
-                
-            for success, updates in results:
-                if success: success_count += 1
-                if updates: current_cache.update(updates)
+            # A full chunk per worker must fit, or the pool's feeder could wait forever
+            max_in_flight = max(args.max_in_flight or 4 * chunk_size * workers, chunk_size * workers)
+            slots = threading.Semaphore(max_in_flight)
+
+            cache_lock = multiprocessing.Lock()
+            shared_cache = SharedColorCache.create(current_cache, cache_lock)
+            manager = multiprocessing.Manager() if dedupe else None
+            overflowed = 0
+
+            def merged(results):
+                nonlocal overflowed
+                for *result, overflow in results:
+                    overflowed += merge_overflow(current_cache, overflow)
+                    yield result
+
+            def checkpoint():
+                sync_shared_cache(shared_cache, current_cache)
+                current_cache.save(CACHE_FILE)
+                save_manifest()
+
+            try:
+                init_args = (args.palette, lut_path, args.model, pose, args.solid, args.surface, kernel, max_memory, args.no_layers,
+                             args.simple, args.macro, shared_cache.name, cache_lock, manager.dict() if manager else None)
+                with multiprocessing.Pool(processes=workers, initializer=init_worker, initargs=init_args) as pool:
+                    try:
+                        results = pool.imap_unordered(process_skin_wrapper, bounded(tasks, slots), chunksize=chunk_size)
+                        success_count = consume_results(resolve_duplicates(merged(results)), total, checkpoint, args.checkpoint_every, slots, record_output)
+                    finally:
+                        # Unblock the feeder thread if we stopped early, so the pool can shut down
+                        slots.release(total)
+            finally:
+                # Keep whatever the workers matched, even after an error or Ctrl+C
+                shared_cache.unlink() # The mapping stays readable
+                sync_shared_cache(shared_cache, current_cache)
+                current_cache.save(CACHE_FILE)
+                save_manifest()
+                shared_cache.close()
+                if manager is not None:
+                    manager.shutdown()
+                if overflowed:
+                    print(f"Note: The shared color cache was full, {overflowed} new color(s) were collected from the workers instead.")
         else:
-            # Serial fallback
-            for task in tasks:
-                 s, u = process_skin_wrapper(task)
-                 if s: success_count += 1
-                 if u: current_cache.update(u)
+            # Serial fallback (matcher already has the LUT loaded if requested)
+            def checkpoint():
+                current_cache.save(CACHE_FILE)
+                save_manifest()
+
+            claims = {} if dedupe else None
+            results = (process_unique_skin(task, matcher, current_cache, claims) for task in tasks)
+            try:
+                success_count = consume_results(resolve_duplicates(results), total, checkpoint, args.checkpoint_every, on_success=record_output)
+            finally:
+                current_cache.save(CACHE_FILE)
+                save_manifest()
     else:
         # Single file
         print(f"Processing {files_to_process[0]}...")
-        success, updates = process_skin(files_to_process[0], args.output, args.model, pose, args.solid, args.palette, args.no_layers, args.simple, args.dither, args.macro, matcher, current_cache)
+        success, updates = process_skin(files_to_process[0], args.output, args.model, pose, args.solid, args.surface, kernel, max_memory, shell, pillars, args.palette, args.no_layers, args.simple, args.dither, args.macro, args.macro_scale, matcher, current_cache)
         success_count = 1 if success else 0
-        if updates: current_cache.update(updates)
+        if success:
+            record_output(files_to_process[0])
+            save_manifest()
             
-    # Save Cache
-    # Merge back into full cache
-    full_cache[target_palette] = current_cache
-    matcher.save_cache_to_disk(CACHE_FILE, full_cache)
+    # Save Cache (appends only the new entries)
+    current_cache.save(CACHE_FILE)
     print(f"\nBatch Complete. {success_count}/{len(files_to_process)} successful.")
+    if linked:
+        print(f"{linked} duplicate skin(s) reuse an identical statue.")
 
 if __name__ == "__main__":
     multiprocessing.freeze_support() # Windows support
@@ -0,0 +1,295 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+MAX_UPLOAD = 1 << 20 # Bytes; skins are a few KB
+MAX_QUEUE = 1024 # Requests waiting for the render thread before new ones get 503
+REQUEST_TIMEOUT = 300.0 # Seconds a request waits for its statue
+LATENCY_WINDOW = 2048 # Most recent requests the percentiles are computed over
+
+class RenderJob:
+    """One queued request: the decoded skin, its settings and, once rendered, the result."""
+
+    def __init__(self, skin, name: str, settings: dict):
+        """
+        skin: skin image (whatever the render callback expects)
+        name: base name of the statue (schematic name)
+        settings: parsed, hashable-valued render settings; jobs with equal settings share a batch
+        """
+        self.skin = skin
+        self.name = name
+        self.settings = settings
+        self.key = tuple(sorted(settings.items()))
+        self.queued = time.monotonic()
+        self.started = None
+        self.batch_size = 0
+        self.result: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+class ServiceStats:
+    """Counters and rolling latency windows, updated by the render thread and read by /stats."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched_jobs = 0
+        self.latency = deque(maxlen=LATENCY_WINDOW) # Seconds from enqueue to result
+        self.queue_wait = deque(maxlen=LATENCY_WINDOW) # Seconds from enqueue to batch start
+
+    def record_batch(self, jobs: List[RenderJob]):
+        now = time.monotonic()
+        with self.lock:
+            self.batches += 1
+            self.batched_jobs += len(jobs)
+            for job in jobs:
+                if job.error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self.latency.append(now - job.queued)
+                self.queue_wait.append(job.started - job.queued)
+
+    def record_rejected(self):
+        with self.lock:
+            self.rejected += 1
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        if not samples:
+            return {"p50": None, "p90": None, "p99": None, "max": None}
+        ms = np.asarray(samples) * 1000.0
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        return {"p50": round(float(p50), 2), "p90": round(float(p90), 2), "p99": round(float(p99), 2), "max": round(float(ms.max()), 2)}
+
+    def snapshot(self, queue_depth: int, in_progress: int) -> dict:
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "queue_depth": queue_depth,
+                "in_progress": in_progress,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "mean_batch_size": round(self.batched_jobs / self.batches, 2) if self.batches else None,
+                "latency_ms": self._percentiles(self.latency),
+                "queue_wait_ms": self._percentiles(self.queue_wait),
+            }
+
+class MicroBatcher:
+    """
+    Single render thread fed by a bounded queue.
+
+    The thread blocks for the first job, then keeps collecting for `window` seconds
+    (or until `max_batch` jobs) and hands every group of jobs with identical settings
+    to `render_group` at once, so they share pose templates and one colour matching
+    pass. One thread owns the matchers and colour caches, so they need no locking.
+    """
+
+    def __init__(self, render_group: Callable[[dict, List[RenderJob]], None], window: float, max_batch: int, stats: ServiceStats):
+        """
+        render_group: fills job.result (or job.error) for a list of jobs sharing one settings dict
+        window: seconds to wait for more jobs after the first one of a batch
+        max_batch: max jobs per batch
+        """
+        self.render_group = render_group
+        self.window = max(0.0, window)
+        self.max_batch = max(1, max_batch)
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=MAX_QUEUE)
+        self.in_progress = 0
+        self._thread = threading.Thread(target=self._run, name="render", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Finishes the current batch, then the thread exits (queued jobs are dropped)."""
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=REQUEST_TIMEOUT)
+
+    def submit(self, job: RenderJob):
+        """Raises queue.Full if the service is overloaded."""
+        self.queue.put_nowait(job)
+
+    def _collect(self, first: RenderJob) -> List[RenderJob]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self.queue.put(None) # Stop after this batch
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self.in_progress = len(batch)
+
+            # Group by settings, keeping arrival order inside each group
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.key, []).append(job)
+
+            started = time.monotonic()
+            for job in batch:
+                job.started = started
+                job.batch_size = len(batch)
+            for jobs in groups.values():
+                try:
+                    self.render_group(jobs[0].settings, jobs)
+                except Exception as e:
+                    for job in jobs:
+                        if job.result is None and job.error is None:
+                            job.error = f"Render failed: {e}"
+
+            self.stats.record_batch(batch)
+            self.in_progress = 0
+            for job in batch:
+                job.done.set()
+
+class RenderService(ThreadingHTTPServer):
+    """
+    Local HTTP front end of the micro-batcher.
+
+      POST /render?pose=..&palette=..   body: skin PNG   -> .litematic bytes
+      GET  /stats                                        -> JSON counters and latency percentiles
+      GET  /health                                       -> "ok"
+
+    Query parameters are parsed by `parse_request(params, body)`, which returns
+    (skin, name, settings) or raises ValueError (400).
+    """
+    daemon_threads = True
+    request_queue_size = 128 # Listen backlog: bursts of concurrent uploads must not be refused
+
+    def __init__(self, address, parse_request: Callable, batcher: MicroBatcher):
+        super().__init__(address, RenderHandler)
+        self.parse_request = parse_request
+        self.batcher = batcher
+
+class RenderHandler(BaseHTTPRequestHandler):
+    server_version = "Skin2Schematic"
+    protocol_version = "HTTP/1.1" # Keep-alive, every response has a Content-Length
+
+    def log_message(self, format, *args):
+        pass # One line per request is too chatty for a render backend; see /stats
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict):
+        self._send(status, json.dumps(data).encode('utf-8'), "application/json")
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, {"error": message})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._send(200, b"ok", "text/plain")
+        elif path == "/stats":
+            batcher = self.server.batcher
+            self._send_json(200, batcher.stats.snapshot(batcher.queue.qsize(), batcher.in_progress))
+        else:
+            self._send_error(404, "Not found")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/render":
+            self._send_error(404, "Not found")
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self._send_error(411, "Content-Length required")
+            return
+        length = int(length)
+        if length > MAX_UPLOAD:
+            self.close_connection = True # Body is not read
+            self._send_error(413, f"Skin larger than {MAX_UPLOAD} bytes")
+            return
+        body = self.rfile.read(length)
+
+        try:
+            skin, name, settings = self.server.parse_request(dict(parse_qsl(url.query)), body)
+        except ValueError as e:
+            self._send_error(400, str(e))
+            return
+
+        batcher = self.server.batcher
+        job = RenderJob(skin, name, settings)
+        try:
+            batcher.submit(job)
+        except queue.Full:
+            batcher.stats.record_rejected()
+            self._send_error(503, "Render queue full, retry later")
+            return
+
+        if not job.done.wait(REQUEST_TIMEOUT):
+            self._send_error(504, "Render timed out")
+            return
+        if job.error is not None:
+            self._send_error(500, job.error)
+            return
+        if job.result is None:
+            self._send_error(422, "Skin produced no blocks")
+            return
+
+        self._send(200, job.result, "application/octet-stream", {
+            "Content-Disposition": f'attachment; filename="{name}.litematic"',
+            "X-Render-Time-Ms": f"{(time.monotonic() - job.queued) * 1000.0:.1f}",
+            "X-Batch-Size": str(job.batch_size),
+        })
+
+def serve(host: str, port: int, parse_request: Callable, render_group: Callable, window: float, max_batch: int, on_stop: Optional[Callable] = None):
+    """
+    Runs the render service until interrupted (Ctrl+C or SIGTERM).
+    on_stop: called once after the last batch finished (e.g. to save the colour caches)
+    """
+    stats = ServiceStats()
+    batcher = MicroBatcher(render_group, window, max_batch, stats)
+    server = RenderService((host, port), parse_request, batcher)
+    batcher.start()
+
+    host_name, bound_port = server.server_address[:2]
+    print(f"Serving on http://{host_name}:{bound_port} (POST /render, GET /stats, GET /health), "
+          f"batching up to {batcher.max_batch} skins per {batcher.window * 1000:g} ms (Ctrl+C to stop)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping render service...")
+    finally:
+        server.server_close()
+        batcher.stop()
+        if on_stop is not None:
+            on_stop()
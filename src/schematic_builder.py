@@ -1,58 +1,60 @@
+import os
+import io
+import gzip
 import time
-try:
-    from litemapy import Schematic, Region, BlockState, TileEntity
-    from nbtlib import Compound, String, Int, List
-except ImportError:
-    print("Error: litemapy or nbtlib not found. Please install litemapy.")
-    raise
-
-# Monkeypatch litemapy to fix OverflowError with large ints (Python 3.14 / Numpy 2 compat)
-import litemapy.storage
-def patched_setitem(self, index: int, value: int) -> None:
-    index = int(index) # Ensure index is python int (fixes numpy contamination)
-    if not 0 <= index < len(self):
-        raise IndexError("Invalid index {}".format(index))
-    if not 0 <= value <= self._LitematicaBitArray__mask: # Access private via name mangling or getattr
-        # In patched method, self.__mask becomes self._LitematicaBitArray__mask
-        raise ValueError("Invalid value {}, maximum value is {}".format(value, self._LitematicaBitArray__mask))
-            
-    start_offset = index * self.nbits
-    start_arr_index = start_offset >> 6
-    end_arr_index = ((index + 1) * self.nbits - 1) >> 6
-    start_bit_offset = start_offset & 0x3F
-    m = (1 << 64) - 1
-    
-    # Force int conversion to avoid numpy overflow issues
-    current_val = int(self.array[start_arr_index])
-    mask = int(self._LitematicaBitArray__mask)
-    
-    zeroed = current_val & ~(mask << start_bit_offset)
-    updated = zeroed | (int(value) & mask) << start_bit_offset
-    self.array[start_arr_index] = int(updated & m)
-
-    if start_arr_index != end_arr_index:
-        end_offset = 64 - start_bit_offset
-        j1 = self.nbits - end_offset
-        
-        current_end = int(self.array[end_arr_index])
-        
-        # self.array[end_arr_index] = (self.array[end_arr_index] >> j1 << j1 | (value & self.__mask) >> end_offset) & m
-        # Break it down safely
-        term1 = (current_end >> j1) << j1
-        term2 = (int(value) & mask) >> end_offset
-        self.array[end_arr_index] = int((term1 | term2) & m)
+import numpy as np
+from typing import Optional
+
+# litemapy / nbtlib are only imported when a statue is written (see litematic_region)
+
+def pack_bit_array(values: np.ndarray, nbits: int) -> np.ndarray:
+    """
+    Vectorized equivalent of filling a LitematicaBitArray.
+    values: (N,) non-negative ints < 2**nbits, in Litematica order (index = y*W*L + z*W + x)
+    Returns: (ceil(N * nbits / 64),) int64 long array, entries may straddle two longs
+    """
+    size = values.size
+    num_longs = -(-size * nbits // 64)
 
-litemapy.storage.LitematicaBitArray.__setitem__ = patched_setitem
+    # 64 values always fill exactly nbits longs, so process groups of 64 column by column
+    groups = -(-size // 64)
+    v = np.zeros(groups * 64, dtype=np.uint64)
+    v[:size] = values
+    v = v.reshape(groups, 64)
+
+    out = np.zeros((groups, nbits + 1), dtype=np.uint64) # +1: spill column of the last value
+    for j in range(64):
+        start = j * nbits
+        word, shift = start >> 6, start & 63
+        out[:, word] |= v[:, j] << np.uint64(shift)
+        if shift + nbits > 64:
+            out[:, word + 1] |= v[:, j] >> np.uint64(64 - shift)
+
+    return out[:, :nbits].reshape(-1)[:num_longs].view(np.int64)
 
 class SchematicBuilder:
     def __init__(self, name="SkinStatue", author="Skin2Schematic"):
         self.name = name
         self.author = author
-        self.blocks = {} # (x, y, z) -> block_id
+        # Blocks are kept as appended chunks of int32 coordinates and palette
+        # indices (16 bytes per block); overwrites are resolved in _resolve_blocks()
+        self.block_ids = [] # palette index -> block_id
+        self._block_index = {} # block_id -> palette index
+        self._coords = [] # (N, 3) int32 chunks, in insertion order
+        self._indices = [] # (N,) int32 chunks
+
+    def _palette_index(self, block_id: str) -> int:
+        index = self._block_index.get(block_id)
+        if index is None:
+            index = len(self.block_ids)
+            self._block_index[block_id] = index
+            self.block_ids.append(block_id)
+        return index
 
     def add_block(self, x, y, z, block_id):
         if block_id:
-            self.blocks[(x, y, z)] = block_id
+            self._coords.append(np.array([[x, y, z]], dtype=np.int32))
+            self._indices.append(np.array([self._palette_index(block_id)], dtype=np.int32))
 
     def add_sign(self, x, y, z, text, wall_sign=False, facing="north"):
         """
@@ -77,31 +79,57 @@ class SchematicBuilder:
         coords_matrix: (N, 3) numpy array
         block_ids: (N,) list or array of strings
         """
-        # Convert to tuple keys and update dict 
-        # (This is still python overhead but faster than individual calls)
-        # Using zip is reasonably fast.
-        
-        # Ensure block_ids is iterable
         if len(coords_matrix) != len(block_ids):
             print("Warning: Bulk add mismatch")
             return
-            
-        # Optimization: Map to list of tuples
-        keys = map(tuple, coords_matrix)
-        self.blocks.update(zip(keys, block_ids))
+        if len(block_ids) == 0:
+            return
 
-    def save(self, output_path: str):
-        if not self.blocks:
+        # Only the distinct ids go through Python
+        unique_ids, inverse = np.unique(np.asarray(block_ids), return_inverse=True)
+        lookup = np.array([self._palette_index(str(b)) for b in unique_ids], dtype=np.int32)
+
+        self._coords.append(np.asarray(coords_matrix, dtype=np.int32).reshape(-1, 3))
+        self._indices.append(lookup[inverse.reshape(-1)])
+
+    def _resolve_blocks(self):
+        """
+        Returns (coords (M, 3) int32, indices (M,) int32) with one entry per position,
+        the last one added winning (like the old dict update), or None if empty.
+        """
+        if not self._coords:
+            return None
+        coords = np.concatenate(self._coords)
+        indices = np.concatenate(self._indices)
+
+        # Linearize within the bounds, then keep the last write per position
+        mins = coords.min(axis=0)
+        dims = coords.max(axis=0) - mins + 1
+        local = (coords - mins).astype(np.int64)
+        linear = (local[:, 0] * dims[1] + local[:, 1]) * dims[2] + local[:, 2]
+        _, first = np.unique(linear[::-1], return_index=True)
+        keep = linear.size - 1 - first
+
+        # Compact the chunks so repeated saves don't redo the work
+        self._coords = [coords[keep]]
+        self._indices = [indices[keep]]
+        return self._coords[0], self._indices[0]
+
+    def _build_schematic(self):
+        """
+        Returns (litemapy Schematic, number of blocks) of everything added so far,
+        or None if there are no blocks.
+        """
+        resolved = self._resolve_blocks()
+        if resolved is None:
             print("Warning: No blocks to save!")
-            return
+            return None
+        coords, block_idx = resolved
+        from litematic_region import AIR, PackedRegion, Schematic, BlockState, TileEntity, Compound, String, Int, List
 
         # Determine bounds
-        min_x = min(k[0] for k in self.blocks)
-        min_y = min(k[1] for k in self.blocks)
-        min_z = min(k[2] for k in self.blocks)
-        max_x = max(k[0] for k in self.blocks)
-        max_y = max(k[1] for k in self.blocks)
-        max_z = max(k[2] for k in self.blocks)
+        min_x, min_y, min_z = (int(v) for v in coords.min(axis=0))
+        max_x, max_y, max_z = (int(v) for v in coords.max(axis=0))
 
         # Include signs in bounds? usually inside or near.
         if hasattr(self, 'signs') and self.signs:
@@ -118,22 +146,28 @@ class SchematicBuilder:
 
         print(f"Schematic Size: {width}x{height}x{length}")
 
-        reg = Region(0, 0, 0, width, height, length)
+        reg = PackedRegion(0, 0, 0, width, height, length)
         schem = Schematic(name=self.name, author=self.author, regions={"Main": reg})
         
         # Metadata
         schem.description = f"Generated by Skin2Schematic on {time.strftime('%Y-%m-%d %H:%M:%S')}"
 
-        count = 0
-        for (x, y, z), block_id in self.blocks.items():
-            lx = x - min_x
-            ly = y - min_y
-            lz = z - min_z
+        # Palette index volume (0 = air), filled with one scatter
+        palette = [AIR]
+        remap = np.zeros(len(self.block_ids), dtype=np.uint32) # builder index -> region palette index (0 = dropped)
+        for i in np.unique(block_idx):
+            block_id = self.block_ids[i]
             try:
-                reg.setblock(lx, ly, lz, BlockState(block_id))
-                count += 1
+                palette.append(BlockState(block_id))
+                remap[i] = len(palette) - 1
             except Exception as e:
-                print(f"Error setting block {block_id} at {lx},{ly},{lz}: {e}")
+                print(f"Error setting block {block_id}: {e}")
+
+        block_idx = remap[block_idx]
+        volume = np.zeros((width, height, length), dtype=np.uint32)
+        volume[coords[:, 0] - min_x, coords[:, 1] - min_y, coords[:, 2] - min_z] = block_idx
+        count = int(np.count_nonzero(block_idx))
+        reg.set_volume(palette, volume)
 
         # Process Signs
         if hasattr(self, 'signs'):
@@ -209,5 +243,34 @@ class SchematicBuilder:
                 except Exception as e:
                     print(f"Error adding sign at {lx},{ly},{lz}: {e}")
 
-        schem.save(output_path)
+        return schem, count
+
+    def save(self, output_path: str):
+        built = self._build_schematic()
+        if built is None:
+            return
+        schem, count = built
+
+        # Write a temporary file and rename it: readers never see a partial statue, and an
+        # output that is a hardlink (see main.link_output) is replaced instead of rewritten in place
+        tmp_path = output_path + ".tmp"
+        schem.save(tmp_path)
+        os.replace(tmp_path, output_path)
         print(f"Saved {count} blocks to {output_path}")
+
+    def to_bytes(self) -> Optional[bytes]:
+        """
+        Returns the .litematic file contents (gzipped NBT, same as save() writes),
+        or None if there are no blocks.
+        """
+        built = self._build_schematic()
+        if built is None:
+            return None
+        schem, _ = built
+        import nbtlib
+
+        schem.update_metadata()
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as f:
+            nbtlib.File(schem.to_nbt(save_soft=True), gzipped=True).write(f, 'big')
+        return buffer.getvalue()
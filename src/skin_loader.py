@@ -1,5 +1,4 @@
 import os
-import requests
 import io
 import base64
 import re
@@ -32,8 +31,21 @@ class SkinLoader:
         except Exception as e:
             raise ValueError(f"Failed to load skin from file: {e}")
 
+    @staticmethod
+    def load_skin_bytes(data: bytes) -> Image.Image:
+        """
+        Loads a skin from the contents of an image file (e.g. an upload), without touching the network.
+        """
+        try:
+            img = Image.open(io.BytesIO(data))
+            img.load() # Force load
+        except Exception as e:
+            raise ValueError(f"Failed to decode skin image: {e}")
+        return SkinLoader._validate_and_process(img)
+
     @staticmethod
     def _load_from_url(url: str) -> Image.Image:
+        import requests # Only network sources need it (and it is slow to import)
         try:
             response = requests.get(url, timeout=10)
             response.raise_for_status()
@@ -44,6 +56,7 @@ class SkinLoader:
 
     @staticmethod
     def _load_from_username(username: str) -> Image.Image:
+        import requests
         try:
             # 1. Get UUID
             resp = requests.get(SkinLoader.MOJANG_PROFILE_URL.format(username), timeout=10)
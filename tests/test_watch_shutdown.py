@@ -0,0 +1,75 @@
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from PIL import Image
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Runs main.py as a script with a fixed CPU count, so watch mode starts a worker pool
+# (2 workers) on any machine
+RUN_MAIN = f"""
+import multiprocessing, runpy, sys
+sys.path.insert(0, {SRC!r})
+multiprocessing.cpu_count = lambda: 3
+sys.argv[0] = "main.py"
+runpy.run_path({os.path.join(SRC, "main.py")!r}, run_name="__main__")
+"""
+
+def shared_segments() -> set:
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+@unittest.skipUnless(sys.platform.startswith("linux") and os.path.isdir("/dev/shm"), "needs POSIX shared memory in /dev/shm")
+class WatchShutdownTest(unittest.TestCase):
+    def stop_watch(self, signal_group: bool):
+        """Starts --watch on a folder with one skin, waits for its statue and sends SIGTERM."""
+        with tempfile.TemporaryDirectory() as tmp:
+            skins = os.path.join(tmp, "skins")
+            os.mkdir(skins)
+            pixels = np.random.default_rng(0).integers(0, 256, (64, 64, 4), dtype=np.uint8)
+            pixels[..., 3] = 255
+            Image.fromarray(pixels, 'RGBA').save(os.path.join(skins, "skin.png"))
+            statue = os.path.join(skins, "skin_standing.litematic")
+
+            before = shared_segments()
+            log_path = os.path.join(tmp, "watch.log")
+            with open(log_path, "w") as log:
+                proc = subprocess.Popen([sys.executable, "-c", RUN_MAIN, "--watch", skins, "-o", skins + os.sep, "--poll-interval", "0.05"],
+                                        cwd=tmp, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+                try:
+                    deadline = time.time() + 120
+                    while not os.path.exists(statue) and proc.poll() is None and time.time() < deadline:
+                        time.sleep(0.1)
+                    self.assertTrue(os.path.exists(statue), "watch mode did not render the skin")
+
+                    if signal_group:
+                        os.killpg(proc.pid, signal.SIGTERM) # What service managers usually do
+                    else:
+                        proc.send_signal(signal.SIGTERM)
+                    returncode = proc.wait(timeout=60)
+                finally:
+                    if proc.poll() is None:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                        proc.wait()
+            with open(log_path) as log:
+                output = log.read()
+
+            self.assertEqual(returncode, 0, output)
+            self.assertIn("Stopping watch mode", output)
+            self.assertNotIn("Traceback", output)
+            self.assertNotIn("leaked", output)
+            self.assertEqual(shared_segments() - before, set(), "shared colour cache left in /dev/shm")
+
+    def test_sigterm(self):
+        self.stop_watch(signal_group=False)
+
+    def test_sigterm_process_group(self):
+        self.stop_watch(signal_group=True)
+
+if __name__ == "__main__":
+    unittest.main()